@@ -0,0 +1,187 @@
+import json
+import math
+import os
+import re
+import subprocess
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from pydantic import BaseModel
+
+from robusta_cli.runner_logs import RunnerLogFollower, kubelet_timestamp
+
+MEASURE_LABEL = "robusta_measure_id"
+DEMO_LABEL = "robusta_demo_id"
+DEFAULT_MEASURE_TIMEOUT_SECONDS = 120
+# a runner log line matching this regular expression means the alert was processed. {id} stands for the alert's
+# robusta_measure_id label. The runner logs alerts differently between versions and log levels, so it can be
+# overridden, e.g. to only count the lines of a specific action
+ALERT_PROCESSED_MARKER = os.environ.get("ROBUSTA_ALERT_PROCESSED_MARKER", "{id}")
+# the runner log line showing it processed the crashing pod of `robusta demo`. {pod} stands for the name prefix of
+# the crashing pods of this demo, so lines about the pods of earlier demos don't count
+DEMO_PROCESSED_MARKER = os.environ.get("ROBUSTA_DEMO_PROCESSED_MARKER", "{pod}")
+DEMO_REPLICASET_TIMEOUT_SECONDS = 10
+READ_INTERVAL_SECONDS = 1
+
+
+class LatencyReport(BaseModel):
+    alerts: int
+    processed: int = 0
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    max_ms: Optional[float] = None
+    dropped_log_lines: int = 0  # lines that fell out of the log buffer before they were checked
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest rank percentile of sorted values
+    """
+    return values[max(math.ceil(len(values) * pct / 100) - 1, 0)]
+
+
+class AlertLatencyTracker:
+    """
+    Measures the time from sending each alert to the runner logging it.
+
+    The runner logs are followed from before the first alert is sent, and the time every line was received is
+    kept, so alerts processed while others are still being sent are timed correctly
+    """
+
+    def __init__(self, follower: RunnerLogFollower, run_id: str):
+        self.follower = follower
+        self.run_id = run_id
+        self.from_line = follower.total_lines
+        marker = ALERT_PROCESSED_MARKER if "{id}" in ALERT_PROCESSED_MARKER else f"{ALERT_PROCESSED_MARKER}.*{{id}}"
+        self.pattern = re.compile(marker.replace("{id}", rf"(?P<id>{re.escape(run_id)}-\d+)\b"))
+        self.sent_at: Dict[str, float] = {}
+        self.processed_at: Dict[str, float] = {}
+        self.dropped_lines = 0
+
+    def tag(self, alerts: List[Dict]) -> List[Dict]:
+        """
+        Label each alert with a unique measure id
+        """
+        return [
+            {**alert, "labels": {**alert["labels"], MEASURE_LABEL: f"{self.run_id}-{index}"}}
+            for index, alert in enumerate(alerts)
+        ]
+
+    def sent(self, alerts: List[Dict], sent_at: float):
+        for alert in alerts:
+            self.sent_at[alert["labels"][MEASURE_LABEL]] = sent_at
+
+    def _read(self, timeout: float):
+        lines, next_line = self.follower.read(self.from_line, timeout)
+        self.dropped_lines += max(next_line - self.from_line - len(lines), 0)
+        self.from_line = next_line
+        for line, received in lines:
+            for match in self.pattern.finditer(line.text):
+                self.processed_at.setdefault(match["id"], received)
+
+    def wait(self, timeout: float) -> LatencyReport:
+        """
+        Wait until every sent alert was processed, or the timeout passed
+        """
+        deadline = time.time() + timeout
+        while True:
+            self._read(min(READ_INTERVAL_SECONDS, max(deadline - time.time(), 0)))
+            pending = self.sent_at.keys() - self.processed_at.keys()
+            if not pending or time.time() >= deadline or not self.follower.running:
+                break
+
+        latencies = sorted(
+            (self.processed_at[alert_id] - sent_at) * 1000
+            for alert_id, sent_at in self.sent_at.items()
+            if alert_id in self.processed_at
+        )
+        report = LatencyReport(
+            alerts=len(self.sent_at), processed=len(latencies), dropped_log_lines=self.dropped_lines
+        )
+        if latencies:
+            report.p50_ms = round(percentile(latencies, 50), 1)
+            report.p95_ms = round(percentile(latencies, 95), 1)
+            report.max_ms = round(latencies[-1], 1)
+        return report
+
+
+@contextmanager
+def measure_alert_latency(namespace: Optional[str], run_id: str) -> Iterator[AlertLatencyTracker]:
+    """
+    Follow the runner logs for the duration of the block. Alerts must be sent inside it
+    """
+    follower = RunnerLogFollower(namespace).start()
+    try:
+        yield AlertLatencyTracker(follower, run_id)
+    finally:
+        follower.stop()
+
+
+class DemoLatency:
+    """
+    Measures the time from deploying the crashing pod of the demo to the runner logging it.
+
+    The deployment is labeled with the demo id, which gives its pods a pod template hash, and so a name prefix, no
+    earlier demo had
+    """
+
+    def __init__(self, follower: RunnerLogFollower, demo_id: str):
+        self.follower = follower
+        self.demo_id = demo_id
+        self.pod_prefix: Optional[str] = None
+        # only lines written after the demo started count, including lines replayed from before when the log
+        # stream starts
+        self.from_line = follower.total_lines
+        self.since = kubelet_timestamp(time.time())
+        self.started = time.time()
+
+    def deploy(self, manifest_url: str) -> Optional[str]:
+        """
+        Deploy the demo deployment of manifest_url, labeled with the demo id. Returns the name prefix of its pods, or
+        None if its replicaset didn't show up in time
+        """
+        deployment = json.loads(
+            subprocess.check_output(["kubectl", "create", "-f", manifest_url, "--dry-run=client", "-o", "json"])
+        )
+        template_metadata = deployment["spec"]["template"].setdefault("metadata", {})
+        template_metadata.setdefault("labels", {})[DEMO_LABEL] = self.demo_id
+        subprocess.run(["kubectl", "apply", "-f", "-"], input=json.dumps(deployment).encode(), check=True)
+
+        deadline = time.time() + DEMO_REPLICASET_TIMEOUT_SECONDS
+        while True:
+            pod_template_hash = subprocess.check_output(
+                [
+                    "kubectl",
+                    "get",
+                    "replicasets",
+                    "-l",
+                    f"{DEMO_LABEL}={self.demo_id}",
+                    "-o",
+                    "jsonpath={.items[*].metadata.labels.pod-template-hash}",
+                ]
+            ).decode().strip()
+            if pod_template_hash:
+                self.pod_prefix = f"{deployment['metadata']['name']}-{pod_template_hash}-"
+                return self.pod_prefix
+            if time.time() >= deadline:
+                return None
+            time.sleep(1)
+
+    def wait(self, timeout: float) -> Optional[float]:
+        """
+        Seconds from the start of the demo to the runner logging the crashing pod, or None on timeout
+        """
+        marker = DEMO_PROCESSED_MARKER if "{pod}" in DEMO_PROCESSED_MARKER else f"{DEMO_PROCESSED_MARKER}.*{{pod}}"
+        pattern = re.compile(marker.replace("{pod}", re.escape(self.pod_prefix)))
+        line = self.follower.wait_for(pattern, timeout, self.from_line, self.since)
+        return time.time() - self.started if line is not None else None
+
+
+@contextmanager
+def measure_demo_latency(namespace: Optional[str], demo_id: str) -> Iterator[DemoLatency]:
+    follower = RunnerLogFollower(namespace).start()
+    try:
+        yield DemoLatency(follower, demo_id)
+    finally:
+        follower.stop()
@@ -0,0 +1,244 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
+
+from robusta_cli.alert_latency import (
+    DEFAULT_MEASURE_TIMEOUT_SECONDS,
+    AlertLatencyTracker,
+    LatencyReport,
+    measure_alert_latency,
+)
+from robusta_cli.demo_alert import (
+    direct_alertmanager_session,
+    find_alert_pods,
+    forget_discovered_alertmanager_url,
+    get_alertmanager_url,
+    load_kube_config,
+    parse_alert_labels,
+)
+
+DEFAULT_RATE = 10.0  # alerts per second
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_CONCURRENCY = 4
+DEFAULT_REQUEST_TIMEOUT_SECONDS = 10
+# batches are sent at least this often, so low rates aren't sent as a few large bursts
+BATCH_INTERVAL_SECONDS = 0.1
+LOAD_TEST_LABEL = "robusta_load_test"
+# running pods taken from each namespace, as the alerts targets
+LOAD_TEST_PODS_PER_NAMESPACE = 50
+SEVERITIES = ["critical", "high", "warning", "info"]
+
+
+class AlertLoadException(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class BatchResult(BaseModel):
+    alerts: int
+    status: int = 0  # 0 if no response was received
+    error: Optional[str] = None
+    sent_at: float = 0
+    latency_ms: float = 0
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+
+class PhaseReport(BaseModel):
+    phase: str  # firing or resolved
+    alerts: int = 0
+    failed_alerts: int = 0
+    batches: int = 0
+    failed_batches: int = 0
+    errors: Dict[str, int] = {}  # http status or exception -> failed batches
+    elapsed_seconds: float = 0
+    max_latency_ms: float = 0
+
+    @property
+    def throughput(self) -> float:
+        return (self.alerts - self.failed_alerts) / self.elapsed_seconds if self.elapsed_seconds else 0
+
+    def add(self, result: BatchResult):
+        self.alerts += result.alerts
+        self.batches += 1
+        self.max_latency_ms = max(self.max_latency_ms, result.latency_ms)
+        if not result.ok:
+            self.failed_alerts += result.alerts
+            self.failed_batches += 1
+            error = f"HTTP {result.status}" if result.status else result.error or "unknown error"
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def build_load_alerts(
+    count: int, alert: str, pods: List[Dict], extra_labels: Dict[str, str], run_id: str
+) -> List[Dict]:
+    """
+    count distinct alerts, spread over the given pods and severities. Every alert has a unique label set, so
+    Alertmanager doesn't deduplicate them
+    """
+    if not pods:
+        raise AlertLoadException("No pods to create the alerts for")
+    return [
+        {
+            "labels": {
+                "alertname": alert,
+                "severity": SEVERITIES[index % len(SEVERITIES)],
+                "pod": pods[index % len(pods)]["name"],
+                "namespace": pods[index % len(pods)]["namespace"],
+                **extra_labels,
+                LOAD_TEST_LABEL: run_id,
+                "alert_index": str(index),
+            },
+            "annotations": {
+                "summary": "This is a load test alert created by Robusta",
+                "description": "Nothing wrong here. This alert will be resolved soon",
+            },
+        }
+        for index in range(count)
+    ]
+
+
+def _post_batch(session: requests.Session, url: str, batch: List[Dict], timeout: float) -> BatchResult:
+    start = time.time()
+    result = BatchResult(alerts=len(batch), sent_at=start)
+    try:
+        response = session.post(url, json=batch, timeout=timeout)
+        result.status = response.status_code
+        if not result.ok:
+            result.error = response.text
+    except requests.RequestException as e:
+        result.error = str(e)
+    result.latency_ms = round((time.time() - start) * 1000, 1)
+    return result
+
+
+def send_alerts(
+    alertmanager_url: str,
+    alerts: List[Dict],
+    phase: str,
+    rate: float,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    request_timeout: float = DEFAULT_REQUEST_TIMEOUT_SECONDS,
+    on_sent: Optional[Callable[[List[Dict], float], None]] = None,
+) -> PhaseReport:
+    """
+    POST the alerts to alertmanager in batches, paced to rate alerts per second. Batches are sent by a pool of
+    workers, so a slow response doesn't hold back the following batches. In-cluster alertmanager urls are reached
+    through the API server service proxy.
+
+    on_sent is called with each batch alertmanager accepted, and the time it was sent
+    """
+    if rate <= 0:
+        raise AlertLoadException("The rate must be positive")
+    batch_size = max(1, min(batch_size, int(rate * BATCH_INTERVAL_SECONDS)))
+    base_url, session = direct_alertmanager_session(alertmanager_url)
+    url = f"{base_url}/api/v2/alerts"
+    report = PhaseReport(phase=phase)
+
+    session.mount(url, HTTPAdapter(pool_maxsize=max(concurrency, 1)))
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        futures = []
+        for offset in range(0, len(alerts), batch_size):
+            delay = start + offset / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            batch = alerts[offset : offset + batch_size]
+            futures.append((batch, pool.submit(_post_batch, session, url, batch, request_timeout)))
+
+        for batch, future in futures:
+            result = future.result()
+            report.add(result)
+            if on_sent and result.ok:
+                on_sent(batch, result.sent_at)
+    report.elapsed_seconds = round(time.monotonic() - start, 3)
+    session.close()
+    return report
+
+
+def run_alert_load(
+    alertmanager_url: str,
+    alerts: List[Dict],
+    rate: float,
+    resolve: bool = True,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    request_timeout: float = DEFAULT_REQUEST_TIMEOUT_SECONDS,
+    tracker: Optional[AlertLatencyTracker] = None,
+    measure_timeout: float = DEFAULT_MEASURE_TIMEOUT_SECONDS,
+) -> Tuple[List[PhaseReport], Optional[LatencyReport]]:
+    """
+    Fire the alerts, then resolve them at the same rate.
+    With a tracker, the alerts are resolved only once the runner processed them, or measure_timeout passed
+    """
+    if tracker:
+        alerts = tracker.tag(alerts)
+    firing = [{**alert, "startsAt": _now()} for alert in alerts]
+    send_args = (rate, batch_size, concurrency, request_timeout)
+    on_sent = tracker.sent if tracker else None
+    reports = [send_alerts(alertmanager_url, firing, "firing", *send_args, on_sent=on_sent)]
+    latency = tracker.wait(measure_timeout) if tracker else None
+    if resolve:
+        resolved = [{**alert, "endsAt": _now()} for alert in firing]
+        reports.append(send_alerts(alertmanager_url, resolved, "resolved", *send_args))
+    return reports, latency
+
+
+def create_alert_load(
+    alertmanager_url: Optional[str],
+    namespaces: List[str],
+    alert: str,
+    labels: Optional[str],
+    kube_config: Optional[str],
+    count: int,
+    rate: float,
+    resolve: bool = True,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    measure: bool = False,
+    runner_namespace: Optional[str] = None,
+    measure_timeout: float = DEFAULT_MEASURE_TIMEOUT_SECONDS,
+) -> Tuple[str, List[PhaseReport], Optional[LatencyReport]]:
+    """
+    Send count distinct demo alerts to alertmanager, from the cli. Returns the run id, set as the robusta_load_test
+    label of every alert, a report per phase and, when measuring, the latency of the runner processing the alerts
+    """
+    load_kube_config(kube_config)
+    discovered = not alertmanager_url
+    alertmanager_url = get_alertmanager_url(alertmanager_url, kube_config)
+    pods = find_alert_pods(namespaces, LOAD_TEST_PODS_PER_NAMESPACE)
+    if not pods:
+        raise AlertLoadException(
+            f"Could not find any running pod on namespace {namespaces}. "
+            "Please use the --namespaces parameter to specify a namespace with pods"
+        )
+
+    run_id = uuid.uuid4().hex[:12]
+    alerts = build_load_alerts(count, alert, pods, parse_alert_labels(labels), run_id)
+    with measure_alert_latency(runner_namespace, run_id) if measure else nullcontext() as tracker:
+        reports, latency = run_alert_load(
+            alertmanager_url,
+            alerts,
+            rate,
+            resolve,
+            batch_size,
+            tracker=tracker,
+            measure_timeout=measure_timeout,
+        )
+    if discovered and reports[0].failed_alerts == reports[0].alerts:  # alertmanager may have moved
+        forget_discovered_alertmanager_url(kube_config)
+    return run_id, reports, latency
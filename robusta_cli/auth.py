@@ -1,6 +1,5 @@
 import base64
 import re
-import subprocess
 import traceback
 import uuid
 from typing import Optional
@@ -8,15 +7,16 @@ from typing import Optional
 import click_spinner
 import requests
 import typer
-import yaml
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat, PublicFormat
 from dpath.util import get
 from pydantic import BaseModel
 
 from robusta_cli.backend_profile import backend_profile
-from robusta_cli.playbooks_cmd import NAMESPACE_EXPLANATION, get_playbooks_config
-from robusta_cli.utils import exec_in_robusta_runner_output, namespace_to_kubectl
+from robusta_cli.cluster_backend import get_cluster_backend
+from robusta_cli.playbooks_cmd import NAMESPACE_EXPLANATION
+from robusta_cli.playbooks_config import get_playbooks_config
+from robusta_cli.utils import exec_in_robusta_runner_output
 
 AUTH_SECRET_NAME = "robusta-auth-config-secret"
 app = typer.Typer(add_completion=False)
@@ -46,14 +46,10 @@ def gen_rsa_pair() -> RSAKeyPair:
 
 def get_existing_auth_config(namespace: str) -> Optional[RSAKeyPair]:
     try:
-        secret_content = subprocess.check_output(
-            f"kubectl get secret {namespace_to_kubectl(namespace)} {AUTH_SECRET_NAME} -o yaml",
-            shell=True,
-        )
+        auth_secret = get_cluster_backend().get_secret(namespace, AUTH_SECRET_NAME)
     except Exception:
         return None
 
-    auth_secret = yaml.safe_load(secret_content)
     return RSAKeyPair(
         prv=base64.b64decode(auth_secret["data"]["prv"]).decode(),
         pub=base64.b64decode(auth_secret["data"]["pub"]).decode(),
@@ -118,9 +114,7 @@ def gen_token(
         return
 
     playbooks_config = get_playbooks_config(namespace)
-    active_playbooks_file = playbooks_config["data"]["active_playbooks.yaml"]
-    playbooks_config_yaml = yaml.safe_load(active_playbooks_file)
-    signing_key = get(playbooks_config_yaml, "global_config/signing_key", default=None)
+    signing_key = get(playbooks_config.config, "global_config/signing_key", default=None)
     if not signing_key:
         typer.secho("signing_key is not defined. Please update Robusta and run `robusta update-config`", fg="red")
         return
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+from pydantic import BaseModel, ValidationError
+
+from robusta_cli.runner_api import AsyncRunnerApiClient, RunnerApiException, get_runner_api_client
+from robusta_cli.yaml_utils import safe_load
+
+DEFAULT_CONCURRENCY = 10
+DEFAULT_REQUEST_TIMEOUT_SECONDS = 60
+
+
+class BulkTriggerException(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class TriggerRequest(BaseModel):
+    action_name: str
+    action_params: Dict[str, Any] = {}
+
+
+def load_trigger_requests(path: str) -> List[TriggerRequest]:
+    """
+    Trigger requests from a JSONL file (one request per line), or a yaml file with a list of requests
+    """
+    with open(path, "r") as requests_file:
+        if path.endswith((".yaml", ".yml")):
+            items = safe_load(requests_file) or []
+            if not isinstance(items, list):
+                raise BulkTriggerException(f"{path} should contain a list of trigger requests")
+        else:
+            try:
+                items = [json.loads(line) for line in requests_file if line.strip()]
+            except ValueError as e:
+                raise BulkTriggerException(f"{path} is not a valid JSONL file: {e}")
+
+    try:
+        return [TriggerRequest(**item) for item in items]
+    except (TypeError, ValidationError) as e:
+        raise BulkTriggerException(f"Invalid trigger request in {path}: {e}")
+
+
+async def _trigger(
+    client: AsyncRunnerApiClient,
+    semaphore: asyncio.Semaphore,
+    index: int,
+    trigger_request: TriggerRequest,
+    timeout: float,
+) -> Dict:
+    async with semaphore:
+        start = time.time()
+        result = {"index": index, "action_name": trigger_request.action_name}
+        try:
+            response = await client.trigger(trigger_request.action_name, trigger_request.action_params, timeout)
+            result["status"] = response.status_code
+            result["response"] = response.text
+        except (requests.RequestException, RunnerApiException) as e:
+            result["status"] = 0
+            result["error"] = str(e)
+        result["latency_ms"] = round((time.time() - start) * 1000, 1)
+        return result
+
+
+async def _run_bulk_trigger(
+    namespace: Optional[str],
+    trigger_requests: List[TriggerRequest],
+    on_result: Callable[[Dict], None],
+    concurrency: int,
+    request_timeout: float,
+):
+    concurrency = max(concurrency, 1)
+    client = AsyncRunnerApiClient(get_runner_api_client(namespace), max_workers=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    try:
+        tasks = [
+            _trigger(client, semaphore, index, trigger_request, request_timeout)
+            for index, trigger_request in enumerate(trigger_requests)
+        ]
+        for task in asyncio.as_completed(tasks):
+            on_result(await task)
+    finally:
+        client.close()
+
+
+def run_bulk_trigger(
+    namespace: Optional[str],
+    trigger_requests: List[TriggerRequest],
+    on_result: Callable[[Dict], None],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    request_timeout: float = DEFAULT_REQUEST_TIMEOUT_SECONDS,
+):
+    """
+    Send all the trigger requests over the shared runner api connection, at most `concurrency` at a time.
+    on_result is called with each result as it arrives
+    """
+    asyncio.run(_run_bulk_trigger(namespace, trigger_requests, on_result, concurrency, request_timeout))
@@ -0,0 +1,792 @@
+import base64
+import json
+import os
+import re
+import select
+import shlex
+import shutil
+import socket
+import subprocess
+import tarfile
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import IO, Dict, Iterator, List, Optional
+
+import typer
+
+# "api" talks to the kube api server directly with the kubernetes client. "kubectl" shells out to kubectl
+CLUSTER_BACKEND = os.environ.get("ROBUSTA_CLUSTER_BACKEND", "api")
+RUNNER_CONTAINER = "runner"
+STREAM_CHUNK_SIZE = 64 * 1024
+# owner of the fields set with server side apply
+FIELD_MANAGER = "robusta-cli"
+
+STDOUT_CHANNEL = 1
+STDERR_CHANNEL = 2
+PORT_FORWARD_PATTERN = re.compile(r"Forwarding from 127\.0\.0\.1:(\d+)")
+
+
+class PortForward(ABC):
+    """
+    A forward from a local port to a pod port, open until closed
+    """
+
+    def __init__(self, local_port: int):
+        self.local_port = local_port
+
+    @abstractmethod
+    def close(self):
+        pass
+
+
+class ClusterBackend(ABC):
+    """
+    The cluster operations used by the cli.
+
+    Commands fail with subprocess.CalledProcessError, whichever backend runs them, so callers can handle errors the
+    same way for both. The error output is available on `output` (stdout) and `stderr`
+    """
+
+    def __init__(self, context: Optional[str] = None):
+        self.context = context
+
+    @abstractmethod
+    def list_pods(
+        self, namespace: Optional[str], label_selector: str, field_selector: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Returns the name, uid and container names of the matching pods
+        """
+        pass
+
+    @abstractmethod
+    def exec(
+        self,
+        pod: str,
+        namespace: Optional[str],
+        command: str,
+        container: str = RUNNER_CONTAINER,
+        stdin: Optional[IO[bytes]] = None,
+        stdout: Optional[IO[bytes]] = None,
+    ) -> bytes:
+        """
+        Run a bash command in the pod. stdin, if given, is streamed to the command.
+        The command output is returned, or written to `stdout` when given
+        """
+        pass
+
+    @abstractmethod
+    def logs(
+        self,
+        pod: str,
+        namespace: Optional[str],
+        container: str = RUNNER_CONTAINER,
+        since_seconds: Optional[int] = None,
+        tail_lines: Optional[int] = None,
+        follow: bool = False,
+        timestamps: bool = False,
+    ) -> Iterator[str]:
+        """
+        Stream the pod logs line by line, without the trailing newline
+        """
+        pass
+
+    @abstractmethod
+    def get_secret(self, namespace: Optional[str], name: str) -> Dict:
+        """
+        The secret as it would be returned by `kubectl get secret -o yaml`
+        """
+        pass
+
+    @abstractmethod
+    def get_secret_metadata(self, namespace: Optional[str], name: str) -> Optional[Dict]:
+        """
+        The metadata of the secret, without its data, or None if there's no such secret
+        """
+        pass
+
+    @abstractmethod
+    def apply_secret(
+        self, namespace: Optional[str], name: str, data: Dict[str, bytes], annotations: Optional[Dict[str, str]] = None
+    ):
+        """
+        Create or update the secret with a single server side apply
+        """
+        pass
+
+    @abstractmethod
+    def annotate_pods(self, namespace: Optional[str], label_selector: str, annotations: Dict[str, str]):
+        pass
+
+    @abstractmethod
+    def port_forward(self, pod: str, namespace: Optional[str], remote_port: int) -> PortForward:
+        """
+        Forward a free local port on 127.0.0.1 to remote_port of the pod
+        """
+        pass
+
+    def copy_to_pod(
+        self, local_path: str, pod: str, namespace: Optional[str], remote_path: str, container: str = RUNNER_CONTAINER
+    ):
+        """
+        Copy the content of a local directory into remote_path, which is created if needed
+        """
+        with tempfile.TemporaryFile() as tar_file:
+            with tarfile.open(fileobj=tar_file, mode="w:gz") as tar:
+                tar.add(local_path, arcname=".")
+            tar_file.seek(0)
+            self.exec(
+                pod,
+                namespace,
+                f"mkdir -p {shlex.quote(remote_path)} && tar xzf - -C {shlex.quote(remote_path)}",
+                container=container,
+                stdin=tar_file,
+            )
+
+    def copy_from_pod(
+        self, pod: str, namespace: Optional[str], remote_path: str, local_path: str, container: str = RUNNER_CONTAINER
+    ):
+        """
+        Copy the content of a remote directory into local_path, which is created if needed
+        """
+        with tempfile.TemporaryFile() as tar_file:
+            self.exec(
+                pod, namespace, f"tar czf - -C {shlex.quote(remote_path)} .", container=container, stdout=tar_file
+            )
+            tar_file.seek(0)
+            os.makedirs(local_path, exist_ok=True)
+            with tarfile.open(fileobj=tar_file, mode="r:gz") as tar:
+                extract_tar(tar, local_path)
+
+
+def _check_tar_member(member: tarfile.TarInfo, root: str):
+    """
+    Refuse members that would write outside root: absolute paths, .. components, links pointing outside and devices
+    """
+    target = os.path.realpath(os.path.join(root, member.name))
+    if member.issym():
+        link_target = os.path.realpath(os.path.join(os.path.dirname(target), member.linkname))
+    elif member.islnk():
+        link_target = os.path.realpath(os.path.join(root, member.linkname))
+    else:
+        link_target = target
+    for path in (target, link_target):
+        if os.path.commonpath([root, path]) != root:
+            raise tarfile.TarError(f"Refusing to extract {member.name}, it points outside {root}")
+    if member.isdev():
+        raise tarfile.TarError(f"Refusing to extract {member.name}, it is a device file")
+
+
+def extract_tar(tar: tarfile.TarFile, local_path: str):
+    if hasattr(tarfile, "data_filter"):
+        # refuse absolute paths, links outside local_path etc. Available on patched python versions
+        tar.extractall(local_path, filter="data")
+        return
+
+    # the tarball comes from the runner pod, so it isn't trusted. Members are checked one by one as they are
+    # extracted, which also works for tars read as a stream
+    root = os.path.realpath(local_path)
+    for member in tar:
+        _check_tar_member(member, root)
+        tar.extract(member, local_path)
+
+
+def _secret_manifest(
+    namespace: Optional[str], name: str, data: Dict[str, bytes], annotations: Optional[Dict[str, str]] = None
+) -> Dict:
+    metadata = {"name": name}
+    if namespace:
+        metadata["namespace"] = namespace
+    if annotations:
+        metadata["annotations"] = annotations
+    return {
+        "apiVersion": "v1",
+        "kind": "Secret",
+        "type": "Opaque",
+        "metadata": metadata,
+        "data": {key: base64.b64encode(value).decode() for key, value in data.items()},
+    }
+
+
+def _seekable_size(file: IO[bytes]) -> int:
+    position = file.tell()
+    file.seek(0, os.SEEK_END)
+    size = file.tell() - position
+    file.seek(position)
+    return size
+
+
+class KubectlBackend(ClusterBackend):
+    """
+    Runs every operation with kubectl. Used when the kube api can't be reached with the kubernetes client
+    """
+
+    def _kubectl(self, namespace: Optional[str], *args: str) -> List[str]:
+        cmd = ["kubectl"]
+        if self.context:
+            cmd.append(f"--context={self.context}")
+        if namespace:
+            cmd += ["-n", namespace]
+        return cmd + list(args)
+
+    def _run(self, cmd: List[str], stdin: Optional[IO[bytes]] = None, stdout: Optional[IO[bytes]] = None) -> bytes:
+        with tempfile.TemporaryFile() as stderr_file:
+            proc = subprocess.Popen(
+                cmd, stdin=subprocess.PIPE if stdin else None, stdout=subprocess.PIPE, stderr=stderr_file
+            )
+            if stdin:
+                writer = threading.Thread(target=self._write_stdin, args=(stdin, proc.stdin), daemon=True)
+                writer.start()
+            output = bytearray()
+            # read1 returns what's available, so output written to `stdout` is streamed as the command produces it
+            for chunk in iter(lambda: proc.stdout.read1(STREAM_CHUNK_SIZE), b""):
+                if stdout:
+                    stdout.write(chunk)
+                else:
+                    output += chunk
+            proc.wait()
+            stderr_file.seek(0)
+            stderr = stderr_file.read()
+
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, output=bytes(output), stderr=stderr)
+        return bytes(output)
+
+    @staticmethod
+    def _write_stdin(source: IO[bytes], target: IO[bytes]):
+        try:
+            shutil.copyfileobj(source, target, STREAM_CHUNK_SIZE)
+        except BrokenPipeError:
+            pass  # the command exited without reading everything. Its exit code tells why
+        finally:
+            target.close()
+
+    def list_pods(
+        self, namespace: Optional[str], label_selector: str, field_selector: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        args = ["get", "pods", f"--selector={label_selector}", "--no-headers"]
+        if field_selector:
+            args.append(f"--field-selector={field_selector}")
+        args.append("-o=custom-columns=:metadata.name,:metadata.uid,:spec.containers[*].name")
+        output = self._run(self._kubectl(namespace, *args)).decode()
+        pods = []
+        for line in output.splitlines():
+            fields = line.split()
+            if len(fields) >= 2:
+                containers = fields[2].split(",") if len(fields) > 2 else []
+                pods.append({"name": fields[0], "uid": fields[1], "containers": containers})
+        return pods
+
+    def exec(
+        self,
+        pod: str,
+        namespace: Optional[str],
+        command: str,
+        container: str = RUNNER_CONTAINER,
+        stdin: Optional[IO[bytes]] = None,
+        stdout: Optional[IO[bytes]] = None,
+    ) -> bytes:
+        exec_args = ["exec", "-i"] if stdin else ["exec"]
+        cmd = self._kubectl(namespace, *exec_args, pod, "-c", container, "--", "bash", "-c", command)
+        return self._run(cmd, stdin=stdin, stdout=stdout)
+
+    def logs(
+        self,
+        pod: str,
+        namespace: Optional[str],
+        container: str = RUNNER_CONTAINER,
+        since_seconds: Optional[int] = None,
+        tail_lines: Optional[int] = None,
+        follow: bool = False,
+        timestamps: bool = False,
+    ) -> Iterator[str]:
+        args = ["logs", pod, "-c", container]
+        if since_seconds is not None:
+            args.append(f"--since={since_seconds}s")
+        if tail_lines is not None:
+            args.append(f"--tail={tail_lines}")
+        if follow:
+            args.append("-f")
+        if timestamps:
+            args.append("--timestamps")
+        cmd = self._kubectl(namespace, *args)
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            for line in proc.stdout:
+                yield line.decode("utf-8", errors="replace").rstrip("\n")
+            proc.wait()
+            if proc.returncode:
+                raise subprocess.CalledProcessError(proc.returncode, cmd, output=b"", stderr=proc.stderr.read())
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+    def get_secret(self, namespace: Optional[str], name: str) -> Dict:
+        return json.loads(self._run(self._kubectl(namespace, "get", "secret", name, "-o", "json")))
+
+    def get_secret_metadata(self, namespace: Optional[str], name: str) -> Optional[Dict]:
+        output = self._run(
+            self._kubectl(namespace, "get", "secret", name, "--ignore-not-found", "-o", "jsonpath={.metadata}")
+        )
+        return json.loads(output) if output.strip() else None
+
+    def apply_secret(
+        self, namespace: Optional[str], name: str, data: Dict[str, bytes], annotations: Optional[Dict[str, str]] = None
+    ):
+        manifest = json.dumps(_secret_manifest(namespace, name, data, annotations)).encode()
+        with tempfile.TemporaryFile() as manifest_file:
+            manifest_file.write(manifest)
+            manifest_file.seek(0)
+            apply_args = ["apply", "--server-side", "--force-conflicts", f"--field-manager={FIELD_MANAGER}", "-f", "-"]
+            self._run(self._kubectl(namespace, *apply_args), stdin=manifest_file)
+
+    def annotate_pods(self, namespace: Optional[str], label_selector: str, annotations: Dict[str, str]):
+        annotation_args = [f"{key}={value}" for key, value in annotations.items()]
+        self._run(self._kubectl(namespace, "annotate", "pods", "-l", label_selector, "--overwrite", *annotation_args))
+
+    def port_forward(self, pod: str, namespace: Optional[str], remote_port: int) -> PortForward:
+        return _KubectlPortForward(
+            self._kubectl(namespace, "port-forward", "--address=127.0.0.1", f"pod/{pod}", f":{remote_port}")
+        )
+
+    def copy_to_pod(
+        self, local_path: str, pod: str, namespace: Optional[str], remote_path: str, container: str = RUNNER_CONTAINER
+    ):
+        self.exec(pod, namespace, f"mkdir -p {shlex.quote(remote_path)}", container=container)
+        self._run(self._kubectl(namespace, "cp", f"{local_path}/.", f"{pod}:{remote_path}", "-c", container))
+
+    def copy_from_pod(
+        self, pod: str, namespace: Optional[str], remote_path: str, local_path: str, container: str = RUNNER_CONTAINER
+    ):
+        self._run(self._kubectl(namespace, "cp", f"{pod}:{remote_path}/", local_path, "-c", container))
+
+
+class KubernetesApiBackend(ClusterBackend):
+    """
+    Talks to the kube api server with one pooled ApiClient per context, instead of a kubectl process per operation
+    """
+
+    def __init__(self, context: Optional[str] = None):
+        super().__init__(context)
+        from kubernetes import client, config
+
+        from robusta_cli.custom_ca import apply_custom_ca_to_kube_client
+
+        configuration = client.Configuration()
+        # the kubernetes client reads KUBECONFIG once, on import. It's read again, so a kube config file selected
+        # later (e.g. with --kube-config) is used
+        config_file = os.environ.get("KUBECONFIG")
+        try:
+            config.load_kube_config(
+                config_file, context=context, client_configuration=configuration, persist_config=False
+            )
+            self.namespace = self._context_namespace(config_file, context)
+        except config.ConfigException:
+            if context:
+                raise
+            config.load_incluster_config(client_configuration=configuration)
+            self.namespace = self._incluster_namespace()
+        apply_custom_ca_to_kube_client(configuration)
+
+        self.api_client = client.ApiClient(configuration)
+        self.core_v1 = client.CoreV1Api(self.api_client)
+        # websocket calls (exec, port-forward) temporarily swap the request method of their ApiClient.
+        # They get their own client, so concurrent regular calls are never routed through a websocket
+        self.ws_core_v1 = client.CoreV1Api(client.ApiClient(configuration))
+        self._ws_lock = threading.Lock()
+
+    @staticmethod
+    def _context_namespace(config_file: Optional[str], context: Optional[str]) -> str:
+        from kubernetes import config
+
+        contexts, active_context = config.list_kube_config_contexts(config_file)
+        if context:
+            active_context = next((ctx for ctx in contexts if ctx["name"] == context), active_context)
+        return (active_context or {}).get("context", {}).get("namespace") or "default"
+
+    @staticmethod
+    def _incluster_namespace() -> str:
+        try:
+            with open("/var/run/secrets/kubernetes.io/serviceaccount/namespace") as namespace_file:
+                return namespace_file.read().strip()
+        except OSError:
+            return "default"
+
+    def _ns(self, namespace: Optional[str]) -> str:
+        return namespace or self.namespace
+
+    @staticmethod
+    def _command_error(error: Exception, cmd) -> subprocess.CalledProcessError:
+        message = getattr(error, "body", None) or getattr(error, "reason", None) or str(error)
+        if isinstance(message, bytes):
+            message = message.decode("utf-8", errors="replace")
+        return subprocess.CalledProcessError(
+            getattr(error, "status", None) or 1, cmd, output=b"", stderr=str(message).encode()
+        )
+
+    def list_pods(
+        self, namespace: Optional[str], label_selector: str, field_selector: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        pods = self.core_v1.list_namespaced_pod(
+            self._ns(namespace), label_selector=label_selector, field_selector=field_selector
+        )
+        return [
+            {
+                "name": pod.metadata.name,
+                "uid": pod.metadata.uid,
+                "containers": [container.name for container in pod.spec.containers],
+            }
+            for pod in pods.items
+        ]
+
+    def exec(
+        self,
+        pod: str,
+        namespace: Optional[str],
+        command: str,
+        container: str = RUNNER_CONTAINER,
+        stdin: Optional[IO[bytes]] = None,
+        stdout: Optional[IO[bytes]] = None,
+    ) -> bytes:
+        from kubernetes.client.rest import ApiException
+        from kubernetes.stream import stream
+
+        # stdin can't be half-closed over the exec websocket, so the command gets exactly the bytes we send.
+        # The websocket client decodes output as text, so the output is base64 encoded to keep binary data intact
+        remote_command = f"({command})"
+        if stdin:
+            remote_command = f"head -c {_seekable_size(stdin)} | {remote_command}"
+        remote_command = f"set -o pipefail; {remote_command} | base64"
+
+        try:
+            with self._ws_lock:
+                resp = stream(
+                    self.ws_core_v1.connect_get_namespaced_pod_exec,
+                    pod,
+                    self._ns(namespace),
+                    container=container,
+                    command=["bash", "-c", remote_command],
+                    stdin=stdin is not None,
+                    stdout=True,
+                    stderr=True,
+                    tty=False,
+                    capture_all=False,
+                    _preload_content=False,
+                )
+        except ApiException as e:
+            raise self._command_error(e, command)
+
+        decoder = _Base64StreamDecoder()
+        output = bytearray()
+        stderr = []
+        try:
+            if stdin:
+                for chunk in iter(lambda: stdin.read(STREAM_CHUNK_SIZE), b""):
+                    resp.write_stdin(chunk)
+            while resp.is_open():
+                resp.update(timeout=1)
+                decoded = decoder.feed(resp.read_channel(STDOUT_CHANNEL))
+                stderr.append(resp.read_channel(STDERR_CHANNEL))
+                if stdout:
+                    stdout.write(decoded)
+                else:
+                    output += decoded
+            decoded = decoder.feed(resp.read_channel(STDOUT_CHANNEL)) + decoder.flush()
+            stderr.append(resp.read_channel(STDERR_CHANNEL))
+            if stdout:
+                stdout.write(decoded)
+            else:
+                output += decoded
+            returncode = resp.returncode
+        finally:
+            resp.close()
+
+        if returncode:
+            raise subprocess.CalledProcessError(
+                returncode, command, output=bytes(output), stderr="".join(stderr).encode()
+            )
+        return bytes(output)
+
+    def logs(
+        self,
+        pod: str,
+        namespace: Optional[str],
+        container: str = RUNNER_CONTAINER,
+        since_seconds: Optional[int] = None,
+        tail_lines: Optional[int] = None,
+        follow: bool = False,
+        timestamps: bool = False,
+    ) -> Iterator[str]:
+        from kubernetes.client.rest import ApiException
+
+        try:
+            resp = self.core_v1.read_namespaced_pod_log(
+                pod,
+                self._ns(namespace),
+                container=container,
+                since_seconds=since_seconds,
+                tail_lines=tail_lines,
+                follow=follow,
+                timestamps=timestamps,
+                _preload_content=False,
+            )
+        except ApiException as e:
+            raise self._command_error(e, f"logs {pod}")
+
+        try:
+            pending = b""
+            for chunk in resp.stream(STREAM_CHUNK_SIZE):
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    yield line.decode("utf-8", errors="replace")
+            if pending:
+                yield pending.decode("utf-8", errors="replace")
+        finally:
+            resp.release_conn()
+
+    def get_secret(self, namespace: Optional[str], name: str) -> Dict:
+        from kubernetes.client.rest import ApiException
+
+        try:
+            secret = self.core_v1.read_namespaced_secret(name, self._ns(namespace))
+        except ApiException as e:
+            raise self._command_error(e, f"get secret {name}")
+        return self.api_client.sanitize_for_serialization(secret)
+
+    def _call(
+        self,
+        method: str,
+        path: str,
+        body: Optional[Dict] = None,
+        query_params: Optional[List] = None,
+        content_type: str = "application/json",
+        accept: str = "application/json",
+    ) -> Dict:
+        """
+        A raw api call, for requests the generated client methods can't express (metadata only reads, apply patches)
+        """
+        return self.api_client.call_api(
+            path,
+            method,
+            query_params=query_params or [],
+            header_params={"Accept": accept, "Content-Type": content_type},
+            body=body,
+            response_type="object",
+            auth_settings=["BearerToken"],
+            _return_http_data_only=True,
+        )
+
+    def get_secret_metadata(self, namespace: Optional[str], name: str) -> Optional[Dict]:
+        from kubernetes.client.rest import ApiException
+
+        try:
+            secret = self._call(
+                "GET",
+                f"/api/v1/namespaces/{self._ns(namespace)}/secrets/{name}",
+                accept="application/json;as=PartialObjectMetadata;g=meta.k8s.io;v=v1",
+            )
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise self._command_error(e, f"get secret {name}")
+        return secret.get("metadata", {})
+
+    def apply_secret(
+        self, namespace: Optional[str], name: str, data: Dict[str, bytes], annotations: Optional[Dict[str, str]] = None
+    ):
+        from kubernetes.client.rest import ApiException
+
+        namespace = self._ns(namespace)
+        try:
+            self._call(
+                "PATCH",
+                f"/api/v1/namespaces/{namespace}/secrets/{name}",
+                body=_secret_manifest(namespace, name, data, annotations),
+                query_params=[("fieldManager", FIELD_MANAGER), ("force", "true")],
+                content_type="application/apply-patch+yaml",
+            )
+        except ApiException as e:
+            raise self._command_error(e, f"apply secret {name}")
+
+    def annotate_pods(self, namespace: Optional[str], label_selector: str, annotations: Dict[str, str]):
+        from kubernetes.client.rest import ApiException
+
+        namespace = self._ns(namespace)
+        body = {"metadata": {"annotations": annotations}}
+        try:
+            for pod in self.list_pods(namespace, label_selector):
+                self.core_v1.patch_namespaced_pod(pod["name"], namespace, body)
+        except ApiException as e:
+            raise self._command_error(e, f"annotate pods {label_selector}")
+
+    def port_forward(self, pod: str, namespace: Optional[str], remote_port: int) -> PortForward:
+        return _ApiPortForward(self, pod, self._ns(namespace), remote_port)
+
+    def _open_port_forward_socket(self, pod: str, namespace: str, remote_port: int):
+        from kubernetes.client.rest import ApiException
+        from kubernetes.stream import portforward
+
+        try:
+            with self._ws_lock:
+                forward = portforward(
+                    self.ws_core_v1.connect_get_namespaced_pod_portforward, pod, namespace, ports=str(remote_port)
+                )
+        except ApiException as e:
+            raise self._command_error(e, f"port-forward {pod}:{remote_port}")
+        return forward, forward.socket(remote_port)
+
+
+class _KubectlPortForward(PortForward):
+    def __init__(self, cmd: List[str]):
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=self._stderr)
+        line = self._proc.stdout.readline()
+        match = PORT_FORWARD_PATTERN.search(line.decode("utf-8", errors="replace"))
+        if not match:
+            self._proc.wait()
+            self._stderr.seek(0)
+            raise subprocess.CalledProcessError(self._proc.returncode, cmd, output=line, stderr=self._stderr.read())
+        super().__init__(int(match.group(1)))
+        # kubectl logs every connection. Keep reading, so it never blocks on a full pipe
+        threading.Thread(target=self._proc.stdout.read, daemon=True).start()
+
+    def close(self):
+        if self._proc.poll() is None:
+            self._proc.terminate()
+            self._proc.wait()
+        self._stderr.close()
+
+
+class _ApiPortForward(PortForward):
+    """
+    Listens on a local port, and relays each accepted connection over its own port-forward websocket.
+    A keep-alive http client therefore opens a single websocket per pooled connection
+    """
+
+    def __init__(self, backend: KubernetesApiBackend, pod: str, namespace: str, remote_port: int):
+        self._backend = backend
+        self._pod = pod
+        self._namespace = namespace
+        self._remote_port = remote_port
+        self._server = socket.create_server(("127.0.0.1", 0))
+        super().__init__(self._server.getsockname()[1])
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client_socket, _ = self._server.accept()
+            except OSError:  # closed
+                return
+            threading.Thread(target=self._relay, args=(client_socket,), daemon=True).start()
+
+    def _relay(self, client_socket: socket.socket):
+        forward = None
+        try:
+            forward, remote_socket = self._backend._open_port_forward_socket(
+                self._pod, self._namespace, self._remote_port
+            )
+            _pipe_sockets(client_socket, remote_socket)
+        except (OSError, subprocess.CalledProcessError):
+            pass  # the client sees the connection closing, and decides whether to retry
+        finally:
+            client_socket.close()
+            if forward:
+                forward.close()
+
+    def close(self):
+        self._server.close()
+
+
+def _pipe_sockets(first: socket.socket, second: socket.socket):
+    """
+    Copy data both ways until either side closes
+    """
+    peers = {first: second, second: first}
+    while True:
+        readable, _, _ = select.select(list(peers), [], [])
+        for sock in readable:
+            data = sock.recv(STREAM_CHUNK_SIZE)
+            if not data:
+                return
+            peers[sock].sendall(data)
+
+
+class _Base64StreamDecoder:
+    def __init__(self):
+        self.pending = ""
+
+    def feed(self, data: str) -> bytes:
+        self.pending += "".join(data.split())
+        complete = len(self.pending) - len(self.pending) % 4
+        decoded = base64.b64decode(self.pending[:complete])
+        self.pending = self.pending[complete:]
+        return decoded
+
+    def flush(self) -> bytes:
+        decoded = base64.b64decode(self.pending) if self.pending else b""
+        self.pending = ""
+        return decoded
+
+
+_backends: Dict[Optional[str], ClusterBackend] = {}
+# creating a backend loads the kubeconfig, which can run exec credential plugins. It's serialized per context, so a
+# slow plugin of one cluster doesn't hold back the others. The global lock only guards the per context locks
+_backend_locks: Dict[Optional[str], threading.Lock] = {}
+_backends_lock = threading.Lock()
+_kube_context: ContextVar[Optional[str]] = ContextVar("kube_context", default=None)
+
+
+def get_kube_context() -> Optional[str]:
+    """
+    The kube context selected with use_kube_context, or None for the current-context of the kubeconfig
+    """
+    return _kube_context.get()
+
+
+@contextmanager
+def use_kube_context(context: Optional[str]):
+    """
+    Run cluster operations against another kube context. The selection is local to the current thread (or task),
+    so clusters can be worked on concurrently
+    """
+    token = _kube_context.set(context)
+    try:
+        yield
+    finally:
+        _kube_context.reset(token)
+
+
+def get_cluster_backend(context: Optional[str] = None) -> ClusterBackend:
+    """
+    The cluster backend of a kube context. Defaults to the context selected with use_kube_context.
+    Backends are created once per process
+    """
+    if context is None:
+        context = get_kube_context()
+    backend = _backends.get(context)
+    if backend is not None:
+        return backend
+
+    with _backends_lock:
+        context_lock = _backend_locks.setdefault(context, threading.Lock())
+    with context_lock:
+        if context not in _backends:
+            _backends[context] = _create_cluster_backend(context)
+        return _backends[context]
+
+
+def _create_cluster_backend(context: Optional[str]) -> ClusterBackend:
+    if CLUSTER_BACKEND == "kubectl":
+        return KubectlBackend(context)
+
+    try:
+        return KubernetesApiBackend(context)
+    except Exception as e:
+        typer.secho(f"Cannot use the kubernetes api directly ({e}). Falling back to kubectl", fg="yellow")
+        return KubectlBackend(context)
@@ -0,0 +1,137 @@
+import atexit
+import base64
+import hashlib
+import os
+import shutil
+import ssl
+import stat
+import tempfile
+from functools import lru_cache
+from typing import Optional
+
+from robusta_cli.utils import get_cache_dir
+
+ADDITIONAL_CERTIFICATE: str = os.environ.get("CERTIFICATE", "")
+CA_BUNDLES_CACHE_DIR = "ca-bundles"
+
+
+def _bundle_fingerprint(custom_ca: str) -> str:
+    import certifi
+
+    # the certifi version is part of the key, so upgrading certifi rebuilds the bundle with the new roots
+    return hashlib.sha256(f"{certifi.__version__}:{custom_ca}".encode()).hexdigest()
+
+
+def _build_ca_bundle(custom_ca: str, bundle_path: str):
+    import certifi
+
+    with open(certifi.where(), "rb") as certifi_bundle:
+        bundle = certifi_bundle.read()
+
+    # write to a temp file and rename, so concurrent cli invocations never see a partial bundle
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(bundle_path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as outfile:
+        outfile.write(bundle)
+        outfile.write(b"\n")
+        outfile.write(base64.b64decode(custom_ca))
+    os.replace(tmp_path, bundle_path)
+
+
+def _private_temp_dir() -> str:
+    """
+    A directory in the shared temp dir that only the current user can write to, the same for every invocation.
+    Raises OSError if the directory was created by someone else, who could have put their own CA in it
+    """
+    user_id = os.getuid() if hasattr(os, "getuid") else None  # the temp dir is already per user on windows
+    path = os.path.join(tempfile.gettempdir(), f"robusta-ca-{user_id if user_id is not None else 'user'}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    path_stat = os.lstat(path)
+    if (
+        not stat.S_ISDIR(path_stat.st_mode)
+        or (user_id is not None and path_stat.st_uid != user_id)
+        or path_stat.st_mode & 0o077
+    ):
+        raise OSError(f"{path} is not a private directory of the current user")
+    return path
+
+
+def _process_temp_dir() -> str:
+    """
+    A private directory of this process, removed when it exits
+    """
+    path = tempfile.mkdtemp(prefix="robusta-ca-")
+    atexit.register(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+@lru_cache(maxsize=None)
+def get_custom_ca_bundle() -> Optional[str]:
+    """
+    Path of a CA bundle with the certifi roots and the custom $CERTIFICATE, or None if no custom certificate is set.
+
+    Bundles are cached by fingerprint under the cli cache dir, or a per user dir in the temp dir when the cache dir
+    can't be created, so after the first run each process pays a single hash check. The certifi bundle in
+    site-packages is never modified.
+    """
+    if not ADDITIONAL_CERTIFICATE:
+        return None
+
+    fingerprint = _bundle_fingerprint(ADDITIONAL_CERTIFICATE)
+    try:
+        bundle_dir = get_cache_dir(CA_BUNDLES_CACHE_DIR)
+    except OSError:  # read-only home dir, for example
+        try:
+            bundle_dir = _private_temp_dir()
+        except OSError:
+            bundle_dir = _process_temp_dir()
+    bundle_path = os.path.join(bundle_dir, f"{fingerprint}.pem")
+
+    if not os.path.exists(bundle_path):
+        _build_ca_bundle(ADDITIONAL_CERTIFICATE, bundle_path)
+    return bundle_path
+
+
+@lru_cache(maxsize=None)
+def get_ssl_context() -> Optional[ssl.SSLContext]:
+    """
+    A single SSLContext trusting the custom certificate, shared by every client in the process
+    """
+    bundle_path = get_custom_ca_bundle()
+    if not bundle_path:
+        return None
+    return ssl.create_default_context(cafile=bundle_path)
+
+
+def install_custom_certificate() -> bool:
+    """
+    Make requests (and everything built on it) trust the custom certificate, without touching the certifi bundle
+    """
+    bundle_path = get_custom_ca_bundle()
+    if not bundle_path:
+        return False
+
+    os.environ.setdefault("REQUESTS_CA_BUNDLE", bundle_path)
+    return True
+
+
+def apply_custom_ca_to_kube_client(configuration=None):
+    """
+    Use the custom certificate for kube api servers that don't have a certificate-authority in the kubeconfig.
+    Must be called after the kube config is loaded. Updates the default client configuration if none is given.
+    """
+    bundle_path = get_custom_ca_bundle()
+    if not bundle_path:
+        return
+
+    from kubernetes import client
+
+    update_default = configuration is None
+    if update_default:
+        configuration = client.Configuration.get_default_copy()
+    if not configuration.ssl_ca_cert:
+        configuration.ssl_ca_cert = bundle_path
+        if update_default:
+            client.Configuration.set_default(configuration)
@@ -1,44 +1,156 @@
 import json
+import logging
+import os
 import random
-from typing import List, Optional
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 
+import requests
 from hikaru.model.rel_1_28 import Container, Job, JobSpec, ObjectMeta, PodSpec, PodTemplateSpec, SecurityContext
 from kubernetes import client, config
-
-from kubernetes.client import V1ServiceList
+from kubernetes.client.exceptions import ApiException
 from kubernetes.client.models.v1_service import V1Service
 
-import logging
+from robusta_cli.alert_latency import AlertLatencyTracker
+from robusta_cli.custom_ca import apply_custom_ca_to_kube_client
+from robusta_cli.utils import TtlCache
+
+ALERTMANAGER_SELECTORS = [
+    "app=kube-prometheus-stack-alertmanager",
+    "app=prometheus,component=alertmanager",
+    "app=prometheus-operator-alertmanager",
+    "app=alertmanager",
+    "app=rancher-monitoring-alertmanager",
+    "app=prometheus-alertmanager",
+    "operated-alertmanager=true",
+    "app.kubernetes.io/name=alertmanager",
+    "app.kubernetes.io/name=vmalertmanager",
+]
+METADATA_ACCEPT = "application/json;as=PartialObjectMetadata;g=meta.k8s.io;v=v1"
+METADATA_LIST_ACCEPT = "application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1"
+ALERTMANAGER_URL_CACHE_FILE = "alertmanager_urls.json"
+ALERTMANAGER_URL_CACHE_TTL_SECONDS = int(os.environ.get("ROBUSTA_ALERTMANAGER_URL_CACHE_TTL", 3600))
+
+# in-cluster service urls, e.g. http://alertmanager.monitoring.svc.cluster.local:9093
+CLUSTER_SERVICE_HOST_PATTERN = re.compile(r"^(?P<name>[a-z0-9-]+)\.(?P<namespace>[a-z0-9-]+)\.svc(\.|$)")
+DIRECT_REQUEST_TIMEOUT_SECONDS = 30
+
+# discovered alertmanager urls, keyed by kubeconfig and context
+alertmanager_url_cache = TtlCache(
+    ALERTMANAGER_URL_CACHE_FILE, ALERTMANAGER_URL_CACHE_TTL_SECONDS, disk_cache=True, kubeconfig_bound=False
+)
+
+
+def _get_metadata(
+    api_client: client.ApiClient, path: str, accept: str = METADATA_ACCEPT, query_params: Optional[List] = None
+) -> Dict:
+    """
+    Get a resource, or a list of resources, with only their metadata
+    """
+    return api_client.call_api(
+        path,
+        "GET",
+        query_params=query_params or [],
+        header_params={"Accept": accept},
+        response_type="object",
+        auth_settings=["BearerToken"],
+        _return_http_data_only=True,
+    )
+
+
+def _list_metadata(api_client: client.ApiClient, path: str, query_params: Optional[List] = None) -> List[Dict]:
+    """
+    List resources, getting only their metadata
+    """
+    return _get_metadata(api_client, path, METADATA_LIST_ACCEPT, query_params).get("items") or []
 
 
 class AlertManagerDiscovery:
+    """
+    Each discovery makes all its requests with a single api client, and so over the same connection pool
+    """
+
+    @staticmethod
+    def list_services(api_client: client.ApiClient) -> List[Dict]:
+        """
+        Metadata of every service in the cluster, without their spec and status, in a single request
+        """
+        return _list_metadata(api_client, "/api/v1/services")
+
+    @staticmethod
+    def selector_matches(label_selector: str, labels: Dict[str, str]) -> bool:
+        """
+        Match an equality based label selector, e.g. app=prometheus,component!=server,release
+        """
+        for requirement in label_selector.split(","):
+            requirement = requirement.strip()
+            if "!=" in requirement:
+                key, value = requirement.split("!=", 1)
+                if labels.get(key.strip()) == value.strip():
+                    return False
+            elif "=" in requirement:
+                key, value = requirement.replace("==", "=").split("=", 1)
+                if labels.get(key.strip()) != value.strip():
+                    return False
+            elif requirement.startswith("!"):
+                if requirement[1:].strip() in labels:
+                    return False
+            elif requirement and requirement not in labels:
+                return False
+        return True
+
+    @staticmethod
+    def service_url(name: str, namespace: str, api_client: client.ApiClient) -> str:
+        service: V1Service = client.CoreV1Api(api_client).read_namespaced_service(name, namespace)
+        port = service.spec.ports[0].port
+        cluster_domain = "cluster.local"
+        return f"http://{name}.{namespace}.svc.{cluster_domain}:{port}"
+
+    @staticmethod
+    def service_exists(service_url: str, api_client: client.ApiClient) -> bool:
+        """
+        Whether the in-cluster service of service_url still exists. Urls of other hosts aren't checked
+        """
+        match = CLUSTER_SERVICE_HOST_PATTERN.match(urlparse(service_url).hostname or "")
+        if not match:
+            return True
+        try:
+            _get_metadata(api_client, f"/api/v1/namespaces/{match['namespace']}/services/{match['name']}")
+        except ApiException as e:
+            if e.status == 404:
+                return False
+            raise
+        return True
 
     @staticmethod
-    def find_service_url(label_selector):
+    def find_service_url(
+        label_selector: str, api_client: client.ApiClient, services: Optional[List[Dict]] = None
+    ) -> Optional[str]:
         """
         Get the url of an in-cluster service with a specific label
         """
-        # we do it this way because there is a weird issue with hikaru's ServiceList.listServiceForAllNamespaces()
-        v1 = client.CoreV1Api()
-        svc_list: V1ServiceList = v1.list_service_for_all_namespaces(label_selector=label_selector)
-        if not svc_list.items:
-            return None
-        svc: V1Service = svc_list.items[0]
-        name = svc.metadata.name
-        namespace = svc.metadata.namespace
-        port = svc.spec.ports[0].port
-        cluster_domain = 'cluster.local'
-        url = f"http://{name}.{namespace}.svc.{cluster_domain}:{port}"
-        logging.info(f"discovered service with label-selector: `{label_selector}` at url: `{url}`")
-        return url
+        if services is None:
+            services = AlertManagerDiscovery.list_services(api_client)
+        for service in services:
+            metadata = service.get("metadata") or {}
+            if AlertManagerDiscovery.selector_matches(label_selector, metadata.get("labels") or {}):
+                url = AlertManagerDiscovery.service_url(metadata["name"], metadata["namespace"], api_client)
+                logging.info(f"discovered service with label-selector: `{label_selector}` at url: `{url}`")
+                return url
+        return None
 
     @staticmethod
-    def find_url(selectors: List[str], error_msg: str) -> Optional[str]:
+    def find_url(selectors: List[str], error_msg: str, api_client: client.ApiClient) -> Optional[str]:
         """
-        Try to autodiscover the url of an in-cluster service
+        Try to autodiscover the url of an in-cluster service. The services are listed once, and matched against each
+        selector in order
         """
+        services = AlertManagerDiscovery.list_services(api_client)
         for label_selector in selectors:
-            service_url = AlertManagerDiscovery.find_service_url(label_selector)
+            service_url = AlertManagerDiscovery.find_service_url(label_selector, api_client, services)
             if service_url:
                 return service_url
 
@@ -46,22 +158,37 @@ class AlertManagerDiscovery:
         return None
 
     @staticmethod
-    def find_alert_manager_url() -> Optional[str]:
+    def find_alert_manager_url(api_client: client.ApiClient) -> Optional[str]:
         return AlertManagerDiscovery.find_url(
-            selectors=[
-                "app=kube-prometheus-stack-alertmanager",
-                "app=prometheus,component=alertmanager",
-                "app=prometheus-operator-alertmanager",
-                "app=alertmanager",
-                "app=rancher-monitoring-alertmanager",
-                "app=prometheus-alertmanager",
-                "operated-alertmanager=true",
-                "app.kubernetes.io/name=alertmanager",
-                "app.kubernetes.io/name=vmalertmanager",
-            ],
+            selectors=ALERTMANAGER_SELECTORS,
             error_msg="Alert manager url could not be found. Add 'alertmanager_url' under global_config",
+            api_client=api_client,
         )
 
+    @staticmethod
+    def cached_alert_manager_url(cache_key: str) -> Optional[str]:
+        """
+        The alertmanager url discovered in the cluster of cache_key, discovered again when the cached one expired or
+        its service is gone, e.g. because alertmanager was reinstalled elsewhere
+        """
+        url = alertmanager_url_cache.get(cache_key)
+        with client.ApiClient() as api_client:
+            if url and not AlertManagerDiscovery.service_exists(url, api_client):
+                alertmanager_url_cache.invalidate(cache_key)
+                url = None
+            if not url:
+                url = AlertManagerDiscovery.find_alert_manager_url(api_client)
+                if url:
+                    alertmanager_url_cache.set(cache_key, url)
+        return url
+
+    @staticmethod
+    def invalidate_cached_url(cache_key: str):
+        """
+        Drop a cached url that turned out to be wrong, e.g. because alertmanager was reinstalled elsewhere
+        """
+        alertmanager_url_cache.invalidate(cache_key)
+
 
 class AlertManagerException(Exception):
     def __init__(self, message: str):
@@ -69,42 +196,161 @@ class AlertManagerException(Exception):
         self.message = message
 
 
+def _kube_context_cache_key(kube_config: Optional[str]) -> str:
+    _, active_context = config.list_kube_config_contexts(kube_config)
+    return f"{kube_config or ''}/{(active_context or {}).get('name', '')}"
+
+
+def _running_pods(api_client: client.ApiClient, namespace: str, limit: int) -> List[Dict]:
+    pods = _list_metadata(
+        api_client,
+        f"/api/v1/namespaces/{namespace}/pods",
+        [("limit", limit), ("fieldSelector", "status.phase=Running")],
+    )
+    return [pod["metadata"] for pod in pods]
+
+
+def find_alert_pods(namespaces: List[str], limit: int) -> List[Dict]:
+    """
+    Metadata of up to limit running pods per namespace, in namespaces order. All namespaces are asked concurrently,
+    over the connection pool of a single api client
+    """
+    if not namespaces:
+        return []
+    with client.ApiClient() as api_client, ThreadPoolExecutor(max_workers=len(namespaces)) as pool:
+        pods = pool.map(lambda namespace: _running_pods(api_client, namespace, limit), namespaces)
+        return [pod for namespace_pods in pods for pod in namespace_pods]
+
+
+def find_alert_pod(namespaces: List[str]) -> Optional[Dict]:
+    """
+    Metadata of a running pod from the first namespace that has one. Each namespace is asked for a single pod
+    """
+    pods = find_alert_pods(namespaces, limit=1)
+    return pods[0] if pods else None
+
+
+def get_alertmanager_url(alertmanager_url: Optional[str], kube_config: Optional[str]) -> str:
+    """
+    The given alertmanager url, or the one discovered in the cluster
+    """
+    if alertmanager_url:
+        return alertmanager_url
+    # search cluster alertmanager by known alertmanager labels
+    alertmanager_url = AlertManagerDiscovery.cached_alert_manager_url(_kube_context_cache_key(kube_config))
+    if not alertmanager_url:
+        raise AlertManagerException(
+            "Alertmanager service could not be auto-discovered. Please use the --alertmanager-url parameter"
+        )
+    return alertmanager_url
+
+
+def parse_alert_labels(labels: Optional[str]) -> Dict[str, str]:
+    alert_labels = {}
+    if labels:
+        for label in labels.split(","):
+            label_key = label.split("=")[0].strip()
+            label_value = label.split("=")[1].strip()
+            alert_labels[label_key] = label_value
+    return alert_labels
+
+
+def forget_discovered_alertmanager_url(kube_config: Optional[str]):
+    AlertManagerDiscovery.invalidate_cached_url(_kube_context_cache_key(kube_config))
+
+
+def service_proxy_url(service_url: str) -> Optional[str]:
+    """
+    The kube API server proxy url of an in-cluster service url, or None for urls of other hosts
+    """
+    parsed = urlparse(service_url)
+    match = CLUSTER_SERVICE_HOST_PATTERN.match(parsed.hostname or "")
+    if not match:
+        return None
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    service = f"{'https:' if parsed.scheme == 'https' else ''}{match['name']}:{port}"
+    api_server = client.Configuration.get_default_copy().host
+    return f"{api_server}/api/v1/namespaces/{match['namespace']}/services/{service}/proxy{parsed.path.rstrip('/')}"
+
+
+def _kube_api_session() -> requests.Session:
+    """
+    A requests session authenticated to the kube API server like the kubernetes client, from the loaded kube config
+    """
+    configuration = client.Configuration.get_default_copy()
+    session = requests.Session()
+    for auth in configuration.auth_settings().values():
+        if auth["in"] == "header" and auth["value"]:
+            session.headers[auth["key"]] = auth["value"]
+    session.verify = configuration.ssl_ca_cert or configuration.verify_ssl
+    if configuration.cert_file:
+        session.cert = (configuration.cert_file, configuration.key_file)
+    if configuration.proxy:
+        session.proxies = {"http": configuration.proxy, "https": configuration.proxy}
+    return session
+
+
+def direct_alertmanager_session(alertmanager_url: str) -> Tuple[str, requests.Session]:
+    """
+    The url to send alerts to from the cli, and the session to send them with. In-cluster service urls aren't
+    reachable from outside the cluster, so they're reached through the API server service proxy
+    """
+    proxy_url = service_proxy_url(alertmanager_url)
+    if proxy_url:
+        return proxy_url, _kube_api_session()
+    return alertmanager_url.rstrip("/"), requests.Session()
+
+
+def post_alerts(alertmanager_url: str, alerts: List[Dict]):
+    url, session = direct_alertmanager_session(alertmanager_url)
+    try:
+        response = session.post(f"{url}/api/v2/alerts", json=alerts, timeout=DIRECT_REQUEST_TIMEOUT_SECONDS)
+    except requests.RequestException as e:
+        raise AlertManagerException(f"Failed to send the alert to {alertmanager_url}: {e}")
+    finally:
+        session.close()
+    if not response.ok:
+        raise AlertManagerException(
+            f"Failed to send the alert to {alertmanager_url}: {response.status_code} {response.text}"
+        )
+
+
+def load_kube_config(kube_config: Optional[str]):
+    """
+    Load the kube config for the kubernetes client. An explicit kube config file also becomes the kubeconfig of the
+    cluster backend, so the runner logs are read from the cluster the alerts are sent to
+    """
+    if kube_config:
+        os.environ["KUBECONFIG"] = kube_config
+    config.load_kube_config(kube_config)
+    apply_custom_ca_to_kube_client()
+
+
 def create_demo_alert(
     alertmanager_url: str,
     namespaces: List[str],
     alert: str,
     labels: str,
     kube_config: str,
-    image: str
+    image: str,
+    direct: bool = False,
+    tracker: Optional[AlertLatencyTracker] = None,
 ):
-    config.load_kube_config(kube_config)
-    if not alertmanager_url:
-        # search cluster alertmanager by known alertmanager labels
-        alertmanager_url = AlertManagerDiscovery.find_alert_manager_url()
-        if not alertmanager_url:
-            raise AlertManagerException("Alertmanager service could not be auto-discovered. Please use the --alertmanager-url parameter")
-
-    pod = None
-    for namespace in namespaces:
-        pods = client.CoreV1Api().list_namespaced_pod(namespace)
-        if pods.items:
-            pod = pods.items[0]
-            break
+    load_kube_config(kube_config)
+    discovered = not alertmanager_url
+    alertmanager_url = get_alertmanager_url(alertmanager_url, kube_config)
 
+    pod = find_alert_pod(namespaces)
     if not pod:
         raise AlertManagerException(f"Could not find any pod on namespace {namespaces}. Please use the --namespaces parameter to specify a namespace with pods")
 
     alert_labels = {
         "alertname": alert,
         "severity": "critical",
-        "pod": pod.metadata.name,
-        "namespace": pod.metadata.namespace,
+        "pod": pod["name"],
+        "namespace": pod["namespace"],
+        **parse_alert_labels(labels),
     }
-    if labels:
-        for label in labels.split(","):
-            label_key = label.split("=")[0].strip()
-            label_value = label.split("=")[1].strip()
-            alert_labels[label_key] = label_value
 
     demo_alerts = [
         {
@@ -116,6 +362,20 @@ def create_demo_alert(
             },
         }
     ]
+    if tracker:
+        demo_alerts = tracker.tag(demo_alerts)
+
+    if direct:
+        try:
+            sent_at = time.time()
+            post_alerts(alertmanager_url, demo_alerts)
+            if tracker:
+                tracker.sent(demo_alerts, sent_at)
+        except AlertManagerException:
+            if discovered:  # alertmanager may have moved. Discover it again next time
+                forget_discovered_alertmanager_url(kube_config)
+            raise
+        return pod["name"], pod["namespace"]
 
     command = [
         "curl",
@@ -131,7 +391,7 @@ def create_demo_alert(
     job: Job = Job(
         metadata=ObjectMeta(
             name=f"alert-job-{random.randint(0, 10000)}",
-            namespace=pod.metadata.namespace,
+            namespace=pod["namespace"],
         ),
         spec=JobSpec(
             template=PodTemplateSpec(
@@ -152,4 +412,4 @@ def create_demo_alert(
         ),
     )
     job.create()
-    return pod.metadata.name, pod.metadata.namespace
+    return pod["name"], pod["namespace"]
@@ -0,0 +1,34 @@
+import importlib
+from typing import Dict, List, Optional, Tuple
+
+import click
+import typer
+from typer.core import TyperGroup
+
+
+class LazyTyperGroup(TyperGroup):
+    """
+    A Typer group whose sub-apps are only imported when they are invoked (or when help is rendered).
+
+    Sub-apps are registered by import path in `lazy_subcommands`, as name -> ("module:attribute", help).
+    This keeps heavy dependencies (kubernetes, hikaru, slack_sdk, cryptography) out of light commands like `version`
+    """
+
+    lazy_subcommands: Dict[str, Tuple[str, str]] = {}
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name in self.lazy_subcommands and cmd_name not in self.commands:
+            self.add_command(self._load_subcommand(cmd_name), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def _load_subcommand(self, cmd_name: str) -> click.Command:
+        import_path, help_text = self.lazy_subcommands[cmd_name]
+        module_name, attribute = import_path.split(":")
+        sub_app: typer.Typer = getattr(importlib.import_module(module_name), attribute)
+        command = typer.main.get_group(sub_app)
+        command.name = cmd_name
+        command.help = help_text
+        return command
@@ -1,64 +1,42 @@
 import base64
 import json
-import os
 import subprocess
+import sys
 import time
 import traceback
 import uuid
+from collections import deque
+from contextlib import nullcontext
 from typing import Dict, List, Optional, Union
 
-import certifi
 import typer
-import yaml
 
 from pydantic import BaseModel, Extra
 
 from robusta_cli._version import __version__
-
-from robusta_cli.auth import app as auth_commands
-from robusta_cli.backend_profile import backend_profile
-from robusta_cli.eula import handle_eula
-from robusta_cli.integrations_cmd import app as integrations_commands
-from robusta_cli.integrations_cmd import get_slack_key, get_ui_key
-from robusta_cli.playbooks_cmd import app as playbooks_commands
-from robusta_cli.self_host import app as self_host_commands
-from robusta_cli.slack_feedback_message import SlackFeedbackMessagesSender
-from robusta_cli.slack_verification import verify_slack_channel
-from robusta_cli.utils import get_runner_pod, log_title, namespace_to_kubectl
+from robusta_cli.custom_ca import ADDITIONAL_CERTIFICATE, install_custom_certificate
+from robusta_cli.lazy_group import LazyTyperGroup
 from robusta_cli.simple_sink_config import MsTeamsSinkConfigWrapper, MsTeamsSinkParams
 from robusta_cli.simple_sink_config import RobustaSinkConfigWrapper, RobustaSinkParams
 from robusta_cli.simple_sink_config import SlackSinkConfigWrapper, SlackSinkParams
-from robusta_cli.demo_alert import create_demo_alert, AlertManagerException
-
-ADDITIONAL_CERTIFICATE: str = os.environ.get("CERTIFICATE", "")
-
-
-def cert_already_exists(new_cert: bytes) -> bool:
-    with open(certifi.where(), "r") as outfile:
-        return str(new_cert, "utf-8") in outfile.read()
+from robusta_cli.utils import get_runner_pod, log_title
+from robusta_cli.yaml_utils import safe_dump
 
+if install_custom_certificate():
+    typer.secho("using custom certificate", fg="green")
 
-def add_custom_certificate(custom_ca: str):
-    if custom_ca:
-        new_cert = base64.b64decode(custom_ca)
-        if not cert_already_exists(new_cert):
-            with open(certifi.where(), "ab") as outfile:
-                outfile.write(base64.b64decode(custom_ca))
-                return True
-        else:
-            typer.secho("using custom certificate", fg="green")
 
-    return False
+class RobustaCommands(LazyTyperGroup):
+    # sub-apps are imported on first use, so light commands don't pay for kubernetes, slack_sdk, cryptography etc.
+    lazy_subcommands = {
+        "playbooks": ("robusta_cli.playbooks_cmd:app", "Playbooks commands menu"),
+        "integrations": ("robusta_cli.integrations_cmd:app", "Integrations commands menu"),
+        "auth": ("robusta_cli.auth:app", "Authentication commands menu"),
+        "self-host": ("robusta_cli.self_host:app", "Self-host commands menu"),
+    }
 
 
-if add_custom_certificate(ADDITIONAL_CERTIFICATE):
-    typer.secho("using custom certificate", fg="green")
-
-app = typer.Typer(add_completion=False)
-app.add_typer(playbooks_commands, name="playbooks", help="Playbooks commands menu")
-app.add_typer(integrations_commands, name="integrations", help="Integrations commands menu")
-app.add_typer(auth_commands, name="auth", help="Authentication commands menu")
-app.add_typer(self_host_commands, name="self-host", help="Self-host commands menu")
+app = typer.Typer(add_completion=False, cls=RobustaCommands)
 
 
 class GlobalConfig(BaseModel):
@@ -99,7 +77,7 @@ def get_slack_channel() -> str:
 
 def write_values_file(output_path: str, values: HelmValues):
     with open(output_path, "w") as output_file:
-        yaml.safe_dump(values.dict(exclude_defaults=True), output_file, sort_keys=False)
+        safe_dump(values.dict(exclude_defaults=True), output_file, sort_keys=False)
         typer.secho(
             f"Saved configuration to {output_path} - save this file for future use!",
             fg="red",
@@ -139,6 +117,11 @@ def gen_config(
     enable_crash_report: bool = typer.Option(None),
 ):
     """Create runtime configuration file"""
+    from robusta_cli.backend_profile import backend_profile
+    from robusta_cli.eula import handle_eula
+    from robusta_cli.integrations_cmd import get_slack_key, get_ui_key
+    from robusta_cli.slack_feedback_message import SlackFeedbackMessagesSender
+    from robusta_cli.slack_verification import verify_slack_channel
 
     # Configure sinks
     typer.secho(
@@ -319,13 +302,34 @@ def version():
 
 
 @app.command()
-def demo():
+def demo(
+    measure: bool = typer.Option(
+        False, help="Measure the time from deploying the crashing pod to the runner processing it, from its logs"
+    ),
+    namespace: str = typer.Option(None, help="Namespace of the Robusta runner, when measuring"),
+):
     """Deliberately deploy a crashing pod to kubernetes so you can test robusta's response"""
+    from robusta_cli.alert_latency import measure_demo_latency
+
     CRASHPOD_YAML = "https://gist.githubusercontent.com/robusta-lab/283609047306dc1f05cf59806ade30b6/raw/crashpod.yaml"
-    log_title("Deploying a crashing pod to kubernetes...")
-    subprocess.check_call(f"kubectl apply -f {CRASHPOD_YAML}", shell=True)
-    log_title("In ~30 seconds you should receive a slack notification on a crashing pod")
-    time.sleep(60)
+    DEMO_WAIT_SECONDS = 60
+    with measure_demo_latency(namespace, uuid.uuid4().hex[:12]) if measure else nullcontext() as measurement:
+        log_title("Deploying a crashing pod to kubernetes...")
+        if measurement:
+            if not measurement.deploy(CRASHPOD_YAML):
+                typer.secho("The replicaset of the crashing pod wasn't created, so it can't be measured", fg="red")
+                measurement = None
+        else:
+            subprocess.check_call(f"kubectl apply -f {CRASHPOD_YAML}", shell=True)
+        deployed = time.time()
+        log_title("In ~30 seconds you should receive a slack notification on a crashing pod")
+        if measurement:
+            latency = measurement.wait(DEMO_WAIT_SECONDS)
+            if latency is None:
+                typer.secho(f"The runner logs didn't show the crashing pod within {DEMO_WAIT_SECONDS}s", fg="red")
+            else:
+                typer.secho(f"The runner processed the crashing pod after {latency:.1f}s", fg="green")
+        time.sleep(max(DEMO_WAIT_SECONDS - (time.time() - deployed), 0))
     subprocess.check_call("kubectl delete deployment crashpod", shell=True)
     log_title("Done!")
 
@@ -341,24 +345,53 @@ def logs(
     tail: int = typer.Option(None, help="Lines of recent log file to display."),
     context: str = typer.Option(None, help="The name of the kubeconfig context to use"),
     resource_name: str = typer.Option(None, help="Robusta Runner deployment or pod name"),
+    all_containers: bool = typer.Option(False, help="Also show the logs of the other containers of the runner pods"),
+    timestamps: bool = typer.Option(False, help="Show the timestamp of each line"),
+    grep: str = typer.Option(None, help="Only show lines matching this regular expression"),
+    level: str = typer.Option(None, help="Only show log records of this level or above, e.g. warning"),
+    playbook: str = typer.Option(None, help="Only show log records mentioning this playbook or action"),
+    json_output: bool = typer.Option(False, "--json", help="Print each line as a json object"),
+    last: int = typer.Option(None, help="Only show the last N matching lines. Not supported with -f"),
 ):
-    """Fetch Robusta runner logs"""
-    stream = "-f" if f else ""
-    since = f"--since={since}" if since else ""
-    tail = f"--tail={tail}" if tail else ""
-    context = f"--context={context}" if context else ""
-    resource_name = resource_name if resource_name else get_runner_pod(namespace)
-
-    if not resource_name:
-        return
+    """Fetch Robusta runner logs. With several runner replicas, their logs are merged by time"""
+    from robusta_cli.cluster_backend import use_kube_context
+    from robusta_cli.runner_logs import LogFilter, LogPrinter, parse_since, stream_runner_logs
+    from robusta_cli.utils import get_runner_pods
+
+    if last is not None and f:
+        raise typer.BadParameter("--last can't be used with -f. Use --tail instead")
+    since_seconds = parse_since(since) if since else None
+    log_filter = LogFilter(grep, level, playbook)
+
+    with use_kube_context(context):
+        if resource_name:
+            # a deployment means the runner deployment, whose pods are all streamed
+            pods = None if resource_name.startswith("deployment") else [resource_name.split("/")[-1]]
+        elif get_runner_pod(namespace):
+            pods = None
+        else:
+            return
 
-    try:
-        subprocess.check_call(
-            f"kubectl logs {stream} {namespace_to_kubectl(namespace)} {resource_name} -c runner {since} {tail} {context}",
-            shell=True,
-        )
-    except Exception:
-        log_title("Error fetching logs. Did you forget to specify --namespace?", color="red")
+        show_source = all_containers or (not pods and len(get_runner_pods(namespace)) > 1)
+        printer = LogPrinter(sys.stdout, timestamps, json_output, show_source, flush=f)
+        # with --last, only the last N formatted lines are kept, whatever the size of the logs
+        last_lines = deque(maxlen=last) if last is not None else None
+        try:
+            for line in stream_runner_logs(namespace, pods, all_containers, since_seconds, tail, follow=f):
+                matches, line_level = log_filter.match(line)
+                if not matches:
+                    continue
+                if last_lines is not None:
+                    last_lines.append(printer.format(line, line_level))
+                else:
+                    printer.write(printer.format(line, line_level))
+        except KeyboardInterrupt:
+            pass
+        except Exception:
+            log_title("Error fetching logs. Did you forget to specify --namespace?", color="red")
+
+        for formatted in last_lines or []:
+            printer.write(formatted)
 
 
 @app.command()
@@ -384,22 +417,159 @@ def demo_alert(
     ),
     kube_config: str = typer.Option(None, help="Kube config file path override."),
     image: str = typer.Option("curlimages/curl", help="Docker image with curl support."),
+    direct: bool = typer.Option(
+        False,
+        help="Send the alert from the cli, through the kube API server service proxy, instead of from a curl Job "
+        "in the cluster",
+    ),
+    count: Optional[int] = typer.Option(
+        None,
+        help="Load mode: send this many distinct alerts from the cli, in batches. "
+        "In-cluster alertmanager urls are reached through the kube API server service proxy",
+    ),
+    rate: float = typer.Option(10.0, help="Load mode: alerts per second"),
+    duration: Optional[float] = typer.Option(
+        None,
+        help="Load mode: seconds to send alerts for. With --count, the rate is count/duration",
+    ),
+    batch_size: int = typer.Option(100, help="Load mode: max alerts per request"),
+    resolve: bool = typer.Option(True, help="Load mode: resolve the alerts once all of them were sent"),
+    measure: bool = typer.Option(
+        False,
+        help="Measure the time from sending each alert to the runner processing it, by following the runner logs. "
+        "Implies --direct",
+    ),
+    measure_timeout: float = typer.Option(120, help="Seconds to wait for the runner to process the alerts"),
+    runner_namespace: str = typer.Option(None, help="Namespace of the Robusta runner, when measuring"),
 ):
     """
     Create a demo alert on AlertManager.
-    The alert pod is selected randomly from the pods in the current namespace
+    The alert pod is selected randomly from the pods in the current namespace.
+
+    With --count or --duration, send many alerts as a load test instead
     """
-    try:
-        pod_name, namespace = create_demo_alert(alertmanager_url, namespaces, alert, labels, kube_config, image)
-        typer.secho(
-            f"Created Alertmanager alert: alert-name: {alert} pod: {pod_name} "
-            f"namespace: {namespace}",
-            fg="green",
+    from robusta_cli.alert_latency import measure_alert_latency
+    from robusta_cli.demo_alert import AlertManagerException, create_demo_alert, load_kube_config
+
+    if count is not None or duration is not None:
+        _demo_alert_load(
+            alertmanager_url,
+            namespaces,
+            alert,
+            labels,
+            kube_config,
+            count,
+            rate,
+            duration,
+            batch_size,
+            resolve,
+            measure,
+            measure_timeout,
+            runner_namespace,
         )
+        return
+
+    try:
+        if measure:
+            # the runner logs are followed from before the alert is created, so they must be read from its cluster
+            load_kube_config(kube_config)
+        with measure_alert_latency(runner_namespace, uuid.uuid4().hex[:12]) if measure else nullcontext() as tracker:
+            pod_name, namespace = create_demo_alert(
+                alertmanager_url, namespaces, alert, labels, kube_config, image, direct or measure, tracker
+            )
+            typer.secho(
+                f"Created Alertmanager alert: alert-name: {alert} pod: {pod_name} "
+                f"namespace: {namespace}",
+                fg="green",
+            )
+            if tracker:
+                _print_latency(tracker.wait(measure_timeout))
         typer.echo("\n")
     except AlertManagerException as e:
         typer.secho(e.message, fg="red")
 
 
+def _print_latency(report):
+    if not report.processed:
+        typer.secho(
+            f"The runner logs didn't show any of the {report.alerts} alerts as processed. "
+            f"Check the runner is receiving alerts, and ROBUSTA_ALERT_PROCESSED_MARKER matches its logs",
+            fg="red",
+        )
+        return
+    typer.secho(
+        f"Processed {report.processed}/{report.alerts} alerts. Latency p50: {report.p50_ms:.0f}ms "
+        f"p95: {report.p95_ms:.0f}ms max: {report.max_ms:.0f}ms",
+        fg="green" if report.processed == report.alerts else "yellow",
+    )
+    if report.dropped_log_lines:
+        typer.secho(f"{report.dropped_log_lines} runner log lines were dropped before they were checked", fg="yellow")
+
+
+def _demo_alert_load(
+    alertmanager_url: Optional[str],
+    namespaces: List[str],
+    alert: str,
+    labels: Optional[str],
+    kube_config: Optional[str],
+    count: Optional[int],
+    rate: float,
+    duration: Optional[float],
+    batch_size: int,
+    resolve: bool,
+    measure: bool,
+    measure_timeout: float,
+    runner_namespace: Optional[str],
+):
+    from robusta_cli.alert_load import AlertLoadException, create_alert_load
+    from robusta_cli.demo_alert import AlertManagerException
+
+    if duration is not None and duration <= 0:
+        typer.secho("The duration must be positive", fg="red")
+        raise typer.Exit(code=1)
+    if count is None:
+        count = int(rate * duration)
+    elif duration is not None:
+        rate = count / duration
+    if count <= 0 or rate <= 0:
+        typer.secho("The alerts count and rate must be positive", fg="red")
+        raise typer.Exit(code=1)
+
+    typer.secho(f"Sending {count} alerts at {rate:g} alerts/s", fg="green")
+    try:
+        run_id, reports, latency = create_alert_load(
+            alertmanager_url,
+            namespaces,
+            alert,
+            labels,
+            kube_config,
+            count,
+            rate,
+            resolve,
+            batch_size,
+            measure,
+            runner_namespace,
+            measure_timeout,
+        )
+    except (AlertManagerException, AlertLoadException) as e:
+        typer.secho(e.message, fg="red")
+        raise typer.Exit(code=1)
+
+    for report in reports:
+        typer.secho(
+            f"{report.phase}: {report.alerts - report.failed_alerts}/{report.alerts} alerts sent in "
+            f"{report.batches} requests, {report.elapsed_seconds:.2f}s, {report.throughput:.1f} alerts/s, "
+            f"max request latency {report.max_latency_ms:.0f}ms",
+            fg="red" if report.failed_alerts else "green",
+        )
+        for error, batches in report.errors.items():
+            typer.secho(f"  {batches} failed requests: {error}", fg="red")
+    typer.echo(f"The alerts are labeled robusta_load_test={run_id}")
+    if latency:
+        _print_latency(latency)
+    if any(report.failed_alerts for report in reports):
+        raise typer.Exit(code=1)
+
+
 if __name__ == "__main__":
     app()
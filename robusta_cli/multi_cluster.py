@@ -0,0 +1,189 @@
+import io
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import ContextVar
+from typing import Callable, List, Optional, Tuple
+
+import typer
+from pydantic import BaseModel
+
+from robusta_cli.cluster_backend import use_kube_context
+from robusta_cli.utils import log_title
+
+DEFAULT_PARALLELISM = 8
+DEFAULT_CLUSTER_TIMEOUT_SECONDS = 600
+
+CONTEXTS_EXPLANATION = "Comma separated kube contexts to run on concurrently, instead of the current context"
+ALL_CONTEXTS_EXPLANATION = "Run on every context of the kubeconfig concurrently"
+PARALLELISM_EXPLANATION = "Maximum number of clusters worked on at the same time, with --contexts or --all-contexts"
+CLUSTER_TIMEOUT_EXPLANATION = (
+    "Seconds after which a cluster is reported as timed out, with --contexts or --all-contexts"
+)
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+STATUS_COLORS = {STATUS_OK: "green", STATUS_FAILED: "red", STATUS_TIMEOUT: "yellow"}
+
+# the output buffer of the cluster job running in the current thread, if any
+_captured_output: ContextVar[Optional[io.StringIO]] = ContextVar("captured_output", default=None)
+
+
+class ContextResult(BaseModel):
+    context: str
+    status: str = STATUS_OK
+    duration: float = 0
+    error: str = ""
+
+
+class _ContextOutput(io.TextIOBase):
+    """
+    stdout replacement that sends the writes of each cluster job to its own buffer, so the output of clusters
+    worked on concurrently isn't interleaved
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        buffer = _captured_output.get()
+        return (buffer if buffer is not None else self.stream).write(text)
+
+    def flush(self):
+        if _captured_output.get() is None:
+            self.stream.flush()
+
+    def isatty(self) -> bool:
+        return self.stream.isatty()
+
+    @property
+    def encoding(self):
+        return self.stream.encoding
+
+    @property
+    def errors(self):
+        return self.stream.errors
+
+
+def list_kube_contexts() -> List[str]:
+    from kubernetes import config
+
+    contexts, _ = config.list_kube_config_contexts()
+    return [context["name"] for context in contexts]
+
+
+def select_contexts(contexts: Optional[str], all_contexts: bool) -> List[str]:
+    available = list_kube_contexts()
+    if all_contexts:
+        return available
+
+    selected = [context.strip() for context in contexts.split(",") if context.strip()]
+    unknown = [context for context in selected if context not in available]
+    if unknown:
+        typer.secho(f"Unknown kube contexts: {', '.join(unknown)}", fg="red")
+        raise typer.Exit(code=1)
+    return selected
+
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, subprocess.CalledProcessError) and error.stderr:
+        stderr = error.stderr.decode("utf-8", errors="replace") if isinstance(error.stderr, bytes) else error.stderr
+        return stderr.strip().splitlines()[-1]
+    if isinstance(error, typer.Exit):
+        return f"exit code {error.exit_code}"
+    return str(error) or type(error).__name__
+
+
+def _run_job(context: str, job: Callable[[], Optional[bool]], timeout: float) -> Tuple[ContextResult, str]:
+    job_result = ContextResult(context=context)
+    output = io.StringIO()
+
+    def run():
+        _captured_output.set(output)
+        try:
+            with use_kube_context(context):
+                succeeded = job()
+            job_result.status = STATUS_FAILED if succeeded is False else STATUS_OK
+        except Exception as e:  # typer.Exit included
+            job_result.status = STATUS_FAILED
+            job_result.error = _error_message(e)
+
+    # the job runs in its own daemon thread, so a hanging cluster can be abandoned without blocking the others.
+    # Threads can't be cancelled, so an abandoned job keeps running until it finishes or the cli exits
+    start = time.time()
+    job_thread = threading.Thread(target=run, daemon=True)
+    job_thread.start()
+    job_thread.join(timeout)
+    duration = time.time() - start
+    if job_thread.is_alive():
+        # a new result, so a job finishing late doesn't change the reported one
+        error = f"no result after {timeout}s. It was not cancelled, and may have been applied partly or fully"
+        return ContextResult(context=context, status=STATUS_TIMEOUT, duration=duration, error=error), output.getvalue()
+    job_result.duration = duration
+    return job_result, output.getvalue()
+
+
+def print_results_table(results: List[ContextResult]):
+    width = max([len("CONTEXT")] + [len(result.context) for result in results])
+    typer.echo(f"{'CONTEXT':<{width}}  {'STATUS':<8}  {'DURATION':>9}  ERROR")
+    for result in results:
+        typer.secho(
+            f"{result.context:<{width}}  {result.status:<8}  {result.duration:>8.1f}s  {result.error}",
+            fg=STATUS_COLORS[result.status],
+        )
+
+
+def run_on_contexts(
+    contexts: List[str], job: Callable[[], Optional[bool]], parallelism: int, timeout: float
+) -> List[ContextResult]:
+    """
+    Run job once per kube context on a bounded pool. Each cluster's output is printed as it finishes.
+    A job fails if it raises, or returns False
+    """
+    results = {}
+    original_stdout = sys.stdout
+    sys.stdout = _ContextOutput(original_stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=max(parallelism, 1)) as pool:
+            futures = [pool.submit(_run_job, context, job, timeout) for context in contexts]
+            for future in as_completed(futures):
+                result, output = future.result()
+                results[result.context] = result
+                log_title(f"{result.context}: {result.status} in {result.duration:.1f}s", STATUS_COLORS[result.status])
+                typer.echo(output, nl=False)
+    finally:
+        sys.stdout = original_stdout
+    return [results[context] for context in contexts]
+
+
+def run_on_selected_contexts(
+    job: Callable[[], Optional[bool]],
+    contexts: Optional[str],
+    all_contexts: bool,
+    parallelism: int,
+    cluster_timeout: float,
+):
+    """
+    Run job on the current context, or concurrently on the contexts selected with --contexts / --all-contexts.
+    In the latter case, a results table is printed and the cli exits with an error if any cluster failed
+    """
+    if not contexts and not all_contexts:
+        job()
+        return
+
+    selected = select_contexts(contexts, all_contexts)
+    start = time.time()
+    results = run_on_contexts(selected, job, parallelism, cluster_timeout)
+
+    log_title(f"Ran on {len(results)} clusters in {time.time() - start:.1f}s")
+    print_results_table(results)
+    if any(result.status == STATUS_TIMEOUT for result in results):
+        typer.secho(
+            "Timed out operations were not cancelled. Check the state of those clusters before running again",
+            fg="yellow",
+        )
+    if any(result.status != STATUS_OK for result in results):
+        raise typer.Exit(code=1)
@@ -1,32 +1,68 @@
-import base64
+import hashlib
 import json
 import os
+import shlex
 import subprocess
-import tempfile
 import time
 import traceback
-from typing import Dict, List, Optional
+from fnmatch import fnmatch
+from typing import Dict, List, Optional, Tuple
 
 import click
 import click_spinner
 import typer
-import yaml
 
+from robusta_cli.bulk_trigger import DEFAULT_CONCURRENCY, BulkTriggerException, load_trigger_requests, run_bulk_trigger
+from robusta_cli.cluster_backend import get_cluster_backend
+from robusta_cli.playbooks_sync import (
+    COMPRESSION_GZIP,
+    COMPRESSIONS,
+    PlaybooksSyncException,
+    StoredDirectory,
+    list_stored_directories,
+    pull_playbooks,
+    push_playbooks_dir,
+)
+from robusta_cli.multi_cluster import (
+    ALL_CONTEXTS_EXPLANATION,
+    CLUSTER_TIMEOUT_EXPLANATION,
+    CONTEXTS_EXPLANATION,
+    DEFAULT_CLUSTER_TIMEOUT_SECONDS,
+    DEFAULT_PARALLELISM,
+    PARALLELISM_EXPLANATION,
+    run_on_selected_contexts,
+)
+from robusta_cli.playbooks_config import CONFIG_SECRET_KEY, CONFIG_SECRET_NAME, get_playbooks_config
+from robusta_cli.playbooks_validation import SEVERITY_ERROR, validate_playbooks_configs
+from robusta_cli.runner_api import RunnerApiException, post_to_runner
+from robusta_cli.runner_logs import DEFAULT_RELOAD_TIMEOUT_SECONDS, fetch_runner_logs, watch_runner_reload
 from robusta_cli.utils import (
     PLAYBOOKS_DIR,
+    RUNNER_LABEL_SELECTOR,
     _build_exec_command,
-    exec_in_robusta_runner,
-    fetch_runner_logs,
+    format_bytes,
     get_package_name,
     get_runner_pod,
+    invalidate_runner_pod_on_error,
     log_title,
-    namespace_to_kubectl
 )
+from robusta_cli.yaml_utils import safe_dump
 
 PLAYBOOKS_MOUNT_LOCATION = "/etc/robusta/playbooks/storage"
 
 NAMESPACE_EXPLANATION = "Installation namespace. If none use the namespace currently active with kubectl."
-CONFIG_SECRET_NAME = "robusta-playbooks-config-secret"
+CONFIG_HASH_ANNOTATION = "robusta.dev/playbooks-config-hash"
+COMPRESSION_EXPLANATION = (
+    "Compression of the transferred files: gzip, zstd or none. "
+    "zstd requires the zstandard package locally and zstd in the runner image"
+)
+RELOAD_TIMEOUT_EXPLANATION = "Seconds to wait for the runner to confirm it reloaded the playbooks"
+FAIL_ON_RELOAD_TIMEOUT_EXPLANATION = "Fail if the runner didn't confirm the reload in time, instead of only warning"
+
+LIST_OUTPUT_YAML = "yaml"
+LIST_OUTPUT_JSON = "json"
+LIST_OUTPUT_TABLE = "table"
+LIST_OUTPUT_FORMATS = [LIST_OUTPUT_YAML, LIST_OUTPUT_JSON, LIST_OUTPUT_TABLE]
 
 app = typer.Typer(add_completion=False)
 
@@ -55,6 +91,13 @@ def __validate_playbooks_dir(playbooks_dir: str) -> bool:
     return True
 
 
+def __validate_compression(compression: str) -> bool:
+    if compression not in COMPRESSIONS:
+        typer.secho(f"Unknown compression {compression}. Options are {', '.join(COMPRESSIONS)}", fg="red")
+        return False
+    return True
+
+
 @app.command()
 def push(
     playbooks_directory: str = typer.Argument(
@@ -65,8 +108,46 @@ def push(
         None,
         help=NAMESPACE_EXPLANATION,
     ),
+    full: bool = typer.Option(
+        False,
+        help="Upload every file, even if it didn't change since the last push",
+    ),
+    compression: str = typer.Option(
+        COMPRESSION_GZIP,
+        help=COMPRESSION_EXPLANATION,
+    ),
+    reload_timeout: int = typer.Option(
+        DEFAULT_RELOAD_TIMEOUT_SECONDS,
+        help=RELOAD_TIMEOUT_EXPLANATION,
+    ),
+    fail_on_reload_timeout: bool = typer.Option(True, help=FAIL_ON_RELOAD_TIMEOUT_EXPLANATION),
+    contexts: str = typer.Option(None, help=CONTEXTS_EXPLANATION),
+    all_contexts: bool = typer.Option(False, help=ALL_CONTEXTS_EXPLANATION),
+    parallelism: int = typer.Option(DEFAULT_PARALLELISM, help=PARALLELISM_EXPLANATION),
+    cluster_timeout: int = typer.Option(DEFAULT_CLUSTER_TIMEOUT_SECONDS, help=CLUSTER_TIMEOUT_EXPLANATION),
 ):
     """Load custom playbooks code"""
+    abs_path = os.path.abspath(playbooks_directory)
+    if not __validate_playbooks_dir(abs_path) or not __validate_compression(compression):
+        return
+
+    run_on_selected_contexts(
+        lambda: _push(abs_path, namespace, full, compression, reload_timeout, fail_on_reload_timeout),
+        contexts,
+        all_contexts,
+        parallelism,
+        cluster_timeout,
+    )
+
+
+def _push(
+    abs_path: str,
+    namespace: Optional[str],
+    full: bool,
+    compression: str,
+    reload_timeout: int,
+    fail_on_reload_timeout: bool = True,
+) -> bool:
     log_title("Uploading playbooks code...")
     with fetch_runner_logs(namespace):
         runner_pod = get_runner_pod(namespace)
@@ -75,25 +156,36 @@ def push(
                 f"Runner pod not found in the {namespace} namespace. If robusta is installed in a different namespace, use the --namespace flag.",
                 color="red",
             )
-            return
+            return False
 
-        subprocess.check_call(
-            f"kubectl exec -it {namespace_to_kubectl(namespace)} {runner_pod} -c runner "
-            f"-- bash -c 'mkdir -p {PLAYBOOKS_MOUNT_LOCATION}'",
-            shell=True,
-        )
-        abs_path = os.path.abspath(playbooks_directory)
         dir_name = os.path.basename(os.path.normpath(abs_path))
-        if not __validate_playbooks_dir(abs_path):
-            return
-
-        subprocess.check_call(
-            f"kubectl cp {namespace_to_kubectl(namespace)} {abs_path} "
-            f"{runner_pod}:{PLAYBOOKS_MOUNT_LOCATION}/{dir_name} -c runner",
-            shell=True,
-        )
-        time.sleep(5)  # wait five seconds for the runner to actually reload the playbooks
+        with watch_runner_reload(namespace, reload_timeout, fail_on_reload_timeout) as reload_watch:
+            try:
+                with invalidate_runner_pod_on_error(namespace):
+                    result = push_playbooks_dir(
+                        abs_path,
+                        runner_pod,
+                        namespace,
+                        f"{PLAYBOOKS_MOUNT_LOCATION}/{dir_name}",
+                        full=full,
+                        compression=compression,
+                    )
+            except PlaybooksSyncException as e:
+                log_title(e.message, color="red")
+                return False
+
+            typer.secho(
+                f"Uploaded {len(result.added)} new and {len(result.changed)} changed files, "
+                f"deleted {len(result.deleted)}, skipped {result.unchanged_files} unchanged files. "
+                f"Sent {format_bytes(result.transferred_bytes)} for {format_bytes(result.total_bytes)} of playbooks "
+                f"(saved {format_bytes(result.saved_bytes)}) in {result.duration:.1f}s. "
+                f"The transfer took {result.transfer_duration:.1f}s, {format_bytes(result.throughput)}/s",
+                fg="green",
+            )
+            if result.added or result.changed or result.deleted:
+                reload_watch.wait()
     log_title("Loaded custom playbooks code!")
+    return True
 
 
 @app.command()
@@ -106,36 +198,100 @@ def configure(
         None,
         help=NAMESPACE_EXPLANATION,
     ),
+    reload_timeout: int = typer.Option(
+        DEFAULT_RELOAD_TIMEOUT_SECONDS,
+        help=RELOAD_TIMEOUT_EXPLANATION,
+    ),
+    fail_on_reload_timeout: bool = typer.Option(True, help=FAIL_ON_RELOAD_TIMEOUT_EXPLANATION),
+    contexts: str = typer.Option(None, help=CONTEXTS_EXPLANATION),
+    all_contexts: bool = typer.Option(False, help=ALL_CONTEXTS_EXPLANATION),
+    parallelism: int = typer.Option(DEFAULT_PARALLELISM, help=PARALLELISM_EXPLANATION),
+    cluster_timeout: int = typer.Option(DEFAULT_CLUSTER_TIMEOUT_SECONDS, help=CLUSTER_TIMEOUT_EXPLANATION),
+    force: bool = typer.Option(False, help="Apply the configuration and reload the runner even if it's unchanged"),
+    skip_validation: bool = typer.Option(False, help="Deploy without validating the configuration first"),
 ):
     """Deploy playbooks configuration"""
+    with open(config_file, "rb") as config:
+        active_playbooks = config.read()
+
+    if not skip_validation and _print_validation({config_file: active_playbooks})[0]:
+        typer.secho("Invalid playbooks configuration. Nothing deployed", fg="red")
+        raise typer.Exit(code=1)
+
+    run_on_selected_contexts(
+        lambda: _configure(active_playbooks, namespace, reload_timeout, force, fail_on_reload_timeout),
+        contexts,
+        all_contexts,
+        parallelism,
+        cluster_timeout,
+    )
+
+
+def _print_validation(contents: Dict[str, bytes]) -> Tuple[int, int]:
+    """
+    Validate the configuration files and print the issues found. Returns the number of errors and warnings
+    """
+    issues = validate_playbooks_configs(contents)
+    for issue in issues:
+        typer.secho(f"{issue.severity}: {issue}", fg="red" if issue.severity == SEVERITY_ERROR else "yellow")
+    errors = sum(1 for issue in issues if issue.severity == SEVERITY_ERROR)
+    return errors, len(issues) - errors
+
+
+@app.command()
+def validate(
+    config_files: List[str] = typer.Argument(
+        ...,
+        help="Playbooks configuration files. Files given together are validated as one configuration",
+    ),
+):
+    """Validate playbooks configuration files locally, without deploying them"""
+    contents = {}
+    for config_file in config_files:
+        with open(config_file, "rb") as config:
+            contents[config_file] = config.read()
+
+    errors, warnings = _print_validation(contents)
+    log_title(f"Validated {len(contents)} files: {errors} errors, {warnings} warnings", "red" if errors else "green")
+    if errors:
+        raise typer.Exit(code=1)
+
+
+def config_hash(config_data: Dict[str, bytes]) -> str:
+    config_hash = hashlib.sha256()
+    for key in sorted(config_data):
+        config_hash.update(f"{key}\0{len(config_data[key])}\0".encode())
+        config_hash.update(config_data[key])
+    return config_hash.hexdigest()
+
+
+def _configure(
+    active_playbooks: bytes,
+    namespace: Optional[str],
+    reload_timeout: int,
+    force: bool = False,
+    fail_on_reload_timeout: bool = True,
+):
     log_title("Configuring playbooks...")
+    cluster = get_cluster_backend()
+    config_data = {CONFIG_SECRET_KEY: active_playbooks}
+    annotations = {CONFIG_HASH_ANNOTATION: config_hash(config_data)}
+
+    # the secret stores the hash of its content, so an unchanged configuration is detected with a metadata only read
+    secret_metadata = cluster.get_secret_metadata(namespace, CONFIG_SECRET_NAME)
+    current_hash = ((secret_metadata or {}).get("annotations") or {}).get(CONFIG_HASH_ANNOTATION)
+    if not force and current_hash == annotations[CONFIG_HASH_ANNOTATION]:
+        log_title("Playbooks configuration unchanged. Nothing to deploy")
+        return
+
     with fetch_runner_logs(namespace):
-        subprocess.check_call(
-            f"kubectl create secret generic {namespace_to_kubectl(namespace)} {CONFIG_SECRET_NAME} "
-            f"--from-file active_playbooks.yaml={config_file} --type=Opaque -o yaml --dry-run | kubectl apply -f -",
-            shell=True,
-        )
-        subprocess.check_call(
-            f"kubectl annotate pods {namespace_to_kubectl(namespace)} -l robustaComponent=runner "
-            f'--overwrite "playbooks-last-modified={time.time()}"',
-            shell=True,
-        )
-        time.sleep(5)  # wait five seconds for the runner to actually reload the playbooks
+        with watch_runner_reload(namespace, reload_timeout, fail_on_reload_timeout) as reload_watch:
+            cluster.apply_secret(namespace, CONFIG_SECRET_NAME, config_data, annotations)
+            cluster.annotate_pods(namespace, RUNNER_LABEL_SELECTOR, {"playbooks-last-modified": str(time.time())})
+            reload_watch.wait()
     log_title("Deployed playbooks!")
 
 
-def get_playbooks_config(namespace: str):
-    configmap_content = subprocess.check_output(
-        f"kubectl get secret {namespace_to_kubectl(namespace)} {CONFIG_SECRET_NAME} -o yaml",
-        shell=True,
-    )
-    playbooks_secret = yaml.safe_load(configmap_content)
-    playbooks_secret["data"]["active_playbooks.yaml"] = base64.b64decode(
-        playbooks_secret["data"]["active_playbooks.yaml"]
-    ).decode()
-    return playbooks_secret
-
-
 @app.command()
 def pull(
     playbooks_directory: str = typer.Argument(
@@ -146,23 +302,61 @@ def pull(
         None,
         help=NAMESPACE_EXPLANATION,
     ),
+    compression: str = typer.Option(
+        COMPRESSION_GZIP,
+        help=COMPRESSION_EXPLANATION,
+    ),
+    dir_: str = typer.Option(
+        None,
+        "--dir",
+        help="Pull a single stored playbooks directory, as listed by list-dirs, instead of all of them",
+    ),
+    full: bool = typer.Option(
+        False,
+        help="Download every file, even if the local copy is identical",
+    ),
 ):
     """pull cluster deployed playbooks"""
     if not playbooks_directory:
         playbooks_directory = os.path.join(os.getcwd(), PLAYBOOKS_DIR)
 
+    remote_dir = PLAYBOOKS_MOUNT_LOCATION
+    if dir_:
+        if os.path.isabs(dir_) or ".." in dir_.split("/"):
+            log_title(f"Invalid playbooks directory name {dir_}", "red")
+            return
+        remote_dir = os.path.join(PLAYBOOKS_MOUNT_LOCATION, dir_)
+
     log_title(f"Pulling playbooks into {playbooks_directory} ")
 
     try:
         runner_pod = get_runner_pod(namespace)
-        if not runner_pod:
+        if not runner_pod or not __validate_compression(compression):
             return
 
-        subprocess.check_call(
-            f"kubectl cp {namespace_to_kubectl(namespace)} "
-            f"{runner_pod}:{PLAYBOOKS_MOUNT_LOCATION}/ -c runner {playbooks_directory}",
-            shell=True,
+        with invalidate_runner_pod_on_error(namespace):
+            result = pull_playbooks(
+                runner_pod, namespace, remote_dir, playbooks_directory, compression=compression, full=full
+            )
+        if result.local_only:
+            typer.secho(f"Kept {len(result.local_only)} local files that aren't stored in the cluster", fg="yellow")
+        if not result.files:
+            typer.secho(f"Already up to date. {result.unchanged_files} files unchanged", fg="green")
+            return
+        typer.secho(
+            f"Pulled {result.files} files, {result.unchanged_files} unchanged. "
+            f"Received {format_bytes(result.transferred_bytes)} "
+            f"in {result.duration:.1f}s. The transfer took {result.transfer_duration:.1f}s, "
+            f"{format_bytes(result.throughput)}/s",
+            fg="green",
         )
+    except subprocess.CalledProcessError as e:
+        if "no such file or directory" in str(e.stderr).lower():
+            log_title(f"Could not find stored playbooks in {remote_dir}", "red")
+            return
+        typer.echo(f"Failed to pull deployed playbooks {traceback.format_exc()}")
+    except PlaybooksSyncException as e:
+        log_title(e.message, color="red")
     except Exception:
         typer.echo(f"Failed to pull deployed playbooks {traceback.format_exc()}")
 
@@ -173,26 +367,36 @@ def list_dirs(
         None,
         help=NAMESPACE_EXPLANATION,
     ),
+    compare_to: str = typer.Option(
+        None,
+        help="Local directory holding copies of the stored playbooks directories, e.g. a pull target, to compare with",
+    ),
+    output: str = typer.Option(LIST_OUTPUT_TABLE, help=f"Output format: {LIST_OUTPUT_TABLE}, {LIST_OUTPUT_JSON}"),
 ):
-    """List stored playbooks directories"""
-    log_title("Listing playbooks directories ")
+    """List stored playbooks directories, with their size, file count, last modification and content hash"""
+    if output not in [LIST_OUTPUT_TABLE, LIST_OUTPUT_JSON]:
+        typer.secho(f"Invalid output format {output}. Use {LIST_OUTPUT_TABLE} or {LIST_OUTPUT_JSON}", fg="red")
+        raise typer.Exit(code=1)
+    if output == LIST_OUTPUT_TABLE:
+        log_title("Listing playbooks directories ")
 
     try:
         runner_pod = get_runner_pod(namespace)
         if not runner_pod:
             return
 
-        ls_res = subprocess.check_output(
-            f"kubectl exec -it {namespace_to_kubectl(namespace)} {runner_pod} -c runner "
-            f"-- bash -c 'ls {PLAYBOOKS_MOUNT_LOCATION}'",
-            shell=True,
-            stderr=subprocess.STDOUT,
-        )
+        with invalidate_runner_pod_on_error(namespace):
+            directories = list_stored_directories(runner_pod, namespace, PLAYBOOKS_MOUNT_LOCATION, compare_to)
 
-        log_title(f"Stored playbooks directories: \n { ls_res.decode('utf-8')}")
+        if output == LIST_OUTPUT_JSON:
+            typer.echo(json.dumps([json.loads(directory.json()) for directory in directories], indent=2))
+        elif not directories:
+            log_title("Could not find any stored playbooks.")
+        else:
+            _print_stored_directories(directories)
 
     except subprocess.CalledProcessError as e:
-        if "no such file or directory" in str(e.output).lower():
+        if "no such file or directory" in str(e.stderr).lower():
             log_title(f"Could not find any stored playbooks.")
             return
 
@@ -201,6 +405,26 @@ def list_dirs(
         typer.echo(f"Failed to list deployed playbooks {traceback.format_exc()}")
 
 
+def _print_table(rows: List[List[str]]):
+    """
+    Print rows as left aligned columns. The first row is the header
+    """
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]) - 1)]
+    lines = ["  ".join([cell.ljust(width) for cell, width in zip(row, widths)] + [row[-1]]) for row in rows]
+    typer.echo("\n".join(lines))
+
+
+def _print_stored_directories(directories: List[StoredDirectory]):
+    with_status = any(directory.local_status for directory in directories)
+    rows = [["NAME", "FILES", "SIZE", "MODIFIED (UTC)", "HASH"] + (["LOCAL"] if with_status else [])]
+    for directory in directories:
+        modified = directory.modified.strftime("%Y-%m-%d %H:%M:%S") if directory.modified else "-"
+        row = [directory.name, str(directory.files), format_bytes(directory.size), modified]
+        row.append(directory.content_hash[:12])
+        rows.append(row + ([directory.local_status or ""] if with_status else []))
+    _print_table(rows)
+
+
 @app.command()
 def delete(
     playbooks_directory: str = typer.Argument(
@@ -225,21 +449,59 @@ def delete(
             return
 
         path_to_delete = os.path.join(PLAYBOOKS_MOUNT_LOCATION, playbooks_directory)
-        subprocess.check_call(
-            f"kubectl exec -it {namespace_to_kubectl(namespace)} {runner_pod} -c runner "
-            f"-- bash -c 'rm -rf {path_to_delete}'",
-            shell=True,
-        )
+        with invalidate_runner_pod_on_error(namespace):
+            get_cluster_backend().exec(runner_pod, namespace, f"rm -rf {path_to_delete}")
 
     except Exception:
         typer.echo(f"Failed to delete deployed playbooks {traceback.format_exc()}")
 
 
-def print_yaml_if_not_none(key: str, json_dict: dict):
-    if json_dict.get(key):
-        json = {}
-        json[key] = json_dict.get(key)
-        typer.echo(f"{yaml.dump(json)}")
+PLAYBOOK_SECTIONS = ["sinks", "triggers", "actions"]
+# playbooks formatted before each write to the terminal
+LIST_OUTPUT_CHUNK_SIZE = 1000
+
+
+def _section_names(section: Optional[List]) -> List[str]:
+    """
+    Names of the triggers or actions of a playbook (the key of each item), or its sink names
+    """
+    names = []
+    for item in section or []:
+        names.extend(item.keys() if isinstance(item, dict) else [str(item)])
+    return names
+
+
+def _playbook_matches(playbook: Dict, filters: Dict[str, Optional[str]]) -> bool:
+    return all(
+        any(fnmatch(name, pattern) for name in _section_names(playbook.get(section)))
+        for section, pattern in filters.items()
+        if pattern
+    )
+
+
+def _format_playbook_yaml(playbook: Dict) -> str:
+    formatted = [click.style("--------------------------------------", fg="blue") + "\n"]
+    for section in PLAYBOOK_SECTIONS:
+        if playbook.get(section):
+            formatted.append(safe_dump({section: playbook[section]}) + "\n")
+    return "".join(formatted)
+
+
+def _print_playbooks_yaml(playbooks: List[Dict]):
+    for chunk_start in range(0, len(playbooks), LIST_OUTPUT_CHUNK_SIZE):
+        chunk = playbooks[chunk_start : chunk_start + LIST_OUTPUT_CHUNK_SIZE]
+        typer.echo("".join(_format_playbook_yaml(playbook) for playbook in chunk), nl=False)
+
+
+def _print_playbooks_table(playbooks: List[Dict], indexes: List[int]):
+    header = ["#"] + [section.upper() for section in PLAYBOOK_SECTIONS]
+    _print_table(
+        [header]
+        + [
+            [str(index)] + [",".join(_section_names(playbook.get(section))) for section in PLAYBOOK_SECTIONS]
+            for index, playbook in zip(indexes, playbooks)
+        ]
+    )
 
 
 # not named list as that would shadow the builtin list function
@@ -249,24 +511,39 @@ def list_(
         None,
         help=NAMESPACE_EXPLANATION,
     ),
-):  
+    trigger: str = typer.Option(None, help="Only playbooks with a matching trigger, e.g. on_pod_*"),
+    action: str = typer.Option(None, help="Only playbooks with a matching action, e.g. *_enricher"),
+    sink: str = typer.Option(None, help="Only playbooks sending to a matching sink"),
+    output: str = typer.Option(LIST_OUTPUT_YAML, help=f"Output format: {', '.join(LIST_OUTPUT_FORMATS)}"),
+):
     """list current active playbooks"""
+    if output not in LIST_OUTPUT_FORMATS:
+        typer.secho(f"Invalid output format {output}. Use one of {', '.join(LIST_OUTPUT_FORMATS)}", fg="red")
+        raise typer.Exit(code=1)
+
     # first we fetch the runner pod, as if the namespace is invalid we want an error message
     runner_pod = get_runner_pod(namespace)
     if not runner_pod:
         return
-    
-    typer.echo("Getting deployed playbooks list...")
+
+    typer.echo("Getting deployed playbooks list...", err=output == LIST_OUTPUT_JSON)
     with click_spinner.spinner():
         playbooks_config = get_playbooks_config(namespace)
 
-    active_playbooks_file = playbooks_config["data"]["active_playbooks.yaml"]
-    active_playbooks_yaml = yaml.safe_load(active_playbooks_file)
-    for playbook in active_playbooks_yaml["active_playbooks"]:
-        typer.secho("--------------------------------------", fg="blue")
-        print_yaml_if_not_none("sinks", playbook)
-        print_yaml_if_not_none("triggers", playbook)
-        print_yaml_if_not_none("actions", playbook)
+    filters = {"triggers": trigger, "actions": action, "sinks": sink}
+    indexes = [
+        index
+        for index, playbook in enumerate(playbooks_config.config.get("active_playbooks") or [])
+        if _playbook_matches(playbook, filters)
+    ]
+    playbooks = [playbooks_config.config["active_playbooks"][index] for index in indexes]
+
+    if output == LIST_OUTPUT_JSON:
+        typer.echo(json.dumps(playbooks, indent=2, default=str))
+    elif output == LIST_OUTPUT_TABLE:
+        _print_playbooks_table(playbooks, indexes)
+    else:
+        _print_playbooks_yaml(playbooks)
 
 
 @app.command()
@@ -280,41 +557,52 @@ def edit_config(
     typer.echo("connecting to cluster...")
     with click_spinner.spinner():
         playbooks_config = get_playbooks_config(namespace)
-    active_playbooks_file = playbooks_config["data"]["active_playbooks.yaml"]
+    active_playbooks_file = playbooks_config.active_playbooks
     edited_result = click.edit(active_playbooks_file)
     if edited_result is None:
         typer.echo("file not saved in editor. nothing to update")
     elif edited_result.strip() == active_playbooks_file.strip():
         typer.echo("saved file is the same. nothing to update")
     else:
+        if _print_validation({CONFIG_SECRET_KEY: edited_result.encode()})[0]:
+            typer.secho("Invalid playbooks configuration. Nothing updated", fg="red")
+            raise typer.Exit(code=1)
         typer.echo("file modified; updating server")
-        with tempfile.NamedTemporaryFile(delete=False) as f:
-            f.write(edited_result.encode())
-            f.flush()
-            fname = f.name
-        configure(config_file=fname, namespace=namespace)
+        _configure(edited_result.encode(), namespace, DEFAULT_RELOAD_TIMEOUT_SECONDS)
 
 
 def _post_in_runner_pod(namespace: str, api_path: str, req_body: Dict, req_name: str, dry_run: bool = False):
-    with fetch_runner_logs(namespace=namespace):
+    if dry_run:
         cmd = (
             f"curl -X POST http://localhost:5000/api/{api_path} "
             f"-H 'Content-Type: application/json' "
             f"-d '{json.dumps(req_body)}'"
         )
-        exec_in_robusta_runner(
-            cmd,
-            namespace=namespace,
-            tries=3,
-            error_msg=f"Cannot {req_name} - usually this means Robusta just started. Will try again",
-            dry_run=dry_run,
-        )
+        typer.echo(f"Run the following command:\n {shlex.join(_build_exec_command(cmd, namespace))}")
+        return
+
+    with fetch_runner_logs(namespace=namespace):
+        try:
+            response = post_to_runner(
+                namespace,
+                api_path,
+                req_body,
+                tries=3,
+                error_msg=f"Cannot {req_name} - usually this means Robusta just started. Will try again",
+            )
+        except RunnerApiException as e:
+            typer.secho(e.message, fg="red")
+            raise typer.Exit(code=1)
+        typer.echo(response.text)
         typer.echo("\n")
 
 
 @app.command()
 def trigger(
-    action_name: str,
+    action_name: Optional[str] = typer.Argument(
+        None,
+        help="Action to run. Not needed with --from-file",
+    ),
     param: Optional[List[str]] = typer.Argument(
         None,
         help="data to send to action (can be used multiple times)",
@@ -328,11 +616,28 @@ def trigger(
         False,
         help="Don't actually run the trigger, just print a command that can be used to trigger",
     ),
+    from_file: str = typer.Option(
+        None,
+        help="Trigger many actions at once, from a JSONL or yaml file of {action_name, action_params} requests. "
+        "Results are printed as json lines",
+    ),
+    concurrency: int = typer.Option(
+        DEFAULT_CONCURRENCY,
+        help="Maximum number of requests in flight, with --from-file",
+    ),
 ):
     """trigger a manually run playbook"""
+    if from_file:
+        _bulk_trigger(from_file, namespace, concurrency)
+        return
+
+    if not action_name:
+        typer.secho("Missing the action name, or --from-file", fg="red")
+        raise typer.Exit(code=1)
+
     log_title("Triggering action...")
     action_params = {}
-    for p in param:
+    for p in param or []:
         (key, val) = p.split("=")
         action_params[key] = val
     # action_params = " ".join([f"-F '{p}'" for p in param])
@@ -352,26 +657,70 @@ def trigger(
         return
 
     with fetch_runner_logs(namespace=namespace):
-        exec_in_robusta_runner(
-            cmd,
-            namespace=namespace,
-            tries=3,
-            error_msg=f"Cannot trigger playbook - usually this means Robusta just started. Will try again",
-            dry_run=False,  # dry_run handled separately above
-        )
+        try:
+            response = post_to_runner(
+                namespace,
+                "trigger",
+                req_body,
+                tries=3,
+                error_msg=f"Cannot trigger playbook - usually this means Robusta just started. Will try again",
+            )
+        except RunnerApiException as e:
+            typer.secho(e.message, fg="red")
+            raise typer.Exit(code=1)
+        typer.echo(response.text)
         typer.echo("\n")
 
     log_title("Done!")
 
 
+def _bulk_trigger(from_file: str, namespace: Optional[str], concurrency: int):
+    try:
+        trigger_requests = load_trigger_requests(from_file)
+    except BulkTriggerException as e:
+        typer.secho(e.message, fg="red")
+        raise typer.Exit(code=1)
+
+    results = []
+
+    def on_result(result: Dict):
+        results.append(result)
+        typer.echo(json.dumps(result))
+
+    start = time.time()
+    run_bulk_trigger(namespace, trigger_requests, on_result, concurrency=concurrency)
+    duration = time.time() - start
+
+    failed = [result for result in results if not 200 <= result.get("status", 0) < 300]
+    missing = len(trigger_requests) - len(results)
+    latencies = sorted(result["latency_ms"] for result in results)
+    median_latency = latencies[len(latencies) // 2] if latencies else 0
+    typer.secho(
+        f"Triggered {len(results)} actions in {duration:.1f}s, {len(failed)} failed, {missing} without a result. "
+        f"Median latency {median_latency:.0f}ms",
+        fg="red" if failed or missing else "green",
+        err=True,
+    )
+    if failed or missing:
+        raise typer.Exit(code=1)
+
+
 @app.command()
 def reload(
     namespace: str = typer.Option(
         None,
         help="Robusta namespace",
     ),
+    contexts: str = typer.Option(None, help=CONTEXTS_EXPLANATION),
+    all_contexts: bool = typer.Option(False, help=ALL_CONTEXTS_EXPLANATION),
+    parallelism: int = typer.Option(DEFAULT_PARALLELISM, help=PARALLELISM_EXPLANATION),
+    cluster_timeout: int = typer.Option(DEFAULT_CLUSTER_TIMEOUT_SECONDS, help=CLUSTER_TIMEOUT_EXPLANATION),
 ):
     """reload playbooks configuration"""
+    run_on_selected_contexts(lambda: _reload(namespace), contexts, all_contexts, parallelism, cluster_timeout)
+
+
+def _reload(namespace: Optional[str]):
     log_title("Reloading playbooks...")
     _post_in_runner_pod(
         namespace=namespace,
@@ -0,0 +1,78 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from robusta_cli.cluster_backend import get_cluster_backend, get_kube_context
+from robusta_cli.utils import get_cache_dir, get_current_kube_context
+from robusta_cli.yaml_utils import safe_load
+
+CONFIG_SECRET_NAME = "robusta-playbooks-config-secret"
+CONFIG_SECRET_KEY = "active_playbooks.yaml"
+PLAYBOOKS_CONFIG_CACHE_DIR = "playbooks-config"
+
+
+class PlaybooksConfig(BaseModel):
+    resource_version: str
+    active_playbooks: str  # the raw active_playbooks.yaml
+    config: Dict[str, Any] = {}  # active_playbooks.yaml, parsed
+
+
+def _cache_path(namespace: Optional[str]) -> str:
+    context = get_kube_context() or get_current_kube_context()
+    key = hashlib.sha256(f"{context}\0{namespace or ''}".encode()).hexdigest()
+    return os.path.join(get_cache_dir(PLAYBOOKS_CONFIG_CACHE_DIR), f"{key}.json")
+
+
+def _read_cache(cache_path: str) -> Optional[PlaybooksConfig]:
+    try:
+        with open(cache_path, "r") as cache_file:
+            return PlaybooksConfig(**json.load(cache_file))
+    except (OSError, ValueError, TypeError):  # missing or corrupted. It's rebuilt from the cluster
+        return None
+
+
+def _write_cache(cache_path: str, playbooks_config: PlaybooksConfig):
+    # the config holds credentials, so the cache file is readable by the current user only
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as cache_file:
+            cache_file.write(playbooks_config.json())
+        os.replace(tmp_path, cache_path)
+    except (OSError, TypeError, ValueError):  # e.g. yaml values json can't represent. Not cached
+        os.unlink(tmp_path)
+
+
+def get_playbooks_config(namespace: Optional[str]) -> PlaybooksConfig:
+    """
+    The playbooks configuration deployed in the cluster.
+
+    The parsed configuration is cached on disk per kube context and namespace. A cached copy is used as long as the
+    resourceVersion of the secret is unchanged, which costs a metadata only read of the secret
+    """
+    cluster = get_cluster_backend()
+    try:
+        cache_path = _cache_path(namespace)
+    except OSError:  # read-only home dir, for example
+        cache_path = None
+
+    cached = _read_cache(cache_path) if cache_path else None
+    if cached:
+        secret_metadata = cluster.get_secret_metadata(namespace, CONFIG_SECRET_NAME) or {}
+        if secret_metadata.get("resourceVersion") == cached.resource_version:
+            return cached
+
+    secret = cluster.get_secret(namespace, CONFIG_SECRET_NAME)
+    active_playbooks = base64.b64decode(secret["data"][CONFIG_SECRET_KEY]).decode()
+    playbooks_config = PlaybooksConfig(
+        resource_version=secret["metadata"].get("resourceVersion", ""),
+        active_playbooks=active_playbooks,
+        config=safe_load(active_playbooks) or {},
+    )
+    if cache_path and playbooks_config.resource_version:
+        _write_cache(cache_path, playbooks_config)
+    return playbooks_config
@@ -0,0 +1,427 @@
+import hashlib
+import io
+import json
+import os
+import shlex
+import tarfile
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from fnmatch import fnmatch
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from robusta_cli.cluster_backend import extract_tar, get_cluster_backend
+
+# stored in each pushed playbooks directory, next to the files it describes
+MANIFEST_FILE_NAME = ".robusta_manifest.json"
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+IGNORE_FILE_NAME = ".robustaignore"
+DEFAULT_IGNORE_PATTERNS = [".git", "__pycache__", "*.pyc", ".venv", MANIFEST_FILE_NAME]
+
+LOCAL_STATUS_IN_SYNC = "in sync"
+LOCAL_STATUS_DIFFERS = "differs"
+LOCAL_STATUS_MISSING = "missing locally"
+
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSION_NONE = "none"
+COMPRESSIONS = [COMPRESSION_GZIP, COMPRESSION_ZSTD, COMPRESSION_NONE]
+
+# how the runner side (de)compresses the tar stream
+REMOTE_EXTRACT_COMMANDS = {
+    COMPRESSION_GZIP: "tar xzf -",
+    COMPRESSION_ZSTD: "zstd -dc | tar xf -",
+    COMPRESSION_NONE: "tar xf -",
+}
+REMOTE_COMPRESS_COMMANDS = {
+    COMPRESSION_GZIP: "gzip -c",
+    COMPRESSION_ZSTD: "zstd -c",
+    COMPRESSION_NONE: "cat",
+}
+
+
+class PlaybooksSyncException(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class TransferResult(BaseModel):
+    transferred_bytes: int = 0
+    duration: float = 0
+    # of the tar stream only, from compressing to extracting it, without the hashing that selects the files
+    transfer_duration: float = 0
+
+    @property
+    def throughput(self) -> float:
+        return self.transferred_bytes / self.transfer_duration if self.transfer_duration else 0
+
+
+class PushResult(TransferResult):
+    added: List[str] = []
+    changed: List[str] = []
+    deleted: List[str] = []
+    unchanged_files: int = 0
+    total_bytes: int = 0
+    changed_bytes: int = 0
+
+    @property
+    def saved_bytes(self) -> int:
+        return max(self.total_bytes - self.transferred_bytes, 0)
+
+
+class StoredDirectory(BaseModel):
+    name: str
+    files: int = 0
+    size: int = 0
+    modified: Optional[datetime] = None  # of the newest file
+    content_hash: str = ""  # see manifest_hash
+    local_status: Optional[str] = None  # compared with a local copy, if one was given
+
+
+class PullResult(TransferResult):
+    files: int = 0
+    unchanged_files: int = 0
+    local_only: List[str] = []
+
+
+def load_ignore_patterns(playbooks_dir: str) -> List[str]:
+    """
+    The default exclusions, plus the patterns in the .robustaignore file of the directory, if it has one.
+    Patterns are shell globs. A pattern without a slash matches a file or directory name anywhere in the tree,
+    otherwise it's matched against the path relative to the directory root
+    """
+    patterns = list(DEFAULT_IGNORE_PATTERNS)
+    try:
+        with open(os.path.join(playbooks_dir, IGNORE_FILE_NAME), "r") as ignore_file:
+            for line in ignore_file:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    patterns.append(line.rstrip("/"))
+    except FileNotFoundError:
+        pass
+    return patterns
+
+
+def is_ignored(rel_path: str, patterns: List[str]) -> bool:
+    parts = rel_path.split("/")
+    for pattern in patterns:
+        if "/" in pattern:
+            if fnmatch(rel_path, pattern.lstrip("/")):
+                return True
+        elif any(fnmatch(part, pattern) for part in parts):
+            return True
+    return False
+
+
+def hash_file(path: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def iter_playbooks_files(playbooks_dir: str, ignore_patterns: List[str]) -> Iterator[str]:
+    """
+    Relative paths of the files to sync, sorted. Ignored directories are not walked at all
+    """
+    for root, dirs, files in os.walk(playbooks_dir):
+        rel_root = os.path.relpath(root, playbooks_dir).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else f"{rel_root}/"
+        dirs[:] = sorted(d for d in dirs if not is_ignored(f"{rel_root}{d}", ignore_patterns))
+        for file_name in sorted(files):
+            if os.path.isfile(os.path.join(root, file_name)):
+                yield f"{rel_root}{file_name}"
+
+
+def manifest_hash(manifest: Dict[str, str]) -> str:
+    """
+    A single hash of a directory content, from the hash of each of its files
+    """
+    content_hash = hashlib.sha256()
+    for rel_path in sorted(manifest):
+        content_hash.update(f"{rel_path}\0{manifest[rel_path]}\n".encode("utf-8", errors="surrogateescape"))
+    return content_hash.hexdigest()
+
+
+def build_local_manifest(playbooks_dir: str, ignore_patterns: List[str]) -> Dict[str, str]:
+    """
+    Relative path -> sha256 of every file that should be synced
+    """
+    return {
+        rel_path: hash_file(os.path.join(playbooks_dir, rel_path))
+        for rel_path in iter_playbooks_files(playbooks_dir, ignore_patterns)
+        if not is_ignored(rel_path, ignore_patterns)
+    }
+
+
+def fetch_remote_manifest(runner_pod: str, namespace: Optional[str], remote_dir: str) -> Dict[str, str]:
+    manifest_path = shlex.quote(f"{remote_dir}/{MANIFEST_FILE_NAME}")
+    output = get_cluster_backend().exec(runner_pod, namespace, f"cat {manifest_path} 2>/dev/null || true")
+    try:
+        manifest = json.loads(output)
+    except ValueError:  # no manifest yet, or it was written by a different cli version
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise PlaybooksSyncException("zstd compression requires the zstandard package. Run: pip install zstandard")
+    return zstandard
+
+
+@contextmanager
+def open_tar_writer(fileobj: IO[bytes], compression: str) -> Iterator[tarfile.TarFile]:
+    """
+    A streaming tar writer. Members are compressed as they are added, so memory use doesn't depend on their size
+    """
+    if compression == COMPRESSION_ZSTD:
+        with _zstandard().ZstdCompressor().stream_writer(fileobj, closefd=False) as compressed:
+            with tarfile.open(fileobj=compressed, mode="w|") as tar:
+                yield tar
+    else:
+        with tarfile.open(fileobj=fileobj, mode="w|gz" if compression == COMPRESSION_GZIP else "w|") as tar:
+            yield tar
+
+
+@contextmanager
+def open_tar_reader(fileobj: IO[bytes], compression: str) -> Iterator[tarfile.TarFile]:
+    if compression == COMPRESSION_ZSTD:
+        with _zstandard().ZstdDecompressor().stream_reader(fileobj, closefd=False) as decompressed:
+            with tarfile.open(fileobj=decompressed, mode="r|") as tar:
+                yield tar
+    else:
+        with tarfile.open(fileobj=fileobj, mode="r|gz" if compression == COMPRESSION_GZIP else "r|") as tar:
+            yield tar
+
+
+def _write_changes_tar(
+    playbooks_dir: str, files: List[str], manifest: Dict[str, str], tar_file: IO[bytes], compression: str
+):
+    with open_tar_writer(tar_file, compression) as tar:
+        for rel_path in files:
+            tar.add(os.path.join(playbooks_dir, rel_path), arcname=rel_path, recursive=False)
+
+        manifest_content = json.dumps({"version": MANIFEST_VERSION, "files": manifest}, sort_keys=True).encode()
+        manifest_info = tarfile.TarInfo(MANIFEST_FILE_NAME)
+        manifest_info.size = len(manifest_content)
+        manifest_info.mtime = int(time.time())
+        tar.addfile(manifest_info, io.BytesIO(manifest_content))
+
+
+def push_playbooks_dir(
+    playbooks_dir: str,
+    runner_pod: str,
+    namespace: Optional[str],
+    remote_dir: str,
+    full: bool = False,
+    compression: str = COMPRESSION_GZIP,
+) -> PushResult:
+    """
+    Upload only the files whose content differs from the manifest stored with the remote copy, and delete remote
+    files that no longer exist locally. Everything is sent as a single compressed tar stream
+    """
+    start = time.time()
+    ignore_patterns = load_ignore_patterns(playbooks_dir)
+    local_manifest = build_local_manifest(playbooks_dir, ignore_patterns)
+    remote_manifest = {} if full else fetch_remote_manifest(runner_pod, namespace, remote_dir)
+
+    result = PushResult()
+    for rel_path, file_hash in local_manifest.items():
+        size = os.path.getsize(os.path.join(playbooks_dir, rel_path))
+        result.total_bytes += size
+        if rel_path not in remote_manifest:
+            result.added.append(rel_path)
+        elif remote_manifest[rel_path] != file_hash:
+            result.changed.append(rel_path)
+        else:
+            result.unchanged_files += 1
+            continue
+        result.changed_bytes += size
+    result.deleted = sorted(set(remote_manifest) - set(local_manifest))
+
+    # the compressed stream is spooled to disk rather than memory, as the pod exec needs its size up front
+    transfer_start = time.time()
+    with tempfile.TemporaryFile() as tar_file:
+        _write_changes_tar(playbooks_dir, result.added + result.changed, local_manifest, tar_file, compression)
+        result.transferred_bytes = tar_file.tell()
+        tar_file.seek(0)
+
+        remote_command = (
+            f"mkdir -p {shlex.quote(remote_dir)} && cd {shlex.quote(remote_dir)} && "
+            f"{REMOTE_EXTRACT_COMMANDS[compression]}"
+        )
+        if result.deleted:
+            remote_command += " && rm -f -- " + " ".join(shlex.quote(rel_path) for rel_path in result.deleted)
+            # directories removed locally would stay behind as empty trees. Only the directories that held deleted
+            # files are pruned
+            deleted_dirs = sorted({rel_path.split("/")[0] for rel_path in result.deleted if "/" in rel_path})
+            if deleted_dirs:
+                remote_command += (
+                    " && find " + " ".join(shlex.quote(f"./{rel_dir}") for rel_dir in deleted_dirs)
+                    + " -depth -type d -empty -delete"
+                )
+        get_cluster_backend().exec(runner_pod, namespace, remote_command, stdin=tar_file)
+
+    result.transfer_duration = time.time() - transfer_start
+    result.duration = time.time() - start
+    return result
+
+
+def _remote_find_filter(ignore_patterns: List[str]) -> str:
+    """
+    find arguments that skip the ignored paths, so they aren't hashed on the runner at all
+    """
+    conditions = [
+        f"-path {shlex.quote('./' + pattern.lstrip('/'))}" if "/" in pattern else f"-name {shlex.quote(pattern)}"
+        for pattern in ignore_patterns
+    ]
+    return f"\\( {' -o '.join(conditions)} \\) -prune -o" if conditions else ""
+
+
+def _parse_sha256sum_line(line: str) -> Optional[Tuple[str, str]]:
+    # sha256sum escapes names with a newline or a backslash in them, and marks their lines with a leading backslash
+    escaped = line.startswith("\\")
+    if escaped:
+        line = line[1:]
+    file_hash, separator, rel_path = line.partition(" ")
+    if not separator or len(file_hash) != 64:
+        return None
+    rel_path = rel_path[1:]  # the mode marker, " " for text or "*" for binary
+    if escaped:
+        rel_path = rel_path.replace("\\\\", "\0").replace("\\n", "\n").replace("\0", "\\")
+    return rel_path[2:] if rel_path.startswith("./") else rel_path, file_hash
+
+
+def fetch_remote_hashes(
+    runner_pod: str, namespace: Optional[str], remote_dir: str, ignore_patterns: List[str]
+) -> Dict[str, str]:
+    """
+    Relative path -> sha256 of every file in the remote directory, computed on the runner in a single exec
+    """
+    remote_command = (
+        f"cd {shlex.quote(remote_dir)} && "
+        f"find . {_remote_find_filter(ignore_patterns)} -type f -print0 | xargs -0 -r sha256sum"
+    )
+    output = get_cluster_backend().exec(runner_pod, namespace, remote_command)
+    remote_hashes = {}
+    for line in output.decode("utf-8", errors="surrogateescape").split("\n"):
+        parsed = _parse_sha256sum_line(line)
+        if parsed and not is_ignored(parsed[0], ignore_patterns):
+            remote_hashes[parsed[0]] = parsed[1]
+    return remote_hashes
+
+
+def pull_playbooks(
+    runner_pod: str,
+    namespace: Optional[str],
+    remote_dir: str,
+    local_dir: str,
+    compression: str = COMPRESSION_GZIP,
+    full: bool = False,
+) -> PullResult:
+    """
+    Download the remote files whose content differs from the local copy, as a single compressed tar stream.
+    The runner hashes its files in one exec first. Ignored files are skipped, using the ignore patterns of the local
+    target directory. Local files that don't exist on the runner are kept
+    """
+    start = time.time()
+    ignore_patterns = load_ignore_patterns(local_dir)
+    remote_hashes = fetch_remote_hashes(runner_pod, namespace, remote_dir, ignore_patterns)
+    local_manifest = {}
+    if not full and os.path.isdir(local_dir):
+        local_manifest = build_local_manifest(local_dir, ignore_patterns)
+
+    result = PullResult()
+    changed = sorted(path for path, file_hash in remote_hashes.items() if local_manifest.get(path) != file_hash)
+    result.unchanged_files = len(remote_hashes) - len(changed)
+    result.local_only = sorted(set(local_manifest) - set(remote_hashes))
+    if not changed:
+        result.duration = time.time() - start
+        return result
+
+    # the names of the files to send are passed on stdin, so any number of them fits in one command
+    remote_command = (
+        f"set -o pipefail; tar cf - -C {shlex.quote(remote_dir)} --null -T - | "
+        f"{REMOTE_COMPRESS_COMMANDS[compression]}"
+    )
+    file_list = io.BytesIO(b"".join(path.encode("utf-8", errors="surrogateescape") + b"\0" for path in changed))
+    transfer_start = time.time()
+    with tempfile.TemporaryFile() as tar_file:
+        get_cluster_backend().exec(runner_pod, namespace, remote_command, stdin=file_list, stdout=tar_file)
+        result.transferred_bytes = tar_file.tell()
+        tar_file.seek(0)
+
+        os.makedirs(local_dir, exist_ok=True)
+        with open_tar_reader(tar_file, compression) as tar:
+            extract_tar(tar, local_dir)
+            result.files = sum(1 for member in tar.getmembers() if member.isfile())
+
+    result.transfer_duration = time.time() - transfer_start
+    result.duration = time.time() - start
+    return result
+
+
+def list_stored_directories(
+    runner_pod: str, namespace: Optional[str], remote_root: str, local_root: Optional[str] = None
+) -> List[StoredDirectory]:
+    """
+    Size, file count, newest modification time and content hash of each directory under remote_root, from a single
+    exec. The content hash matches manifest_hash of a local copy with the same files, as selected for push.
+    If local_root is given, each directory is compared with the directory of the same name under it
+    """
+    file_filter = _remote_find_filter(DEFAULT_IGNORE_PATTERNS)
+    # NUL separated records: "D name" per directory, "S size mtime path" per file, then the sha256sum line per file
+    remote_command = (
+        f"cd {shlex.quote(remote_root)} && "
+        "find . -mindepth 1 -maxdepth 1 -type d -printf 'D %P\\0' && "
+        f"find . -mindepth 2 {file_filter} -type f -printf 'S %s %T@ %P\\0' && "
+        f"find . -mindepth 2 {file_filter} -type f -print0 | xargs -0 -r sha256sum -z"
+    )
+    output = get_cluster_backend().exec(runner_pod, namespace, remote_command)
+
+    directories: Dict[str, StoredDirectory] = {}
+    manifests: Dict[str, Dict[str, str]] = {}
+    for record in output.decode("utf-8", errors="surrogateescape").split("\0"):
+        if record.startswith("D "):
+            directories[record[2:]] = StoredDirectory(name=record[2:])
+            manifests[record[2:]] = {}
+        elif record.startswith("S "):
+            size, mtime, path = record[2:].split(" ", 2)
+            name, _, rel_path = path.partition("/")
+            if name not in directories or is_ignored(rel_path, DEFAULT_IGNORE_PATTERNS):
+                continue
+            directory = directories[name]
+            directory.files += 1
+            directory.size += int(size)
+            modified = datetime.fromtimestamp(float(mtime), timezone.utc)
+            directory.modified = max(directory.modified or modified, modified)
+        else:
+            parsed = _parse_sha256sum_line(record)
+            if parsed:
+                name, _, rel_path = parsed[0].partition("/")
+                if name in manifests and not is_ignored(rel_path, DEFAULT_IGNORE_PATTERNS):
+                    manifests[name][rel_path] = parsed[1]
+
+    for name, directory in directories.items():
+        directory.content_hash = manifest_hash(manifests[name])
+        if local_root:
+            local_dir = os.path.join(local_root, name)
+            if not os.path.isdir(local_dir):
+                directory.local_status = LOCAL_STATUS_MISSING
+            else:
+                local_manifest = build_local_manifest(local_dir, load_ignore_patterns(local_dir))
+                in_sync = manifest_hash(local_manifest) == directory.content_hash
+                directory.local_status = LOCAL_STATUS_IN_SYNC if in_sync else LOCAL_STATUS_DIFFERS
+    return sorted(directories.values(), key=lambda directory: directory.name)
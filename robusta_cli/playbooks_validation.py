@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import yaml
+from pydantic import BaseModel
+
+from robusta_cli.utils import get_cache_dir
+from robusta_cli.yaml_utils import safe_load
+
+# bump when the checks change, so results cached by previous versions are ignored
+VALIDATION_VERSION = 1
+VALIDATION_CACHE_DIR = "playbooks-validation"
+
+SEVERITY_ERROR = "error"
+SEVERITY_WARNING = "warning"
+
+KNOWN_PLAYBOOK_KEYS = {"name", "triggers", "actions", "sinks", "stop"}
+ACTION_NAME_PATTERN = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*$")
+TRIGGER_NAME_PATTERN = re.compile(r"^on_[a-z0-9_]+$")
+SINK_TYPE_PATTERN = re.compile(r"^[a-z0-9_]+_sink$")
+
+
+class ValidationIssue(BaseModel):
+    file: str = ""
+    location: str
+    message: str
+    severity: str = SEVERITY_ERROR
+
+    def __str__(self) -> str:
+        location = f"{self.file}: {self.location}" if self.file else self.location
+        return f"{location}: {self.message}" if location else self.message
+
+
+class FileValidation(BaseModel):
+    """
+    The validation result of a single file. Sink references are checked once every file is validated, as a playbook
+    can send to a sink defined in another file
+    """
+
+    issues: List[ValidationIssue] = []
+    defined_sinks: Optional[List[str]] = None  # None if the file has no sinks_config
+    sink_references: Dict[str, List[str]] = {}  # sink name -> the locations referencing it
+
+    def error(self, location: str, message: str):
+        self.issues.append(ValidationIssue(location=location, message=message))
+
+    def warning(self, location: str, message: str):
+        self.issues.append(ValidationIssue(location=location, message=message, severity=SEVERITY_WARNING))
+
+
+def _single_key_item(item: Any, location: str, kind: str, result: FileValidation) -> Optional[str]:
+    """
+    Triggers, actions and sinks are written as {name: params} mappings. Returns the name, if the item is valid
+    """
+    if not isinstance(item, dict) or len(item) != 1:
+        result.error(location, f"each {kind} should be a mapping with a single key, the {kind} name")
+        return None
+    name, params = next(iter(item.items()))
+    if params is not None and not isinstance(params, dict):
+        result.error(f"{location}.{name}", f"the {kind} parameters should be a mapping")
+    return str(name)
+
+
+def _validate_playbook(playbook: Any, location: str, result: FileValidation):
+    if not isinstance(playbook, dict):
+        result.error(location, "a playbook should be a mapping")
+        return
+
+    for key in sorted(set(map(str, playbook)) - KNOWN_PLAYBOOK_KEYS):
+        result.warning(location, f"unknown playbook key {key}")
+
+    triggers = playbook.get("triggers")
+    if not isinstance(triggers, list) or not triggers:
+        result.error(location, "a playbook needs a non empty list of triggers")
+    else:
+        for index, trigger in enumerate(triggers):
+            name = _single_key_item(trigger, f"{location}.triggers[{index}]", "trigger", result)
+            if name is not None and not TRIGGER_NAME_PATTERN.match(name):
+                result.error(f"{location}.triggers[{index}]", f"{name} is not a trigger. Trigger names start with on_")
+
+    actions = playbook.get("actions")
+    if not isinstance(actions, list) or not actions:
+        result.error(location, "a playbook needs a non empty list of actions")
+    else:
+        for index, action in enumerate(actions):
+            name = _single_key_item(action, f"{location}.actions[{index}]", "action", result)
+            if name is not None and not ACTION_NAME_PATTERN.match(name):
+                result.error(f"{location}.actions[{index}]", f"{name} is not a valid action name")
+
+    sinks = playbook.get("sinks")
+    if sinks is not None:
+        if not isinstance(sinks, list) or not all(isinstance(sink, str) for sink in sinks):
+            result.error(f"{location}.sinks", "sinks should be a list of sink names")
+        else:
+            for sink in sinks:
+                result.sink_references.setdefault(sink, []).append(f"{location}.sinks")
+
+    if "stop" in playbook and not isinstance(playbook["stop"], bool):
+        result.error(f"{location}.stop", "stop should be true or false")
+    if "name" in playbook and not isinstance(playbook["name"], str):
+        result.error(f"{location}.name", "the playbook name should be a string")
+
+
+def _validate_sinks_config(sinks_config: Any, result: FileValidation):
+    result.defined_sinks = []
+    if not isinstance(sinks_config, list):
+        result.error("sinks_config", "sinks_config should be a list of sinks")
+        return
+
+    for index, sink in enumerate(sinks_config):
+        location = f"sinks_config[{index}]"
+        sink_type = _single_key_item(sink, location, "sink", result)
+        if sink_type is None:
+            continue
+        if not SINK_TYPE_PATTERN.match(sink_type):
+            result.error(location, f"{sink_type} is not a sink type. Sink types end with _sink")
+        params = next(iter(sink.values()))
+        name = params.get("name") if isinstance(params, dict) else None
+        if not isinstance(name, str) or not name:
+            result.error(f"{location}.{sink_type}", "a sink needs a name")
+        elif name in result.defined_sinks:
+            result.error(f"{location}.{sink_type}", f"sink {name} is defined more than once")
+        else:
+            result.defined_sinks.append(name)
+
+
+def validate_content(content: bytes) -> FileValidation:
+    """
+    Validate an active_playbooks.yaml. Only the structure is checked, as the available actions depend on the runner
+    version and the playbook repos it loads
+    """
+    result = FileValidation()
+    try:
+        config = safe_load(content)
+    except yaml.YAMLError as e:
+        mark = getattr(e, "problem_mark", None)
+        result.error(f"line {mark.line + 1}" if mark else "", f"invalid yaml: {getattr(e, 'problem', None) or e}")
+        return result
+
+    if config is None:
+        result.warning("", "the file is empty")
+        return result
+    if not isinstance(config, dict):
+        result.error("", "the configuration should be a mapping")
+        return result
+
+    playbooks = config.get("active_playbooks")
+    if playbooks is not None:
+        if not isinstance(playbooks, list):
+            result.error("active_playbooks", "active_playbooks should be a list of playbooks")
+        else:
+            for index, playbook in enumerate(playbooks):
+                _validate_playbook(playbook, f"active_playbooks[{index}]", result)
+
+    if "sinks_config" in config:
+        _validate_sinks_config(config["sinks_config"], result)
+    return result
+
+
+def _content_hash(content: bytes) -> str:
+    return hashlib.sha256(f"{VALIDATION_VERSION}\0".encode() + content).hexdigest()
+
+
+def _read_cached(cache_dir: Optional[str], content_hash: str) -> Optional[FileValidation]:
+    if not cache_dir:
+        return None
+    try:
+        with open(os.path.join(cache_dir, f"{content_hash}.json"), "r") as cache_file:
+            return FileValidation(**json.load(cache_file))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _write_cached(cache_dir: Optional[str], content_hash: str, result: FileValidation):
+    if not cache_dir:
+        return
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as cache_file:
+            cache_file.write(result.json())
+        os.replace(tmp_path, os.path.join(cache_dir, f"{content_hash}.json"))
+    except OSError:
+        os.unlink(tmp_path)
+
+
+def _check_sink_references(results: Dict[str, FileValidation]) -> List[ValidationIssue]:
+    defining_files = [result.defined_sinks for result in results.values() if result.defined_sinks is not None]
+    if not defining_files:
+        return []  # the sinks are defined elsewhere, e.g. in the helm values. Nothing to check against
+
+    defined_sinks = {sink for sinks in defining_files for sink in sinks}
+    return [
+        ValidationIssue(file=file_name, location=location, message=f"unknown sink {sink}")
+        for file_name, result in results.items()
+        for sink, locations in result.sink_references.items()
+        if sink not in defined_sinks
+        for location in locations
+    ]
+
+
+def validate_playbooks_configs(contents: Dict[str, bytes], use_cache: bool = True) -> List[ValidationIssue]:
+    """
+    Validate the playbooks configuration files, file name -> content, as one configuration.
+
+    Results are cached by content hash, so unchanged files aren't validated again. When several files need
+    validation, they are validated in parallel processes
+    """
+    try:
+        cache_dir = get_cache_dir(VALIDATION_CACHE_DIR) if use_cache else None
+    except OSError:  # read-only home dir, for example
+        cache_dir = None
+
+    hashes = {file_name: _content_hash(content) for file_name, content in contents.items()}
+    results: Dict[str, FileValidation] = {}
+    for file_name, content_hash in hashes.items():
+        cached = _read_cached(cache_dir, content_hash)
+        if cached:
+            results[file_name] = cached
+
+    to_validate = [file_name for file_name in contents if file_name not in results]
+    if len(to_validate) > 1:
+        with ProcessPoolExecutor(max_workers=min(len(to_validate), os.cpu_count() or 1)) as pool:
+            validated = pool.map(validate_content, [contents[file_name] for file_name in to_validate])
+            results.update(zip(to_validate, validated))
+    elif to_validate:
+        results[to_validate[0]] = validate_content(contents[to_validate[0]])
+
+    for file_name in to_validate:
+        _write_cached(cache_dir, hashes[file_name], results[file_name])
+
+    issues = [
+        issue.copy(update={"file": file_name}) for file_name in contents for issue in results[file_name].issues
+    ]
+    return issues + _check_sink_references({file_name: results[file_name] for file_name in contents})
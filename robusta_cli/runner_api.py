@@ -0,0 +1,191 @@
+import asyncio
+import atexit
+import functools
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+import typer
+from requests.adapters import HTTPAdapter
+
+from robusta_cli.cluster_backend import PortForward, get_cluster_backend, get_kube_context, use_kube_context
+from robusta_cli.utils import (
+    get_current_kube_context,
+    get_runner_pod,
+    invalidate_runner_pod,
+    invalidate_runner_pod_on_error,
+)
+
+RUNNER_API_PORT = 5000
+RUNNER_API_POOL_SIZE = 32
+DEFAULT_RUNNER_API_TIMEOUT_SECONDS = 60
+
+
+class RunnerApiException(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+def _command_error_output(error: subprocess.CalledProcessError) -> str:
+    output = (error.stderr or error.output or b"").decode("utf-8", errors="replace").strip()
+    return output or f"exit code {error.returncode}"
+
+
+class RunnerApiClient:
+    """
+    Client of the runner http api. A single port-forward to the runner pod is opened on first use, and every request
+    goes over a keep-alive session. If the forward breaks, e.g. because the runner pod was replaced, the runner pod
+    is looked up again and the request retried once
+    """
+
+    def __init__(self, namespace: Optional[str], context: Optional[str] = None, pool_size: int = RUNNER_API_POOL_SIZE):
+        self.namespace = namespace
+        self.context = context
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._forward: Optional[PortForward] = None
+        self._session: Optional[requests.Session] = None
+
+    def _connect(self) -> Tuple[PortForward, requests.Session]:
+        """
+        The port-forward and session, opened if needed. Raises RunnerApiException if the port-forward can't be opened
+        """
+        with self._lock:
+            if self._forward is None:
+                with use_kube_context(self.context):
+                    runner_pod = get_runner_pod(self.namespace).split("\n")[0]
+                    if not runner_pod:
+                        raise RunnerApiException(f"Runner pod not found in namespace {self.namespace}")
+                    try:
+                        with invalidate_runner_pod_on_error(self.namespace):
+                            backend = get_cluster_backend()
+                            self._forward = backend.port_forward(runner_pod, self.namespace, RUNNER_API_PORT)
+                    except subprocess.CalledProcessError as e:
+                        raise RunnerApiException(f"Cannot port-forward to {runner_pod}: {_command_error_output(e)}")
+                    except OSError as e:  # e.g. kubectl isn't installed
+                        raise RunnerApiException(f"Cannot port-forward to {runner_pod}: {e}")
+                # pool_block makes requests beyond the pool size wait for a connection, instead of opening new ones
+                self._session = requests.Session()
+                self._session.mount("http://", HTTPAdapter(pool_maxsize=self.pool_size, pool_block=True))
+            return self._forward, self._session
+
+    def _disconnect(self, broken_forward: PortForward):
+        with self._lock:
+            if self._forward is not broken_forward:
+                return  # already reconnected by another request
+            self._close()
+            with use_kube_context(self.context):
+                invalidate_runner_pod(self.namespace)
+
+    def _close(self):
+        if self._session:
+            self._session.close()
+        if self._forward:
+            self._forward.close()
+        self._forward = None
+        self._session = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def post(
+        self, api_path: str, body: Dict[str, Any], timeout: float = DEFAULT_RUNNER_API_TIMEOUT_SECONDS
+    ) -> requests.Response:
+        for attempt in range(2):
+            forward, session = self._connect()
+            try:
+                return session.post(f"http://127.0.0.1:{forward.local_port}/api/{api_path}", json=body, timeout=timeout)
+            except requests.ConnectionError:
+                if attempt:
+                    raise
+                self._disconnect(forward)
+
+    def trigger(
+        self, action_name: str, action_params: Dict[str, Any], timeout: float = DEFAULT_RUNNER_API_TIMEOUT_SECONDS
+    ) -> requests.Response:
+        return self.post("trigger", {"action_name": action_name, "action_params": action_params}, timeout)
+
+    def reload_playbooks(self, timeout: float = DEFAULT_RUNNER_API_TIMEOUT_SECONDS) -> requests.Response:
+        return self.post("playbooks/reload", {}, timeout)
+
+
+class AsyncRunnerApiClient:
+    """
+    asyncio variant of RunnerApiClient. Requests run on a dedicated thread pool, over the session of the wrapped client
+    """
+
+    def __init__(self, client: RunnerApiClient, max_workers: Optional[int] = None):
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or client.pool_size)
+
+    async def post(
+        self, api_path: str, body: Dict[str, Any], timeout: float = DEFAULT_RUNNER_API_TIMEOUT_SECONDS
+    ) -> requests.Response:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self.client.post, api_path, body, timeout))
+
+    async def trigger(
+        self, action_name: str, action_params: Dict[str, Any], timeout: float = DEFAULT_RUNNER_API_TIMEOUT_SECONDS
+    ) -> requests.Response:
+        return await self.post("trigger", {"action_name": action_name, "action_params": action_params}, timeout)
+
+    async def reload_playbooks(self, timeout: float = DEFAULT_RUNNER_API_TIMEOUT_SECONDS) -> requests.Response:
+        return await self.post("playbooks/reload", {}, timeout)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+_clients: Dict[Tuple[str, Optional[str]], RunnerApiClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_runner_api_client(namespace: Optional[str]) -> RunnerApiClient:
+    """
+    The runner api client of the current kube context and namespace, shared by every call in the process
+    """
+    context = get_kube_context()
+    key = (context or get_current_kube_context(), namespace)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = RunnerApiClient(namespace, context)
+        return _clients[key]
+
+
+@atexit.register
+def close_runner_api_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def post_to_runner(
+    namespace: Optional[str],
+    api_path: str,
+    body: Dict[str, Any],
+    tries: int = 1,
+    time_between_attempts: int = 10,
+    error_msg: str = "error calling the runner api",
+) -> requests.Response:
+    """
+    POST to the runner api, trying up to tries times. Raises RunnerApiException if the last try failed too
+    """
+    client = get_runner_api_client(namespace)
+    for _ in range(tries - 1):
+        try:
+            return client.post(api_path, body)
+        except (requests.RequestException, RunnerApiException):
+            typer.secho(f"error: {error_msg}", fg="red")
+            time.sleep(time_between_attempts)
+    try:
+        return client.post(api_path, body)
+    except RunnerApiException:
+        raise
+    except requests.RequestException as e:
+        raise RunnerApiException(f"Cannot reach the runner api: {e}")
@@ -0,0 +1,613 @@
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import IO, Callable, Dict, Iterator, List, NamedTuple, Optional, Pattern, Tuple
+
+import typer
+
+from robusta_cli.cluster_backend import RUNNER_CONTAINER, get_cluster_backend
+from robusta_cli.utils import get_runner_pods, log_title
+
+RUNNER_LOG_BUFFER_LINES = 10000
+# how far back the follower starts, so lines written while the log stream is being opened aren't missed
+FOLLOW_OVERLAP_SECONDS = 1
+# when the block of fetch_runner_logs ends, lines still on their way are awaited for a moment
+DRAIN_QUIET_SECONDS = 0.75
+DRAIN_MAX_SECONDS = 3
+
+# the runner logs these lines when a change of its playbooks config or playbooks packages is picked up, e.g.
+#   2024-05-02 10:11:12.345 INFO     Reloading playbook packages due to change on /etc/robusta/playbooks/storage
+# and, if loading the new playbooks raised, e.g.
+#   2024-05-02 10:11:13.456 ERROR    unknown error reloading playbooks. will try again when they next change
+# Both can be overridden, for runner versions that word them differently. Matched case insensitively
+RELOAD_STARTED_MARKER = os.environ.get("ROBUSTA_RELOAD_STARTED_MARKER", r"Reloading playbook packages due to change on")
+RELOAD_FAILED_MARKER = os.environ.get("ROBUSTA_RELOAD_FAILED_MARKER", r"error reloading playbooks")
+# the runner logs nothing when a reload succeeds. After the reload line, the next runner line tells if it failed.
+# If the runner stays quiet, the reload succeeded when no error line arrived this long after it started
+RELOAD_ERROR_WAIT_SECONDS = 1
+DEFAULT_RELOAD_TIMEOUT_SECONDS = 120
+
+# lines read ahead per log source. Readers block when it's full, so memory is bounded whatever the log volume
+SOURCE_QUEUE_LINES = 1000
+# when following, a line is held at most this long waiting for older lines from quieter sources
+MERGE_WINDOW_SECONDS = 0.5
+RECONNECT_DELAY_SECONDS = 2
+MAX_RECONNECT_ATTEMPTS = 5
+POD_DISCOVERY_INTERVAL_SECONDS = 10
+SINCE_PATTERN = re.compile(r"(\d+)([smhd])")
+SINCE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "WARNING": 30, "ERROR": 40, "CRITICAL": 50, "FATAL": 50}
+LEVEL_PATTERN = re.compile(r"\b(DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL|FATAL)\b")
+# the level comes right after the time in the runner log format. Searching only the start of the line is faster,
+# and doesn't mistake a message mentioning "error" for an error
+LEVEL_SEARCH_CHARS = 64
+SOURCE_COLORS = ["cyan", "magenta", "yellow", "green", "blue"]
+
+
+class LogLine(NamedTuple):
+    timestamp: str  # RFC3339, as written by the kubelet
+    source: str  # pod, or pod/container when following several containers
+    text: str
+
+
+def parse_since(since: str) -> int:
+    """
+    Seconds of a relative duration like 5s, 2m, 3h or 1h30m
+    """
+    parts = SINCE_PATTERN.findall(since)
+    if not parts or "".join(f"{value}{unit}" for value, unit in parts) != since:
+        raise typer.BadParameter(f"Invalid duration {since}. Use a duration like 5s, 2m or 3h")
+    return sum(int(value) * SINCE_UNITS[unit] for value, unit in parts)
+
+
+def _sortable_timestamp(timestamp: str) -> str:
+    # RFC3339Nano drops trailing zeros of the fraction. Pad it, so timestamps compare correctly as strings
+    seconds, _, fraction = timestamp.rstrip("Z").partition(".")
+    return f"{seconds}.{fraction:0<9}Z"
+
+
+def kubelet_timestamp(at: float) -> str:
+    """
+    A unix time in the format of LogLine timestamps, to compare them against
+    """
+    return datetime.fromtimestamp(at, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f000Z")
+
+
+class _LogSource:
+    """
+    Reads the logs of one container in a background thread, into a bounded queue.
+    When following, the stream is reopened if it breaks (e.g. the container restarted), skipping lines already read
+    """
+
+    END = None
+
+    def __init__(
+        self,
+        pod: str,
+        namespace: Optional[str],
+        container: str,
+        name: str,
+        since_seconds: Optional[int],
+        tail_lines: Optional[int],
+        follow: bool,
+        notify: threading.Condition,
+    ):
+        self.pod = pod
+        self.namespace = namespace
+        self.container = container
+        self.name = name
+        self.since_seconds = since_seconds
+        self.tail_lines = tail_lines
+        self.follow = follow
+        self.queue: "queue.Queue" = queue.Queue(maxsize=SOURCE_QUEUE_LINES)
+        self.finished = False
+        self._notify = notify
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._read,), daemon=True)
+
+    def start(self) -> "_LogSource":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self.queue.put(item, timeout=1)
+                break
+            except queue.Full:
+                continue
+        with self._notify:
+            self._notify.notify()
+
+    def _read(self):
+        last_timestamp = ""
+        resume_after = ""  # after reconnecting, lines up to this timestamp were already read
+        last_received = None
+        since_seconds = self.since_seconds
+        tail_lines = self.tail_lines
+        failures = 0
+        try:
+            while not self._stopped.is_set():
+                try:
+                    for raw_line in get_cluster_backend().logs(
+                        self.pod,
+                        self.namespace,
+                        container=self.container,
+                        since_seconds=since_seconds,
+                        tail_lines=tail_lines,
+                        follow=self.follow,
+                        timestamps=True,
+                    ):
+                        if self._stopped.is_set():
+                            return
+                        timestamp, _, text = raw_line.partition(" ")
+                        timestamp = _sortable_timestamp(timestamp)
+                        if resume_after:
+                            if timestamp <= resume_after:
+                                continue
+                            resume_after = ""
+                        last_timestamp = timestamp
+                        last_received = time.time()
+                        failures = 0
+                        self._put((LogLine(timestamp, self.name, text), last_received))
+                except Exception as e:
+                    failures += 1
+                    if not self.follow or failures >= MAX_RECONNECT_ATTEMPTS:
+                        typer.secho(f"Stopped reading logs of {self.name}: {e}", fg="yellow", err=True)
+                        return
+
+                if not self.follow:
+                    return
+                time.sleep(RECONNECT_DELAY_SECONDS)
+                typer.secho(f"Reconnecting to the logs of {self.name}", fg="yellow", err=True)
+                if last_received is not None:
+                    # a little overlap, the lines already read are skipped by timestamp
+                    since_seconds = int(time.time() - last_received) + RECONNECT_DELAY_SECONDS
+                    resume_after = last_timestamp
+                tail_lines = None
+        finally:
+            self._put(self.END)
+
+
+class LogMerger:
+    """
+    Merges the log lines of several sources by timestamp.
+
+    The heap holds at most one line per source: the next line of a source is only read once its previous line
+    was emitted, so memory doesn't grow with the log volume. Without follow, the output is exactly ordered.
+    When following, a line waits at most MERGE_WINDOW_SECONDS for sources that are quiet
+    """
+
+    def __init__(
+        self, follow: bool, discover: Optional[Callable[[], None]] = None, stop: Optional[threading.Event] = None
+    ):
+        self.follow = follow
+        self._stop = stop or threading.Event()
+        # called periodically while following, to add sources that appeared since
+        self.discover = discover if follow else None
+        self.sources: List[_LogSource] = []
+        self._notify = threading.Condition()
+        self._heap = []
+        self._has_head: Dict[int, bool] = {}
+        self._sequence = itertools.count()
+
+    def add_source(
+        self,
+        pod: str,
+        namespace: Optional[str],
+        container: str,
+        name: str,
+        since_seconds: Optional[int] = None,
+        tail_lines: Optional[int] = None,
+    ):
+        source = _LogSource(pod, namespace, container, name, since_seconds, tail_lines, self.follow, self._notify)
+        self.sources.append(source.start())
+
+    def stop(self):
+        self._stop.set()
+        for source in self.sources:
+            source.stop()
+
+    def _fill_heads(self) -> bool:
+        """
+        Read the next line of every source that has none in the heap. Returns True if all live sources have one
+        """
+        complete = True
+        for index, source in enumerate(self.sources):
+            if source.finished or self._has_head.get(index):
+                continue
+            try:
+                item = source.queue.get_nowait()
+            except queue.Empty:
+                complete = False
+                continue
+            if item is _LogSource.END:
+                source.finished = True
+                continue
+            line, received = item
+            heapq.heappush(self._heap, (line.timestamp, next(self._sequence), index, line, received))
+            self._has_head[index] = True
+        return complete
+
+    def __iter__(self) -> Iterator[LogLine]:
+        last_discovery = time.time()
+        while not self._stop.is_set():
+            if self.discover and time.time() - last_discovery > POD_DISCOVERY_INTERVAL_SECONDS:
+                last_discovery = time.time()
+                self.discover()
+
+            with self._notify:
+                complete = self._fill_heads()
+                if not self._heap:
+                    if not self.discover and all(source.finished for source in self.sources):
+                        return
+                    self._notify.wait(MERGE_WINDOW_SECONDS)
+                    continue
+
+                if not complete:
+                    wait = MERGE_WINDOW_SECONDS - (time.time() - self._heap[0][4]) if self.follow else 1
+                    if wait > 0:
+                        self._notify.wait(wait)
+                        continue
+
+                _, _, index, line, _ = heapq.heappop(self._heap)
+                self._has_head[index] = False
+            yield line
+
+
+def stream_runner_logs(
+    namespace: Optional[str],
+    pods: Optional[List[str]] = None,
+    all_containers: bool = False,
+    since_seconds: Optional[int] = None,
+    tail_lines: Optional[int] = None,
+    follow: bool = False,
+    stop: Optional[threading.Event] = None,
+) -> Iterator[LogLine]:
+    """
+    The logs of every runner pod (or of the given pods), merged by timestamp.
+    When following without explicit pods, new runner pods (e.g. from a rollout) are picked up as they start.
+    Setting `stop` ends the stream, even if no lines arrive
+    """
+    known_pods = set()
+
+    def add_pods(pod_infos: List[Dict], since: Optional[int] = None, tail: Optional[int] = None):
+        for pod_info in pod_infos:
+            if pod_info["name"] in known_pods:
+                continue
+            known_pods.add(pod_info["name"])
+            containers = (pod_info.get("containers") or [RUNNER_CONTAINER]) if all_containers else [RUNNER_CONTAINER]
+            for container in containers:
+                name = f"{pod_info['name']}/{container}" if all_containers else pod_info["name"]
+                merger.add_source(pod_info["name"], namespace, container, name, since, tail)
+
+    def discover_pods():
+        # pods that started while following are new, so all their logs are read
+        add_pods(get_runner_pods(namespace, use_cache=False))
+
+    merger = LogMerger(follow, discover=None if pods else discover_pods, stop=stop)
+    add_pods([{"name": pod} for pod in pods] if pods else get_runner_pods(namespace), since_seconds, tail_lines)
+    if not merger.sources:
+        return
+
+    try:
+        yield from merger
+    finally:
+        merger.stop()
+
+
+class LogFilter:
+    """
+    Filters log lines as they are streamed, keeping no state but the current record of each source.
+
+    A record is a line with a log level, plus the lines without one that follow it (e.g. a traceback).
+    The level and playbook filters apply to whole records, grep to single lines
+    """
+
+    def __init__(self, grep: Optional[str] = None, level: Optional[str] = None, playbook: Optional[str] = None):
+        if level and level.upper() not in LOG_LEVELS:
+            raise typer.BadParameter(f"Unknown log level {level}. Options are {', '.join(LOG_LEVELS)}")
+        self.grep = re.compile(grep) if grep else None
+        self.min_level = LOG_LEVELS[level.upper()] if level else None
+        self.playbook = re.compile(rf"\b{re.escape(playbook)}\b") if playbook else None
+        self._records: Dict[str, Tuple[Optional[str], bool]] = {}
+
+    def match(self, line: LogLine) -> Tuple[bool, Optional[str]]:
+        """
+        Whether the line passes the filters, and the level of its record
+        """
+        level_match = LEVEL_PATTERN.search(line.text, 0, LEVEL_SEARCH_CHARS)
+        if level_match:
+            level = level_match.group(1)
+            record_matches = (self.min_level is None or LOG_LEVELS[level] >= self.min_level) and (
+                self.playbook is None or self.playbook.search(line.text) is not None
+            )
+            self._records[line.source] = (level, record_matches)
+        else:
+            level, record_matches = self._records.get(
+                line.source, (None, self.min_level is None and self.playbook is None)
+            )
+        if record_matches and self.grep is not None:
+            record_matches = self.grep.search(line.text) is not None
+        return record_matches, level
+
+
+class LogPrinter:
+    """
+    Writes log lines to a stream, as text with an optional per-source tag, or as json lines.
+    Lines are written directly rather than with typer.echo, which checks the terminal again for every line
+    """
+
+    def __init__(self, out: IO[str], timestamps: bool, as_json: bool, show_source: bool, flush: bool):
+        self.out = out
+        self.timestamps = timestamps
+        self.as_json = as_json
+        self.show_source = show_source
+        self.flush = flush
+        self._use_colors = out.isatty()
+        self._source_prefixes: Dict[str, str] = {}
+
+    def format(self, line: LogLine, level: Optional[str]) -> str:
+        if self.as_json:
+            return json.dumps(
+                {"timestamp": line.timestamp, "source": line.source, "level": level, "message": line.text}
+            )
+
+        prefix = self._source_prefixes.get(line.source)
+        if prefix is None:
+            color = SOURCE_COLORS[len(self._source_prefixes) % len(SOURCE_COLORS)]
+            prefix = f"[{line.source}]"
+            prefix = self._source_prefixes[line.source] = typer.style(prefix, fg=color) if self._use_colors else prefix
+            # lines of a new pod showed up, e.g. during a rollout
+            self.show_source = self.show_source or len(self._source_prefixes) > 1
+
+        text = f"{line.timestamp} {line.text}" if self.timestamps else line.text
+        return f"{prefix} {text}" if self.show_source else text
+
+    def write(self, formatted: str):
+        self.out.write(formatted + "\n")
+        if self.flush:
+            self.out.flush()
+
+
+class RunnerLogFollower:
+    """
+    Follows the logs of every runner pod in a background thread, keeping the last lines in a bounded buffer
+    """
+
+    def __init__(
+        self,
+        namespace: Optional[str],
+        since_seconds: Optional[int] = FOLLOW_OVERLAP_SECONDS,
+        max_lines: int = RUNNER_LOG_BUFFER_LINES,
+    ):
+        self.namespace = namespace
+        self.since_seconds = since_seconds
+        self.lines: deque = deque(maxlen=max_lines)
+        self.received: deque = deque(maxlen=max_lines)  # the time each buffered line was received
+        self.total_lines = 0  # including lines that were already dropped from the buffer
+        self.error: Optional[Exception] = None
+        self._created = time.time()
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        # run in a copy of the caller's context, so the follower uses the same kube context
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._follow,), daemon=True)
+
+    def start(self) -> "RunnerLogFollower":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive() and not self._stopped.is_set()
+
+    @property
+    def dropped_lines(self) -> int:
+        return self.total_lines - len(self.lines)
+
+    def _follow(self):
+        try:
+            if not get_runner_pods(self.namespace):
+                raise Exception(f"runner pod not found in namespace {self.namespace}")
+            since_seconds = self.since_seconds
+            if since_seconds is not None:
+                # also cover the time it took to find the runner pods
+                since_seconds += int(time.time() - self._created)
+            lines = stream_runner_logs(self.namespace, since_seconds=since_seconds, follow=True, stop=self._stopped)
+            for line in lines:
+                with self._condition:
+                    self.lines.append(line)
+                    self.received.append(time.time())
+                    self.total_lines += 1
+                    self._condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._condition:
+                self._condition.notify_all()
+
+    def wait_for(
+        self, pattern: Pattern, timeout: float, from_line: int = 0, since: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Wait for a line matching pattern, starting at line number `from_line` of the stream. With since, only lines
+        the kubelet timestamped from then on count.
+        Returns the text of the matching line, or None on timeout or if the stream ended
+        """
+        deadline = time.time() + timeout
+        next_line = from_line
+        with self._condition:
+            while True:
+                # lines that fell out of the buffer can't be checked anymore
+                first_buffered = self.total_lines - len(self.lines)
+                next_line = max(next_line, first_buffered)
+                for line in list(self.lines)[next_line - first_buffered :]:
+                    if (since is None or line.timestamp >= since) and pattern.search(line.text):
+                        return line.text
+                next_line = self.total_lines
+
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self.running:
+                    return None
+                self._condition.wait(remaining)
+
+    def read(self, from_line: int, timeout: float) -> Tuple[List[Tuple[LogLine, float]], int]:
+        """
+        The buffered lines from line number `from_line` on, with the time each line was received, waiting up to
+        timeout if there are none yet. Returns the lines and the number of the next line to read
+        """
+        deadline = time.time() + timeout
+        with self._condition:
+            while self.total_lines <= from_line and self.running:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            first_buffered = self.total_lines - len(self.lines)
+            start = max(from_line, first_buffered) - first_buffered
+            lines = list(zip(itertools.islice(self.lines, start, None), itertools.islice(self.received, start, None)))
+            return lines, self.total_lines
+
+    def drain(self, quiet_seconds: float = DRAIN_QUIET_SECONDS, max_seconds: float = DRAIN_MAX_SECONDS):
+        """
+        Wait for lines still on their way, until none arrived for quiet_seconds
+        """
+        deadline = time.time() + max_seconds
+        with self._condition:
+            while self.running and time.time() < deadline:
+                seen = self.total_lines
+                self._condition.wait(min(quiet_seconds, max(deadline - time.time(), 0)))
+                if self.total_lines == seen:
+                    return
+
+
+# the follower of the enclosing fetch_runner_logs block, reused by the reload watch instead of opening another stream
+_active_follower: ContextVar[Optional[RunnerLogFollower]] = ContextVar("active_follower", default=None)
+
+
+@contextmanager
+def fetch_runner_logs(namespace: Optional[str], all_logs: bool = False):
+    """
+    Print the runner logs written while the block runs.
+    The logs are followed in the background from the start, so lines of a runner that restarts meanwhile aren't lost
+    """
+    follower = RunnerLogFollower(namespace, since_seconds=None if all_logs else FOLLOW_OVERLAP_SECONDS).start()
+    token = _active_follower.set(follower)
+    try:
+        yield
+    finally:
+        _active_follower.reset(token)
+        follower.drain()
+        follower.stop()
+
+        log_title("Fetching logs...")
+        if follower.error and not follower.total_lines:
+            log_title("Cannot fetch logs. robusta-runner not found", color="red")
+        else:
+            if follower.dropped_lines:
+                typer.secho(f"... {follower.dropped_lines} earlier lines not shown", fg="yellow")
+            lines = list(follower.lines)
+            show_source = len({line.source for line in lines}) > 1
+            printer = LogPrinter(sys.stdout, timestamps=False, as_json=False, show_source=show_source, flush=False)
+            for line in lines:
+                printer.write(printer.format(line, None))
+            sys.stdout.flush()
+
+
+class RunnerReloadWatch:
+    def __init__(self, namespace: Optional[str], timeout: float, fail_on_timeout: bool = True):
+        self.timeout = timeout
+        self.fail_on_timeout = fail_on_timeout
+        active_follower = _active_follower.get()
+        self.owns_follower = active_follower is None or active_follower.namespace != namespace
+        self.follower = RunnerLogFollower(namespace).start() if self.owns_follower else active_follower
+        # only lines written after the change count. The follower starts a little in the past, and those lines may
+        # still be on their way, so lines are told apart by their kubelet timestamp rather than their arrival
+        self.since = kubelet_timestamp(time.time())
+        self.from_line = self.follower.total_lines
+
+    def _lines(self, timeout: float) -> List[LogLine]:
+        """
+        The lines written after the change that arrived since the last call, waiting up to timeout for one
+        """
+        deadline = time.time() + timeout
+        while True:
+            lines, self.from_line = self.follower.read(self.from_line, max(deadline - time.time(), 0))
+            lines = [line for line, _ in lines if line.timestamp >= self.since]
+            if lines or time.time() >= deadline or not self.follower.running:
+                return lines
+
+    def _wait_reload_line(self, started_marker: Pattern) -> Tuple[Optional[LogLine], List[LogLine]]:
+        """
+        The first reload or reload error line, and the lines after it that arrived with it
+        """
+        deadline = time.time() + self.timeout
+        while time.time() < deadline and self.follower.running:
+            lines = self._lines(deadline - time.time())
+            for index, line in enumerate(lines):
+                if started_marker.search(line.text):
+                    return line, lines[index + 1 :]
+        return None, []
+
+    def wait(self):
+        """
+        Block until the runner logs that it reloaded, instead of sleeping a fixed time.
+        Exits the cli with an error if the runner logged a reload error, or if the reload wasn't seen within the
+        timeout (unless fail_on_timeout is off)
+        """
+        start = time.time()
+        started_marker = re.compile(f"({RELOAD_STARTED_MARKER})|({RELOAD_FAILED_MARKER})", re.IGNORECASE)
+        failed_marker = re.compile(RELOAD_FAILED_MARKER, re.IGNORECASE)
+        line, following = self._wait_reload_line(started_marker)
+        if line is None:
+            reason = f" ({self.follower.error})" if self.follower.error else ""
+            message = f"Did not see the runner reload within {self.timeout}s{reason}. Check the runner logs below"
+            typer.secho(message, fg="red" if self.fail_on_timeout else "yellow")
+            if self.fail_on_timeout:
+                raise typer.Exit(code=1)
+            return
+
+        duration = time.time() - start
+        if not failed_marker.search(line.text):
+            # an error is logged right after the reload line. Any other runner line means there was none
+            following = following or self._lines(RELOAD_ERROR_WAIT_SECONDS)
+            line = next((line for line in following[:1] if failed_marker.search(line.text)), None)
+        if line is not None:
+            typer.secho(f"The runner failed to reload: {line.text}", fg="red")
+            raise typer.Exit(code=1)
+        typer.secho(f"Runner reloaded the playbooks {duration:.1f}s after the change", fg="green")
+
+
+@contextmanager
+def watch_runner_reload(
+    namespace: Optional[str], timeout: float, fail_on_timeout: bool = True
+) -> Iterator[RunnerReloadWatch]:
+    """
+    Start following the runner logs before changing its playbooks, so the reload marker can't be missed
+    """
+    watch = RunnerReloadWatch(namespace, timeout, fail_on_timeout)
+    try:
+        yield watch
+    finally:
+        if watch.owns_follower:
+            watch.follower.stop()
@@ -6,11 +6,11 @@ from typing import Any, Dict, Optional
 
 import jwt as JWT
 import typer
-import yaml
 from pydantic import BaseModel
 
 from robusta_cli.backend_profile import BackendProfile
 from robusta_cli.utils import host_for_params
+from robusta_cli.yaml_utils import safe_dump
 
 ISSUER: str = "supabase"
 
@@ -30,7 +30,7 @@ def write_values_files(
     backendProfile: BackendProfile,
 ):
     with open(values_path, "w") as output_file:
-        yaml.safe_dump(values, output_file, sort_keys=False)
+        safe_dump(values, output_file, sort_keys=False)
         typer.secho(
             f"Saved configuration to {values_path} - save this file for future use!",
             fg="red",
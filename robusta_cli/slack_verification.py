@@ -1,13 +1,12 @@
 import traceback
 from urllib.error import URLError
 
-import certifi
-import ssl
-import os
 import typer
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 
+from robusta_cli.custom_ca import get_ssl_context
+
 SLACK_WELCOME_MESSAGE_TITLE = ":large_green_circle: INFO - Welcome to Robusta"
 SLACK_WELCOME_MESSAGE_HEADER = "You've just signed up for Slack monitoring! "
 SLACK_WELCOME_THANK_YOU_MESSAGE = "Thank you for using Robusta.dev"
@@ -27,14 +26,13 @@ def verify_slack_channel(
         output_welcome_message_blocks = __gen_robusta_test_welcome_message()
 
         ssl_context = None
-        if os.environ.get("CERTIFICATE", ""):
-            try:
-                ssl_context = ssl.create_default_context(cafile=certifi.where())
-            except Exception as e:
-                typer.secho(
-                    f"Failed to use custom certificate. {e}",
-                    fg=typer.colors.RED,
-                )
+        try:
+            ssl_context = get_ssl_context()
+        except Exception as e:
+            typer.secho(
+                f"Failed to use custom certificate. {e}",
+                fg=typer.colors.RED,
+            )
         slack_client = WebClient(token=slack_api_key, ssl=ssl_context)
         slack_client.chat_postMessage(
             channel=channel_name,
@@ -1,54 +1,33 @@
+import json
 import os
-import shlex
+import re
 import subprocess
+import tempfile
+import threading
 import time
 from contextlib import contextmanager
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 import click_spinner
-import requests
-import toml
 import typer
-from dpath.util import get
 
-PLAYBOOKS_DIR = "playbooks/"
-
-
-def namespace_to_kubectl(namespace: Optional[str]):
-    if namespace is None:
-        return ""
-    else:
-        return f"-n {namespace}"
-
-
-def exec_in_robusta_runner(
-    cmd,
-    namespace: Optional[str],
-    tries=1,
-    time_between_attempts=10,
-    error_msg="error running cmd",
-    dry_run: bool = False,
-):
-    exec_cmd = _build_exec_command(cmd, namespace)
+from robusta_cli.cluster_backend import get_cluster_backend, get_kube_context
 
-    if dry_run:
-        typer.echo(f"Run the following command:\n {shlex.join(exec_cmd)}")
-        return
-
-    typer.echo(f"running cmd: {cmd}")
-
-    for _ in range(tries - 1):
-        try:
-            return subprocess.check_call(exec_cmd)
-        except Exception:
-            typer.secho(f"error: {error_msg}", fg="red")
-            time.sleep(time_between_attempts)
-    return subprocess.check_call(cmd)
+PLAYBOOKS_DIR = "playbooks/"
+ROBUSTA_CACHE_DIR = os.environ.get("ROBUSTA_CACHE_DIR", "")
+RUNNER_POD_CACHE_TTL_SECONDS = int(os.environ.get("ROBUSTA_RUNNER_POD_CACHE_TTL", 30))
+RUNNER_POD_DISK_CACHE = os.environ.get("ROBUSTA_RUNNER_POD_DISK_CACHE", "true").lower() == "true"
+RUNNER_POD_CACHE_FILE = "runner_pods.json"
+RUNNER_LABEL_SELECTOR = "robustaComponent=runner"
+# the API server's NotFound error for a pod, as printed by kubectl (pods "name" not found), possibly json escaped,
+# or the failed exec websocket handshake of the api backend
+POD_NOT_FOUND_PATTERN = re.compile(r'pods \\*"[^"\\]+\\*" not found|Handshake status 404')
+CURRENT_CONTEXT_PATTERN = re.compile(r"^current-context:[ \t]*(.*)$", re.MULTILINE)
 
 
 def exec_in_robusta_runner_output(command: str, namespace: Optional[str]) -> Optional[bytes]:
-    exec_cmd = _build_exec_command(command, namespace)
-    result = subprocess.check_output(exec_cmd)
+    with invalidate_runner_pod_on_error(namespace):
+        result = get_cluster_backend().exec(get_runner_pod(namespace), namespace, command)
     return result
 
 
@@ -68,6 +47,8 @@ def _build_exec_command(command: str, namespace: Optional[str]) -> List[str]:
 
 
 def download_file(url, local_path):
+    import requests
+
     with click_spinner.spinner():
         response = requests.get(url)
         response.raise_for_status()
@@ -75,12 +56,32 @@ def download_file(url, local_path):
         f.write(response.content)
 
 
+def get_cache_dir(*sub_dirs: str) -> str:
+    """
+    Local cache directory of the cli. Defaults to $XDG_CACHE_HOME/robusta (~/.cache/robusta)
+    """
+    cache_root = ROBUSTA_CACHE_DIR or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "robusta"
+    )
+    cache_dir = os.path.join(cache_root, *sub_dirs)
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    return cache_dir
+
+
 def log_title(title, color=None):
     typer.echo("=" * 70)
     typer.secho(title, fg=color)
     typer.echo("=" * 70)
 
 
+def format_bytes(size: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(size) < 1024 or unit == "GB":
+            break
+        size /= 1024
+    return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+
+
 def replace_in_file(path, original, replacement):
     with open(path) as r:
         text = r.read()
@@ -95,48 +96,182 @@ def host_for_params(component, domain, scheme="https"):
     return f"{scheme}://{component}.{domain}"
 
 
-@contextmanager
-def fetch_runner_logs(namespace: Optional[str], all_logs=False):
-    start = time.time()
-    try:
-        yield
-    finally:
-        log_title("Fetching logs...")
-        try:
-            if all_logs:
-                subprocess.check_call(
-                    f"kubectl logs {namespace_to_kubectl(namespace)} {get_runner_pod(namespace)} -c runner",
-                    shell=True,
-                )
-            else:
-                subprocess.check_call(
-                    f"kubectl logs {namespace_to_kubectl(namespace)} {get_runner_pod(namespace)} -c runner --since={int(time.time() - start + 1)}s",
-                    shell=True,
-                )
-        except Exception:
-            log_title("Cannot fetch logs. robusta-runner not found", color="red")
-            return
-
-
 def get_package_name(playbooks_dir: str) -> str:
+    import toml
+    from dpath.util import get
+
     with open(os.path.join(playbooks_dir, "pyproject.toml"), "r") as pyproj_toml:
         data = pyproj_toml.read()
         parsed = toml.loads(data)
         return get(parsed, "tool/poetry/name", default="")
 
 
-def get_runner_pod(namespace: Optional[str]) -> str:
-    output = subprocess.run(
-        f"kubectl get pods {namespace_to_kubectl(namespace)} "
-        f'--selector="robustaComponent=runner" '
-        f"--field-selector=status.phase==Running "
-        f"--no-headers "
-        f'-o custom-columns=":metadata.name"',
-        shell=True,
-        text=True,
-        capture_output=True,
-    ).stdout.strip()
+def get_kubeconfig_paths() -> List[str]:
+    kubeconfig = os.environ.get("KUBECONFIG") or os.path.join(os.path.expanduser("~"), ".kube", "config")
+    return [path for path in kubeconfig.split(os.pathsep) if path]
+
+
+def get_current_kube_context() -> str:
+    """
+    The current-context of the kubeconfig. Read with a regex rather than a yaml parser, as it's on the hot path
+    """
+    for path in get_kubeconfig_paths():
+        try:
+            with open(path, "r") as kubeconfig:
+                match = CURRENT_CONTEXT_PATTERN.search(kubeconfig.read())
+        except OSError:
+            continue
+        if match:
+            return match.group(1).strip().strip("\"'")
+    return ""
+
+
+def _kubeconfig_fingerprint() -> str:
+    # switching context or namespace rewrites the kubeconfig, which invalidates cached pods resolved with the old one
+    mtimes = []
+    for path in get_kubeconfig_paths():
+        try:
+            mtimes.append(str(os.stat(path).st_mtime_ns))
+        except OSError:
+            mtimes.append("")
+    return ":".join(mtimes)
+
+
+def _runner_pod_cache_key(namespace: Optional[str]) -> str:
+    return f"{get_kube_context() or get_current_kube_context()}/{namespace or ''}"
 
+
+class TtlCache:
+    """
+    Cache of json serializable values that expire after ttl_seconds, keyed by strings.
+    Entries are kept in memory, and optionally in cache_file_name under the cache dir, so consecutive cli
+    invocations share them. With kubeconfig_bound, entries also expire when the kubeconfig changes.
+    Safe to use from multiple threads.
+    """
+
+    def __init__(self, cache_file_name: str, ttl_seconds: int, disk_cache: bool, kubeconfig_bound: bool = True):
+        self.cache_file_name = cache_file_name
+        self.ttl_seconds = ttl_seconds
+        self.disk_cache = disk_cache
+        self.kubeconfig_bound = kubeconfig_bound
+        self._entries: Dict[str, Dict] = {}
+        self._loaded_from_disk = False
+        self._lock = threading.RLock()
+
+    def _fingerprint(self) -> str:
+        return _kubeconfig_fingerprint() if self.kubeconfig_bound else ""
+
+    def get(self, key: str) -> Optional[Any]:
+        if self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+        if not entry or entry["expires"] < time.time() or entry["kubeconfig"] != self._fingerprint():
+            return None
+        return entry.get("value")
+
+    def set(self, key: str, value: Any):
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._load()
+            self._entries[key] = {
+                "value": value,
+                "expires": time.time() + self.ttl_seconds,
+                "kubeconfig": self._fingerprint(),
+            }
+            self._save()
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._load()
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def _cache_file(self) -> str:
+        return os.path.join(get_cache_dir(), self.cache_file_name)
+
+    def _load(self):
+        if self._loaded_from_disk or not self.disk_cache:
+            return
+        self._loaded_from_disk = True
+        try:
+            with open(self._cache_file(), "r") as cache_file:
+                entries = json.load(cache_file)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        self._entries.update({key: entry for key, entry in entries.items() if entry.get("expires", 0) >= now})
+
+    def _save(self):
+        if not self.disk_cache:
+            return
+        try:
+            cache_path = self._cache_file()
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+            with os.fdopen(fd, "w") as cache_file:
+                json.dump(self._entries, cache_file)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # the disk cache is best effort
+
+
+# short lived cache of the runner pods, keyed by kube context and namespace
+runner_pod_cache = TtlCache(RUNNER_POD_CACHE_FILE, RUNNER_POD_CACHE_TTL_SECONDS, RUNNER_POD_DISK_CACHE)
+
+
+def is_pod_not_found_error(error: Exception) -> bool:
+    """
+    Whether a command failed with the API server's NotFound error for the pod, rather than failing in the pod
+    """
+    if getattr(error, "returncode", None) == 404:  # the api backend's NotFound. Exit codes don't go above 255
+        return True
+    output = ""
+    for stream in (getattr(error, "output", None), getattr(error, "stderr", None)):
+        if isinstance(stream, bytes):
+            stream = stream.decode("utf-8", errors="replace")
+        output += stream or ""
+    return POD_NOT_FOUND_PATTERN.search(output) is not None
+
+
+def invalidate_runner_pod(namespace: Optional[str]):
+    runner_pod_cache.invalidate(_runner_pod_cache_key(namespace))
+
+
+@contextmanager
+def invalidate_runner_pod_on_error(namespace: Optional[str]):
+    """
+    Drop the cached runner pod when a command running against it fails because the pod no longer exists
+    """
+    try:
+        yield
+    except subprocess.CalledProcessError as e:
+        if is_pod_not_found_error(e):
+            invalidate_runner_pod(namespace)
+        raise
+
+
+def get_runner_pods(namespace: Optional[str], use_cache: bool = True) -> List[Dict]:
+    """
+    The running runner pods, as returned by ClusterBackend.list_pods
+    """
+    cache_key = _runner_pod_cache_key(namespace)
+    pods = runner_pod_cache.get(cache_key) if use_cache else None
+    if pods is None:
+        try:
+            pods = get_cluster_backend().list_pods(
+                namespace, label_selector=RUNNER_LABEL_SELECTOR, field_selector="status.phase==Running"
+            )
+        except Exception:
+            pods = []
+        if pods:
+            runner_pod_cache.set(cache_key, pods)
+    return pods
+
+
+def get_runner_pod(namespace: Optional[str]) -> str:
+    output = "\n".join(pod["name"] for pod in get_runner_pods(namespace))
     if not output:
         typer.secho(
             f"Could not find robusta pod in namespace {namespace}. Are you missing the --namespace flag correctly?",
@@ -0,0 +1,42 @@
+from typing import IO, Any, Optional, Union
+
+import yaml
+
+# the libyaml based loader and dumper are many times faster. PyYAML can be built without libyaml, hence the fallback
+try:
+    from yaml import CSafeDumper, CSafeLoader
+
+    SafeLoader = CSafeLoader
+except ImportError:
+    CSafeDumper = None
+    SafeLoader = yaml.SafeLoader
+
+
+def _libyaml_emits_identically(data: Any) -> bool:
+    """
+    libyaml quotes and folds some strings differently than the python emitter: multiline or non printable strings,
+    non ascii strings and empty keys. The output is the same for everything else
+    """
+    if isinstance(data, str):
+        return data.isascii() and data.isprintable()
+    if isinstance(data, dict):
+        return all(
+            key != "" and _libyaml_emits_identically(key) and _libyaml_emits_identically(value)
+            for key, value in data.items()
+        )
+    if isinstance(data, (list, tuple, set)):
+        return all(_libyaml_emits_identically(item) for item in data)
+    return True
+
+
+def safe_load(stream: Union[str, bytes, IO]) -> Any:
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def safe_dump(data: Any, stream: Optional[IO] = None, **kwargs) -> Optional[str]:
+    """
+    Same arguments and output as yaml.safe_dump, byte for byte. Data libyaml would format differently is dumped with
+    the python emitter
+    """
+    dumper = CSafeDumper if CSafeDumper and _libyaml_emits_identically(data) else yaml.SafeDumper
+    return yaml.dump(data, stream, Dumper=dumper, **kwargs)
@@ -0,0 +1,152 @@
+import json
+import queue
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+import pytest
+
+from robusta_cli import runner_api as runner_api_module
+from robusta_cli import playbooks_sync, runner_logs
+from robusta_cli.cluster_backend import PortForward
+from robusta_cli.runner_logs import LogLine, kubelet_timestamp
+
+RUNNER_POD = "robusta-runner-6d9f8-abcde"
+
+
+class FakeRunnerLog:
+    """
+    Lines put are streamed as the runner logs, timestamped by the kubelet when they were put, or at written
+    """
+
+    def __init__(self):
+        self.lines: "queue.Queue" = queue.Queue()
+
+    def put(self, text: str, written: Optional[float] = None):
+        self.lines.put((time.time() if written is None else written, text))
+
+    def stream(self, namespace, since_seconds=None, follow=False, stop=None):
+        while not stop.is_set():
+            try:
+                written, text = self.lines.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            yield LogLine(kubelet_timestamp(written), RUNNER_POD, text)
+
+
+@pytest.fixture
+def runner_log(monkeypatch) -> FakeRunnerLog:
+    runner_log = FakeRunnerLog()
+    monkeypatch.setattr(runner_logs, "get_runner_pods", lambda namespace: [{"name": RUNNER_POD}])
+    monkeypatch.setattr(runner_logs, "stream_runner_logs", runner_log.stream)
+    return runner_log
+
+
+class FakeRunnerApi(ThreadingHTTPServer):
+    """
+    The runner http api. Triggers of the action named "fail" get a 500. Counts the connections it accepted
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _RunnerApiHandler)
+        self.requests: List[Dict] = []
+        self.connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+
+class _RunnerApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the runner
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append({"path": self.path, **body})
+        failed = body.get("action_name") == "fail"
+        response = json.dumps({"success": not failed}).encode()
+        self.send_response(500 if failed else 200)
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class _LocalPortForward(PortForward):
+    def close(self):
+        pass
+
+
+class FakePortForwardBackend:
+    """
+    A cluster backend whose port-forwards lead to local_port, or fail with error. Counts the port-forwards opened
+    """
+
+    def __init__(self, local_port: int):
+        self.local_port = local_port
+        self.error: Optional[Exception] = None
+        self.port_forwards = 0
+
+    def port_forward(self, pod: str, namespace: Optional[str], remote_port: int) -> PortForward:
+        self.port_forwards += 1
+        if self.error:
+            raise self.error
+        return _LocalPortForward(self.local_port)
+
+
+@pytest.fixture
+def runner_api(monkeypatch) -> Iterator[Tuple[FakeRunnerApi, FakePortForwardBackend]]:
+    """
+    A runner api server, and the backend the runner api clients reach it through
+    """
+    server = FakeRunnerApi()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    backend = FakePortForwardBackend(server.server_address[1])
+    monkeypatch.setattr(runner_api_module, "_clients", {})
+    monkeypatch.setattr(runner_api_module, "get_cluster_backend", lambda: backend)
+    monkeypatch.setattr(runner_api_module, "get_runner_pod", lambda namespace: RUNNER_POD)
+    monkeypatch.setattr(runner_api_module, "invalidate_runner_pod", lambda namespace: None)
+    yield server, backend
+    runner_api_module.close_runner_api_clients()
+    server.shutdown()
+    server.server_close()
+
+
+class LocalExecBackend:
+    """
+    A cluster backend whose pod execs run bash on this machine. Records the commands it ran
+    """
+
+    def __init__(self):
+        self.commands: List[str] = []
+
+    def exec(
+        self,
+        pod: str,
+        namespace: Optional[str],
+        command: str,
+        container: str = "runner",
+        stdin: Optional[IO[bytes]] = None,
+        stdout: Optional[IO[bytes]] = None,
+    ) -> bytes:
+        self.commands.append(command)
+        process = subprocess.run(
+            ["bash", "-c", command],
+            input=stdin.read() if stdin is not None else b"",  # stdin may be an in memory file
+            stdout=stdout if stdout is not None else subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command, process.stdout, process.stderr)
+        return process.stdout or b""
+
+
+@pytest.fixture
+def local_exec_backend(monkeypatch) -> LocalExecBackend:
+    backend = LocalExecBackend()
+    monkeypatch.setattr(playbooks_sync, "get_cluster_backend", lambda: backend)
+    return backend
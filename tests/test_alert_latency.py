@@ -0,0 +1,77 @@
+import json
+import time
+from contextlib import contextmanager
+
+from typer.testing import CliRunner
+
+from robusta_cli import alert_latency, demo_alert
+from robusta_cli.alert_latency import measure_alert_latency, measure_demo_latency
+from robusta_cli.main import app
+
+
+def _alert_line(measure_id: str) -> str:
+    # the runner logs the alerts it handles with their labels
+    return (
+        "2024-05-02 10:11:12.345 INFO     running playbook for alert PrometheusKubernetesAlert "
+        "labels={'alertname': 'KubePodCrashLooping', 'namespace': 'default', 'pod': 'api-7c9d-x1', "
+        f"'severity': 'critical', 'robusta_measure_id': '{measure_id}'}}"
+    )
+
+
+def test_latency_of_alerts_processed_by_the_runner(runner_log):
+    with measure_alert_latency(None, "3f2a9c1b7e4d") as tracker:
+        alerts = tracker.tag([{"labels": {"alertname": "KubePodCrashLooping"}} for _ in range(11)])
+        tracker.sent(alerts, sent_at=0)
+        runner_log.put(_alert_line("3f2a9c1b7e4d-1"))  # alert 1 only, not alert 10
+        runner_log.put(_alert_line("0a0a0a0a0a0a-0"))  # an alert of another run
+        runner_log.put(_alert_line("3f2a9c1b7e4d-10"))
+        report = tracker.wait(timeout=1)
+    assert (report.alerts, report.processed) == (11, 2)
+    assert report.p50_ms is not None
+
+
+def test_kube_config_is_loaded_before_following_the_runner_logs(monkeypatch):
+    calls = []
+
+    @contextmanager
+    def follow_runner_logs(namespace, run_id):
+        calls.append("follow runner logs")
+        yield None
+
+    monkeypatch.setattr(demo_alert, "load_kube_config", lambda kube_config: calls.append(f"load {kube_config}"))
+    monkeypatch.setattr(alert_latency, "measure_alert_latency", follow_runner_logs)
+    monkeypatch.setattr(demo_alert, "create_demo_alert", lambda *args: ("api-7c9d-x1", "default"))
+    result = CliRunner().invoke(app, ["demo-alert", "--measure", "--kube-config", "/tmp/other-cluster"])
+    assert result.exit_code == 0, result.output
+    assert calls == ["load /tmp/other-cluster", "follow runner logs"]
+
+
+def _crashpod_line(pod: str) -> str:
+    return f"2024-05-02 10:11:12.345 INFO     running playbook for pod {pod} in namespace default, restart count 3"
+
+
+def test_demo_latency_counts_only_the_pods_of_this_demo(runner_log):
+    with measure_demo_latency(None, "5d1e0c2b9a8f") as measurement:
+        measurement.pod_prefix = "crashpod-7f9c6b4d8-"
+        runner_log.put(_crashpod_line("crashpod-7f9c6b4d8-q2x7z"), written=time.time() - 1)  # replayed
+        runner_log.put(_crashpod_line("crashpod-64d5f7c9b-k8m2p"))  # a pod of an earlier demo
+        assert measurement.wait(timeout=0.5) is None
+        runner_log.put(_crashpod_line("crashpod-7f9c6b4d8-q2x7z"))
+        assert measurement.wait(timeout=1) is not None
+
+
+def test_demo_deployment_is_labeled_with_the_demo_id(runner_log, monkeypatch):
+    applied = []
+
+    def check_output(command):
+        if command[1] == "create":
+            return json.dumps({"metadata": {"name": "crashpod"}, "spec": {"template": {"spec": {}}}}).encode()
+        assert command[3:5] == ["-l", "robusta_demo_id=5d1e0c2b9a8f"]
+        return b"7f9c6b4d8" if applied else b""
+
+    monkeypatch.setattr(alert_latency.subprocess, "check_output", check_output)
+    monkeypatch.setattr(alert_latency.subprocess, "run", lambda command, input, check: applied.append(input))
+    with measure_demo_latency(None, "5d1e0c2b9a8f") as measurement:
+        assert measurement.deploy("crashpod.yaml") == "crashpod-7f9c6b4d8-"
+    labels = json.loads(applied[0])["spec"]["template"]["metadata"]["labels"]
+    assert labels == {"robusta_demo_id": "5d1e0c2b9a8f"}
@@ -0,0 +1,102 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from typer.testing import CliRunner
+
+from robusta_cli.alert_load import LOAD_TEST_LABEL, AlertLoadException, build_load_alerts, send_alerts
+from robusta_cli.main import app
+
+PODS = [{"name": "api-7c9d-x1", "namespace": "prod"}, {"name": "db-0", "namespace": "data"}]
+
+
+class FakeAlertmanager(ThreadingHTTPServer):
+    """
+    Accepts alerts on /api/v2/alerts. Batches whose first alert has an alert_index in reject_indexes get a 500
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _AlertsHandler)
+        self.batches = []
+        self.reject_indexes = set()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _AlertsHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        batch = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        rejected = self.path != "/api/v2/alerts" or batch[0]["labels"]["alert_index"] in self.server.reject_indexes
+        if not rejected:
+            with self.server.lock:
+                self.server.batches.append(batch)
+        self.send_response(500 if rejected else 200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def alertmanager():
+    server = FakeAlertmanager()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_build_load_alerts_are_distinct():
+    alerts = build_load_alerts(10, "TestAlert", PODS, {"team": "sre"}, "run1")
+    assert len({json.dumps(alert["labels"], sort_keys=True) for alert in alerts}) == 10
+    assert {alert["labels"]["pod"] for alert in alerts} == {"api-7c9d-x1", "db-0"}
+    assert all(alert["labels"][LOAD_TEST_LABEL] == "run1" and alert["labels"]["team"] == "sre" for alert in alerts)
+
+
+def test_build_load_alerts_without_pods():
+    with pytest.raises(AlertLoadException):
+        build_load_alerts(10, "TestAlert", [], {}, "run1")
+
+
+def test_send_alerts_in_batches(alertmanager):
+    alerts = build_load_alerts(250, "TestAlert", PODS, {}, "run1")
+    sent = []
+    report = send_alerts(
+        alertmanager.url, alerts, "firing", rate=1000, batch_size=40, on_sent=lambda batch, at: sent.extend(batch)
+    )
+    assert (report.alerts, report.failed_alerts, report.batches) == (250, 0, 7)
+    received = sorted(int(alert["labels"]["alert_index"]) for batch in alertmanager.batches for alert in batch)
+    assert received == list(range(250))
+    assert max(len(batch) for batch in alertmanager.batches) == 40
+    assert len(sent) == 250
+
+
+def test_send_alerts_reports_failed_batches(alertmanager):
+    alertmanager.reject_indexes = {"0", "20"}
+    alerts = build_load_alerts(50, "TestAlert", PODS, {}, "run1")
+    sent = []
+    report = send_alerts(
+        alertmanager.url, alerts, "firing", rate=1000, batch_size=10, on_sent=lambda batch, at: sent.extend(batch)
+    )
+    assert (report.alerts, report.failed_alerts, report.failed_batches) == (50, 20, 2)
+    assert report.errors == {"HTTP 500": 2}
+    assert len(sent) == 30  # only the accepted batches
+
+
+def test_send_alerts_paces_to_rate(alertmanager):
+    alerts = build_load_alerts(20, "TestAlert", PODS, {}, "run1")
+    report = send_alerts(alertmanager.url, alerts, "firing", rate=40)
+    # 5 batches of 4 alerts, one every 0.1s
+    assert report.batches == 5
+    assert report.elapsed_seconds >= 0.39
+
+
+def test_load_with_zero_duration_is_refused():
+    result = CliRunner().invoke(app, ["demo-alert", "--count", "5", "--duration", "0"])
+    assert result.exit_code == 1
+    assert "The duration must be positive" in result.output
@@ -0,0 +1,65 @@
+import json
+import socket
+import subprocess
+
+import pytest
+import typer
+
+from robusta_cli.playbooks_cmd import _bulk_trigger
+
+
+def _requests_file(tmp_path, *action_names: str) -> str:
+    path = tmp_path / "requests.jsonl"
+    lines = [
+        json.dumps({"action_name": name, "action_params": {"index": index}}) for index, name in enumerate(action_names)
+    ]
+    path.write_text("\n".join(lines))
+    return str(path)
+
+
+def _bulk_trigger_results(capsys, requests_file: str, exit_code: int = 0):
+    if exit_code:
+        with pytest.raises(typer.Exit) as exit_info:
+            _bulk_trigger(requests_file, None, concurrency=4)
+        assert exit_info.value.exit_code == exit_code
+    else:
+        _bulk_trigger(requests_file, None, concurrency=4)
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    return sorted(results, key=lambda result: result["index"])
+
+
+def _unused_port() -> int:
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        return unused.getsockname()[1]
+
+
+def test_bulk_trigger(runner_api, tmp_path, capsys):
+    server, backend = runner_api
+    results = _bulk_trigger_results(capsys, _requests_file(tmp_path, *["pod_bash_enricher"] * 20))
+    assert [result["status"] for result in results] == [200] * 20
+    assert sorted(request["action_params"]["index"] for request in server.requests) == list(range(20))
+    assert backend.port_forwards == 1
+
+
+def test_bulk_trigger_counts_failed_actions(runner_api, tmp_path, capsys):
+    results = _bulk_trigger_results(capsys, _requests_file(tmp_path, "pod_bash_enricher", "fail"), exit_code=1)
+    assert [result["status"] for result in results] == [200, 500]
+
+
+def test_bulk_trigger_with_runner_refusing_connections(runner_api, tmp_path, capsys):
+    _, backend = runner_api
+    backend.local_port = _unused_port()
+    results = _bulk_trigger_results(capsys, _requests_file(tmp_path, "pod_bash_enricher", "pod_bash_enricher"), 1)
+    assert [result["status"] for result in results] == [0, 0]
+    assert all("Connection refused" in result["error"] for result in results)
+
+
+def test_bulk_trigger_when_port_forward_fails(runner_api, tmp_path, capsys):
+    _, backend = runner_api
+    backend.error = subprocess.CalledProcessError(
+        1, ["kubectl", "port-forward"], stderr=b'error: error upgrading connection: pods "robusta-runner" not found'
+    )
+    results = _bulk_trigger_results(capsys, _requests_file(tmp_path, "pod_bash_enricher", "pod_bash_enricher"), 1)
+    assert [result["status"] for result in results] == [0, 0]
+    assert all("Cannot port-forward" in result["error"] for result in results)
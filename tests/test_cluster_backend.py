@@ -0,0 +1,88 @@
+import io
+import os
+import tarfile
+import threading
+import time
+
+import pytest
+
+from robusta_cli import cluster_backend
+from robusta_cli.cluster_backend import ClusterBackend, extract_tar, get_cluster_backend
+
+
+def _tar(*members: tarfile.TarInfo) -> io.BytesIO:
+    tar_file = io.BytesIO()
+    with tarfile.open(fileobj=tar_file, mode="w") as tar:
+        for member in members:
+            content = b"x" * member.size if member.isfile() else None
+            tar.addfile(member, io.BytesIO(content) if content else None)
+    tar_file.seek(0)
+    return tar_file
+
+
+def _file(name: str) -> tarfile.TarInfo:
+    member = tarfile.TarInfo(name)
+    member.size = 1
+    return member
+
+
+def _symlink(name: str, target: str) -> tarfile.TarInfo:
+    member = tarfile.TarInfo(name)
+    member.type = tarfile.SYMTYPE
+    member.linkname = target
+    return member
+
+
+@pytest.fixture
+def without_data_filter(monkeypatch):
+    # python versions before 3.11.4 have no extraction filters
+    monkeypatch.delattr(tarfile, "data_filter", raising=False)
+
+
+@pytest.mark.parametrize(
+    "member",
+    [_file("../escaped"), _file("nested/../../escaped"), _file("/tmp/escaped"), _symlink("link", "../escaped")],
+)
+def test_extract_tar_refuses_members_outside_target(tmp_path, without_data_filter, member):
+    target = tmp_path / "target"
+    target.mkdir()
+    with tarfile.open(fileobj=_tar(member), mode="r|") as tar:
+        with pytest.raises(tarfile.TarError):
+            extract_tar(tar, str(target))
+    assert not (tmp_path / "escaped").exists()
+
+
+def test_extract_tar_extracts_members_inside_target(tmp_path, without_data_filter):
+    with tarfile.open(fileobj=_tar(_file("a/b.yaml"), _symlink("a/link", "b.yaml")), mode="r|") as tar:
+        extract_tar(tar, str(tmp_path))
+    assert (tmp_path / "a" / "b.yaml").read_bytes() == b"x"
+    assert os.readlink(tmp_path / "a" / "link") == "b.yaml"
+
+
+def test_backends_implement_every_operation():
+    with pytest.raises(TypeError):
+        ClusterBackend()
+
+
+def test_slow_backend_creation_does_not_block_other_contexts(monkeypatch):
+    slow_context_started = threading.Event()
+    release_slow_context = threading.Event()
+
+    def create_cluster_backend(context):
+        if context == "slow":
+            slow_context_started.set()
+            release_slow_context.wait(5)  # e.g. an exec credential plugin waiting for a login
+        return object()
+
+    monkeypatch.setattr(cluster_backend, "_backends", {})
+    monkeypatch.setattr(cluster_backend, "_create_cluster_backend", create_cluster_backend)
+    slow = threading.Thread(target=get_cluster_backend, args=("slow",))
+    slow.start()
+    try:
+        assert slow_context_started.wait(5)
+        start = time.time()
+        assert get_cluster_backend("fast") is get_cluster_backend("fast")
+        assert time.time() - start < 1
+    finally:
+        release_slow_context.set()
+        slow.join()
@@ -0,0 +1,40 @@
+import base64
+import os
+
+import pytest
+
+from robusta_cli import custom_ca
+
+CUSTOM_CA = base64.b64encode(b"-----BEGIN CERTIFICATE-----\nMIIB\n-----END CERTIFICATE-----\n").decode()
+
+
+@pytest.fixture
+def read_only_cache_dir(monkeypatch, tmp_path):
+    def get_cache_dir(*sub_dirs):
+        raise PermissionError(13, "Permission denied")
+
+    monkeypatch.setattr(custom_ca, "ADDITIONAL_CERTIFICATE", CUSTOM_CA)
+    monkeypatch.setattr(custom_ca, "get_cache_dir", get_cache_dir)
+    monkeypatch.setattr(custom_ca.tempfile, "tempdir", str(tmp_path))
+    custom_ca.get_custom_ca_bundle.cache_clear()
+    yield tmp_path
+    custom_ca.get_custom_ca_bundle.cache_clear()
+
+
+def test_bundle_in_the_temp_dir_is_reused(read_only_cache_dir):
+    bundle_path = custom_ca.get_custom_ca_bundle()
+    custom_ca.get_custom_ca_bundle.cache_clear()  # another invocation
+    assert custom_ca.get_custom_ca_bundle() == bundle_path
+    assert os.listdir(read_only_cache_dir) == [os.path.basename(os.path.dirname(bundle_path))]
+    assert os.stat(os.path.dirname(bundle_path)).st_mode & 0o777 == 0o700
+    with open(bundle_path, "rb") as bundle:
+        assert bundle.read().endswith(base64.b64decode(CUSTOM_CA))
+
+
+def test_temp_dir_writable_by_others_is_not_used(read_only_cache_dir):
+    shared_dir = os.path.join(read_only_cache_dir, f"robusta-ca-{os.getuid()}")
+    os.mkdir(shared_dir)
+    os.chmod(shared_dir, 0o777)
+    bundle_path = custom_ca.get_custom_ca_bundle()
+    assert os.path.dirname(bundle_path) != shared_dir
+    assert os.listdir(shared_dir) == []
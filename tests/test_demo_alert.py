@@ -0,0 +1,67 @@
+import pytest
+from kubernetes.client.exceptions import ApiException
+
+from robusta_cli import demo_alert
+from robusta_cli.demo_alert import AlertManagerDiscovery
+from robusta_cli.utils import TtlCache
+
+OLD_URL = "http://alertmanager.monitoring.svc.cluster.local:9093"
+NEW_URL = "http://kube-prometheus-stack-alertmanager.observability.svc.cluster.local:9093"
+
+
+@pytest.fixture
+def cluster(monkeypatch):
+    """
+    The services of the cluster, with alertmanager discovered at NEW_URL
+    """
+    services = {("monitoring", "alertmanager"), ("observability", "kube-prometheus-stack-alertmanager")}
+    discoveries = []
+
+    def get_metadata(api_client, path, *args):
+        _, _, _, namespace, _, name = path.strip("/").split("/")
+        if (namespace, name) not in services:
+            raise ApiException(status=404, reason="Not Found")
+        return {"metadata": {"name": name, "namespace": namespace}}
+
+    def find_alert_manager_url(api_client):
+        discoveries.append(NEW_URL)
+        return NEW_URL
+
+    monkeypatch.setattr(demo_alert, "alertmanager_url_cache", TtlCache("urls.json", 3600, disk_cache=False))
+    monkeypatch.setattr(demo_alert, "_get_metadata", get_metadata)
+    monkeypatch.setattr(AlertManagerDiscovery, "find_alert_manager_url", staticmethod(find_alert_manager_url))
+    return services, discoveries
+
+
+def test_cached_url_is_used_while_its_service_exists(cluster):
+    _, discoveries = cluster
+    demo_alert.alertmanager_url_cache.set("kubeconfig/context", OLD_URL)
+    assert AlertManagerDiscovery.cached_alert_manager_url("kubeconfig/context") == OLD_URL
+    assert discoveries == []
+
+
+def test_cached_url_of_a_deleted_service_is_discovered_again(cluster):
+    services, discoveries = cluster
+    demo_alert.alertmanager_url_cache.set("kubeconfig/context", OLD_URL)
+    services.remove(("monitoring", "alertmanager"))
+    assert AlertManagerDiscovery.cached_alert_manager_url("kubeconfig/context") == NEW_URL
+    assert AlertManagerDiscovery.cached_alert_manager_url("kubeconfig/context") == NEW_URL
+    assert discoveries == [NEW_URL]
+
+
+def test_urls_outside_the_cluster_are_not_checked(cluster):
+    assert AlertManagerDiscovery.service_exists("https://alertmanager.example.com", api_client=None)
+
+
+def test_alert_pods_of_all_namespaces_are_listed_with_one_api_client(monkeypatch):
+    api_clients = set()
+
+    def list_metadata(api_client, path, query_params=None):
+        api_clients.add(id(api_client))
+        namespace = path.split("/")[4]
+        return [{"metadata": {"name": f"{namespace}-pod", "namespace": namespace}}]
+
+    monkeypatch.setattr(demo_alert, "_list_metadata", list_metadata)
+    pods = demo_alert.find_alert_pods(["default", "monitoring", "robusta"], limit=1)
+    assert [pod["name"] for pod in pods] == ["default-pod", "monitoring-pod", "robusta-pod"]
+    assert len(api_clients) == 1
@@ -0,0 +1,24 @@
+import threading
+
+from robusta_cli.multi_cluster import STATUS_OK, STATUS_TIMEOUT, run_on_contexts
+
+
+def test_timed_out_cluster_is_reported_as_not_cancelled():
+    release = threading.Event()
+    finished = threading.Event()
+
+    def job():
+        release.wait(5)
+        finished.set()
+
+    results = run_on_contexts(["hanging"], job, parallelism=1, timeout=0.2)
+    release.set()
+    assert finished.wait(5)
+    # finishing late doesn't change the reported result
+    assert results[0].status == STATUS_TIMEOUT
+    assert "not cancelled" in results[0].error
+
+
+def test_clusters_run_concurrently():
+    results = run_on_contexts(["a", "b"], lambda: None, parallelism=2, timeout=5)
+    assert [(result.context, result.status) for result in results] == [("a", STATUS_OK), ("b", STATUS_OK)]
@@ -0,0 +1,107 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+import typer
+import yaml
+from typer.testing import CliRunner
+
+from robusta_cli import playbooks_cmd
+from robusta_cli.playbooks_cmd import PLAYBOOK_SECTIONS
+
+PLAYBOOKS_COUNT = 10000
+# listing 10k playbooks as yaml takes about 2 seconds. The bound leaves room for slow CI machines
+MAX_LIST_SECONDS = 10
+
+
+def _playbooks(count: int):
+    playbooks = []
+    for index in range(count):
+        playbook = {
+            "triggers": [{"on_pod_update": {"name_prefix": f"app-{index}", "namespace_prefix": "prod"}}],
+            "actions": [
+                {"pod_events_enricher": {}},
+                {"logs_enricher": {"warn_on_missing_label": index % 2 == 0, "tail_lines": index}},
+            ],
+        }
+        if index % 3 == 0:
+            playbook["sinks"] = [f"slack_sink_{index % 7}", "robusta_ui_sink"]
+        if index % 50 == 0:  # values libyaml formats differently than the python emitter
+            playbook["actions"].append({"template_enricher": {"template": f"Pod ünïcode {index}\nsecond line\t "}})
+        if index % 11 == 0:
+            del playbook["triggers"]
+        playbooks.append(playbook)
+    return playbooks
+
+
+def _print_playbooks_yaml_per_playbook(playbooks):
+    # the output of playbooks list before it was chunked
+    for playbook in playbooks:
+        typer.secho("--------------------------------------", fg="blue")
+        for section in PLAYBOOK_SECTIONS:
+            if playbook.get(section):
+                typer.echo(f"{yaml.dump({section: playbook[section]})}")
+
+
+def _print_playbooks_table_per_playbook(playbooks, indexes):
+    rows = [["#"] + [section.upper() for section in PLAYBOOK_SECTIONS]]
+    for index, playbook in zip(indexes, playbooks):
+        row = [str(index)]
+        for section in PLAYBOOK_SECTIONS:
+            names = []
+            for item in playbook.get(section) or []:
+                names.extend(item.keys() if isinstance(item, dict) else [str(item)])
+            row.append(",".join(names))
+        rows.append(row)
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]) - 1)]
+    for row in rows:
+        typer.echo("  ".join([cell.ljust(width) for cell, width in zip(row, widths)] + [row[-1]]))
+
+
+@pytest.fixture(scope="module")
+def playbooks():
+    return _playbooks(PLAYBOOKS_COUNT)
+
+
+@pytest.fixture
+def list_playbooks(monkeypatch, playbooks):
+    """
+    Runs playbooks list against a runner with the given playbooks. Returns the output, without the progress line
+    """
+    config = SimpleNamespace(config={"active_playbooks": playbooks})
+    monkeypatch.setattr(playbooks_cmd, "get_runner_pod", lambda namespace: "robusta-runner-6d9f8-abcde")
+    monkeypatch.setattr(playbooks_cmd, "get_playbooks_config", lambda namespace: config)
+
+    def run(*args: str) -> str:
+        start = time.time()
+        result = CliRunner().invoke(playbooks_cmd.app, ["list", *args])
+        assert time.time() - start < MAX_LIST_SECONDS
+        assert result.exit_code == 0, result.output
+        progress, _, output = result.output.partition("\n")
+        assert progress == "Getting deployed playbooks list..."
+        return output
+
+    return run
+
+
+def test_yaml_output_matches_per_playbook_output(list_playbooks, playbooks, capsys):
+    _print_playbooks_yaml_per_playbook(playbooks)
+    assert list_playbooks() == capsys.readouterr().out
+
+
+def test_table_output_matches_per_playbook_output(list_playbooks, playbooks, capsys):
+    _print_playbooks_table_per_playbook(playbooks, range(len(playbooks)))
+    assert list_playbooks("--output", "table") == capsys.readouterr().out
+
+
+def test_json_output_matches_per_playbook_output(list_playbooks, playbooks):
+    assert json.loads(list_playbooks("--output", "json")) == [
+        json.loads(json.dumps(playbook, default=str)) for playbook in playbooks
+    ]
+
+
+def test_filtered_table_keeps_playbook_numbers(list_playbooks, playbooks, capsys):
+    with_sinks = [index for index, playbook in enumerate(playbooks) if playbook.get("sinks")]
+    _print_playbooks_table_per_playbook([playbooks[index] for index in with_sinks], with_sinks)
+    assert list_playbooks("--output", "table", "--sink", "slack_sink_*") == capsys.readouterr().out
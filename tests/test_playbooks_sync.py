@@ -0,0 +1,167 @@
+import importlib.util
+import os
+import shutil
+from typing import Dict
+
+import pytest
+
+from robusta_cli.playbooks_sync import (
+    COMPRESSION_GZIP,
+    COMPRESSION_NONE,
+    COMPRESSION_ZSTD,
+    COMPRESSIONS,
+    LOCAL_STATUS_DIFFERS,
+    LOCAL_STATUS_IN_SYNC,
+    LOCAL_STATUS_MISSING,
+    MANIFEST_FILE_NAME,
+    list_stored_directories,
+    manifest_hash,
+    build_local_manifest,
+    load_ignore_patterns,
+    pull_playbooks,
+    push_playbooks_dir,
+)
+
+RUNNER_POD = "robusta-runner-6d9f8-abcde"
+
+
+def _write_files(root, files: Dict[str, str]):
+    for rel_path, content in files.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def _read_files(root) -> Dict[str, str]:
+    return {
+        os.path.relpath(os.path.join(dir_path, file_name), root): open(os.path.join(dir_path, file_name)).read()
+        for dir_path, _, file_names in os.walk(root)
+        for file_name in file_names
+        if file_name != MANIFEST_FILE_NAME
+    }
+
+
+@pytest.fixture
+def playbooks(tmp_path):
+    """
+    A local playbooks directory, and the path of its copy in the "pod"
+    """
+    local_dir = tmp_path / "local" / "my_playbooks"
+    _write_files(
+        local_dir,
+        {
+            "pyproject.toml": "[tool.poetry]\nname = 'my_playbooks'\n",
+            "my_playbooks/__init__.py": "",
+            "my_playbooks/actions.py": "def action():\n    pass\n",
+            "my_playbooks/old/legacy.py": "LEGACY = True\n",
+            ".git/HEAD": "ref: refs/heads/main\n",
+        },
+    )
+    return local_dir, tmp_path / "pod" / "playbooks" / "my_playbooks"
+
+
+def test_push(local_exec_backend, playbooks):
+    local_dir, remote_dir = playbooks
+    result = push_playbooks_dir(str(local_dir), RUNNER_POD, None, str(remote_dir))
+    assert sorted(result.added) == [
+        "my_playbooks/__init__.py",
+        "my_playbooks/actions.py",
+        "my_playbooks/old/legacy.py",
+        "pyproject.toml",
+    ]
+    assert (result.changed, result.deleted, result.unchanged_files) == ([], [], 0)
+    assert _read_files(remote_dir) == {rel_path: (local_dir / rel_path).read_text() for rel_path in result.added}
+    assert (remote_dir / MANIFEST_FILE_NAME).exists()
+    assert 0 < result.transfer_duration <= result.duration
+
+
+def test_incremental_push_sends_only_changes_and_prunes_emptied_dirs(local_exec_backend, playbooks):
+    local_dir, remote_dir = playbooks
+    push_playbooks_dir(str(local_dir), RUNNER_POD, None, str(remote_dir))
+    (remote_dir / "logs").mkdir()  # created on the runner, not by a push
+
+    _write_files(local_dir, {"my_playbooks/actions.py": "def action():\n    return 1\n", "README.md": "# mine\n"})
+    (local_dir / "my_playbooks" / "old" / "legacy.py").unlink()
+    (local_dir / "my_playbooks" / "old").rmdir()
+    result = push_playbooks_dir(str(local_dir), RUNNER_POD, None, str(remote_dir))
+
+    assert (result.added, result.changed, result.deleted) == (
+        ["README.md"],
+        ["my_playbooks/actions.py"],
+        ["my_playbooks/old/legacy.py"],
+    )
+    assert result.unchanged_files == 2
+    local_files = {rel_path: content for rel_path, content in _read_files(local_dir).items() if ".git" not in rel_path}
+    assert _read_files(remote_dir) == local_files
+    assert not (remote_dir / "my_playbooks" / "old").exists()
+    assert (remote_dir / "logs").is_dir()
+    assert (remote_dir / "my_playbooks" / "actions.py").read_text() == "def action():\n    return 1\n"
+
+
+def test_push_without_changes_sends_only_the_manifest(local_exec_backend, playbooks):
+    local_dir, remote_dir = playbooks
+    first = push_playbooks_dir(str(local_dir), RUNNER_POD, None, str(remote_dir))
+    result = push_playbooks_dir(str(local_dir), RUNNER_POD, None, str(remote_dir))
+    assert (result.added, result.changed, result.deleted, result.unchanged_files) == ([], [], [], 4)
+    assert result.transferred_bytes < first.transferred_bytes
+
+
+def _compression_available(compression: str) -> bool:
+    if compression != COMPRESSION_ZSTD:
+        return True
+    return importlib.util.find_spec("zstandard") is not None and shutil.which("zstd") is not None
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_pull_round_trip(local_exec_backend, playbooks, tmp_path, compression):
+    if not _compression_available(compression):
+        pytest.skip(f"{compression} isn't installed")
+    local_dir, remote_dir = playbooks
+    push_playbooks_dir(str(local_dir), RUNNER_POD, None, str(remote_dir), compression=compression)
+    pulled_dir = tmp_path / "pulled"
+
+    result = pull_playbooks(RUNNER_POD, None, str(remote_dir), str(pulled_dir), compression=compression)
+    assert (result.files, result.unchanged_files, result.local_only) == (4, 0, [])
+    assert _read_files(pulled_dir) == _read_files(remote_dir)
+    assert 0 < result.transfer_duration <= result.duration
+
+    (remote_dir / "my_playbooks" / "actions.py").write_text("def action():\n    return 2\n")
+    (pulled_dir / "notes.txt").write_text("local only\n")
+    result = pull_playbooks(RUNNER_POD, None, str(remote_dir), str(pulled_dir), compression=compression)
+    assert (result.files, result.unchanged_files, result.local_only) == (1, 3, ["notes.txt"])
+    assert (pulled_dir / "my_playbooks" / "actions.py").read_text() == "def action():\n    return 2\n"
+    assert (pulled_dir / "notes.txt").exists()
+
+
+@pytest.mark.parametrize("compression", [COMPRESSION_GZIP, COMPRESSION_NONE])
+def test_pull_of_an_up_to_date_copy_transfers_nothing(local_exec_backend, playbooks, tmp_path, compression):
+    local_dir, remote_dir = playbooks
+    push_playbooks_dir(str(local_dir), RUNNER_POD, None, str(remote_dir))
+    pulled_dir = tmp_path / "pulled"
+    pull_playbooks(RUNNER_POD, None, str(remote_dir), str(pulled_dir), compression=compression)
+    local_exec_backend.commands.clear()
+
+    result = pull_playbooks(RUNNER_POD, None, str(remote_dir), str(pulled_dir), compression=compression)
+    assert (result.files, result.unchanged_files, result.transferred_bytes) == (0, 4, 0)
+    assert len(local_exec_backend.commands) == 1  # the hashing only
+
+
+def test_list_stored_directories_compares_with_local_copies(local_exec_backend, playbooks, tmp_path):
+    local_dir, remote_dir = playbooks
+    _write_files(tmp_path / "local" / "other_playbooks", {"other.py": "OTHER = 1\n"})
+    _write_files(tmp_path / "local" / "only_remote", {"remote.py": "REMOTE = 1\n"})
+    for name in ["my_playbooks", "other_playbooks", "only_remote"]:
+        push_playbooks_dir(str(tmp_path / "local" / name), RUNNER_POD, None, str(remote_dir.parent / name))
+    shutil.rmtree(tmp_path / "local" / "only_remote")
+    (tmp_path / "local" / "other_playbooks" / "other.py").write_text("OTHER = 2\n")
+
+    directories = list_stored_directories(RUNNER_POD, None, str(remote_dir.parent), str(tmp_path / "local"))
+    assert [(directory.name, directory.files, directory.local_status) for directory in directories] == [
+        ("my_playbooks", 4, LOCAL_STATUS_IN_SYNC),
+        ("only_remote", 1, LOCAL_STATUS_MISSING),
+        ("other_playbooks", 1, LOCAL_STATUS_DIFFERS),
+    ]
+    assert directories[0].content_hash == manifest_hash(
+        build_local_manifest(str(local_dir), load_ignore_patterns(str(local_dir)))
+    )
+    assert directories[0].size == sum(len(content) for content in _read_files(remote_dir).values())
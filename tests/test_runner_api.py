@@ -0,0 +1,35 @@
+import subprocess
+
+import pytest
+from typer.testing import CliRunner
+
+from robusta_cli import playbooks_cmd
+from robusta_cli import runner_api as runner_api_module
+from robusta_cli.runner_api import RunnerApiException, post_to_runner
+
+
+def test_calls_share_one_port_forward_and_connection(runner_api):
+    server, backend = runner_api
+    for _ in range(10):
+        response = post_to_runner(None, "trigger", {"action_name": "pod_bash_enricher", "action_params": {}})
+        assert response.status_code == 200
+    assert len(server.requests) == 10
+    assert backend.port_forwards == 1
+    assert server.connections == 1  # keep-alive
+
+
+def test_port_forward_failure_is_a_runner_api_error(runner_api):
+    _, backend = runner_api
+    backend.error = subprocess.CalledProcessError(1, ["kubectl", "port-forward"], stderr=b"error: context not found")
+    with pytest.raises(RunnerApiException, match="context not found"):
+        post_to_runner(None, "trigger", {"action_name": "pod_bash_enricher", "action_params": {}})
+
+
+def test_trigger_prints_runner_api_errors(runner_api, runner_log, monkeypatch):
+    _, backend = runner_api
+    backend.error = FileNotFoundError("kubectl")
+    monkeypatch.setattr(runner_api_module.time, "sleep", lambda seconds: None)  # between the tries
+    result = CliRunner().invoke(playbooks_cmd.app, ["trigger", "pod_bash_enricher"])
+    assert result.exit_code == 1
+    assert "Cannot port-forward" in result.output
+    assert result.exception is None or isinstance(result.exception, SystemExit)
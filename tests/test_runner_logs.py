@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+import typer
+
+from robusta_cli.runner_logs import kubelet_timestamp, watch_runner_reload
+
+# lines of a robusta runner picking up a pushed playbooks package
+RELOAD_STARTED_LINE = (
+    "2024-05-02 10:11:12.345 INFO     Reloading playbook packages due to change on /etc/robusta/playbooks/storage"
+)
+RELOAD_FAILED_LINE = (
+    "2024-05-02 10:11:13.456 ERROR    unknown error reloading playbooks. will try again when they next change"
+)
+OTHER_LINE = "2024-05-02 10:11:14.567 INFO     Sending alert to sink robusta_ui_sink"
+
+
+def _replay(runner_log, *texts: str):
+    # lines written before the watch started, that arrive a moment after it, once the log stream opened
+    written = time.time() - 0.5
+    threading.Timer(0.2, lambda: [runner_log.put(text, written) for text in texts]).start()
+
+
+def test_kubelet_timestamp_orders_like_log_lines():
+    assert kubelet_timestamp(1714644672.345) == "2024-05-02T10:11:12.345000000Z"
+    assert kubelet_timestamp(1714644672.3) < kubelet_timestamp(1714644672.35) < kubelet_timestamp(1714644673)
+
+
+def test_reload_confirmed_by_the_next_runner_line(runner_log, capsys):
+    start = time.time()
+    with watch_runner_reload(None, timeout=5) as reload_watch:
+        runner_log.put(RELOAD_STARTED_LINE)
+        runner_log.put(OTHER_LINE)
+        reload_watch.wait()
+    assert "Runner reloaded the playbooks" in capsys.readouterr().out
+    assert time.time() - start < 1  # no fixed wait before the change or after the reload
+
+
+def test_reload_confirmed_when_the_runner_stays_quiet(runner_log, capsys):
+    with watch_runner_reload(None, timeout=5) as reload_watch:
+        runner_log.put(RELOAD_STARTED_LINE)
+        reload_watch.wait()
+    assert "Runner reloaded the playbooks" in capsys.readouterr().out
+
+
+def test_reload_error_fails(runner_log):
+    with watch_runner_reload(None, timeout=5) as reload_watch:
+        runner_log.put(RELOAD_STARTED_LINE)
+        runner_log.put(RELOAD_FAILED_LINE)
+        with pytest.raises(typer.Exit) as exit_info:
+            reload_watch.wait()
+    assert exit_info.value.exit_code == 1
+
+
+def test_reload_before_the_change_does_not_count(runner_log, capsys):
+    _replay(runner_log, RELOAD_STARTED_LINE, OTHER_LINE)
+    with watch_runner_reload(None, timeout=1) as reload_watch:
+        with pytest.raises(typer.Exit) as exit_info:
+            reload_watch.wait()
+    assert exit_info.value.exit_code == 1
+    assert "Did not see the runner reload" in capsys.readouterr().out
+
+
+def test_reload_timeout_only_warns_when_asked(runner_log, capsys):
+    with watch_runner_reload(None, timeout=0.5, fail_on_timeout=False) as reload_watch:
+        reload_watch.wait()
+    assert "Did not see the runner reload" in capsys.readouterr().out
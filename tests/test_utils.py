@@ -0,0 +1,30 @@
+import subprocess
+
+import pytest
+
+from robusta_cli.utils import is_pod_not_found_error
+
+
+@pytest.mark.parametrize(
+    "returncode,stderr",
+    [
+        (1, b'Error from server (NotFound): pods "robusta-runner-6d9f8-abcde" not found\n'),
+        (404, b'{"kind":"Status","reason":"NotFound","code":404}'),
+        (0, b'Handshake status 404 Not Found -+-+- {} -+-+- b\'{"message":"pods \\\\"robusta-runner\\\\" not found"}\''),
+    ],
+)
+def test_pod_not_found(returncode, stderr):
+    assert is_pod_not_found_error(subprocess.CalledProcessError(returncode, "ls", output=b"", stderr=stderr))
+
+
+@pytest.mark.parametrize(
+    "returncode,stderr",
+    [
+        (127, b"bash: line 1: rsync: command not found"),
+        (2, b"ls: cannot access '/etc/robusta/playbooks/x': No such file or directory"),
+        (1, b'Error from server (NotFound): secrets "robusta-playbooks-config-secret" not found'),
+        (1, None),
+    ],
+)
+def test_other_errors_are_not_pod_not_found(returncode, stderr):
+    assert not is_pod_not_found_error(subprocess.CalledProcessError(returncode, "ls", output=b"", stderr=stderr))